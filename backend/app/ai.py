@@ -0,0 +1,335 @@
+# ai.py
+"""
+Construção do contexto enviado ao modelo de IA (Google Gemini) em '/api/ai/analyse'.
+
+Em vez de enviar o catálogo completo, o contexto é montado a partir do que é relevante
+para a pergunta, dentro de um orçamento de tokens ('AI_CONTEXT_TOKEN_BUDGET'):
+1. Recursos cujo nome, descrição ou tags contêm palavras da pergunta (índice de pesquisa).
+2. Os pais e filhos diretos desses recursos (índice de relações).
+3. Recursos com eventos recentes.
+4. Os restantes recursos, por ordem alfabética, enquanto houver orçamento.
+Os eventos mais recentes (dos recursos escolhidos e do catálogo em geral) ocupam o
+orçamento que sobra. Cada recurso e evento é escrito numa única linha compacta.
+
+A chamada ao modelo ('analyse') é assíncrona, limitada em concorrência e em tempo, e as
+respostas ficam em cache por (pergunta normalizada, modelo, versão do catálogo): a mesma
+pergunta, enquanto o catálogo e os eventos não mudarem, é respondida sem chamar o modelo.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from bson import ObjectId
+from google import genai
+
+from . import crud
+from .graph import resource_graph
+from .models import AppConfig
+from .search import normalize, search_index, tokenize
+
+TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", 8000))
+# Fração do orçamento reservada aos recursos; o resto (e o que os recursos não usarem) vai para os eventos.
+RESOURCE_BUDGET_SHARE = 0.7
+# Número máximo de eventos lidos do MongoDB para o contexto.
+MAX_EVENTS = 200
+# Palavras com menos letras do que isto são ignoradas na pergunta (artigos, preposições...).
+MIN_TERM_LENGTH = 3
+# Limites de tamanho de cada linha do contexto.
+MAX_DESCRIPTION_CHARS = 200
+MAX_MESSAGE_CHARS = 160
+MAX_RELATED_NAMES = 8
+# Chamadas simultâneas ao modelo, tempo máximo de cada uma (incluindo a espera por vez) e cache de respostas.
+MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))
+TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", 60))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", 3600))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("AI_RESPONSE_CACHE_MAX_SIZE", 256))
+
+
+def create_client(api_key: str) -> genai.Client:
+    """Cria o cliente do Gemini. Os testes substituem esta função por um cliente local."""
+    return genai.Client(api_key=api_key)
+
+
+# O cliente é reutilizado entre pedidos (e recriado apenas se a chave da API mudar).
+_client: Optional[Tuple[str, Any]] = None
+
+
+def get_client(api_key: str) -> Any:
+    """Retorna o cliente do Gemini para esta chave, criando-o apenas na primeira utilização."""
+    global _client
+    if _client is None or _client[0] != api_key:
+        _client = (api_key, create_client(api_key))
+    return _client[1]
+
+
+class ResponseCache:
+    """Cache limitada (LRU) com expiração (TTL) de respostas do modelo."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[str]:
+        """Retorna a resposta guardada para a chave, se existir e não tiver expirado."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Tuple[str, str, int], text: str):
+        """Guarda uma resposta, removendo as entradas menos usadas se a cache estiver cheia."""
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores de acertos e falhas e o tamanho atual da cache."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL_SECONDS, max_size=RESPONSE_CACHE_MAX_SIZE)
+# Semáforo que limita as chamadas simultâneas, criado para o event loop em que é usado.
+_semaphore: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+# Perguntas iguais feitas ao mesmo tempo partilham uma única chamada ao modelo.
+_in_flight: Dict[Tuple[str, str, int], "asyncio.Future[str]"] = {}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore[0] is not loop:
+        _semaphore = (loop, asyncio.Semaphore(MAX_CONCURRENCY))
+    return _semaphore[1]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa do número de tokens de um texto (cerca de 4 caracteres por token)."""
+    return math.ceil(len(text) / 4)
+
+
+class AIContext(NamedTuple):
+    """O contexto montado para uma pergunta, com os dados necessários para o avaliar."""
+    text: str
+    resource_ids: List[str]
+    event_count: int
+    tokens: int
+    build_ms: float
+
+
+def _truncate(text: Optional[str], limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _related(names: List[str]) -> str:
+    shown = names[:MAX_RELATED_NAMES]
+    return ", ".join(shown) + (f" (+{len(names) - len(shown)})" if len(names) > len(shown) else "")
+
+
+def _resource_line(resource_id: str) -> str:
+    document = search_index.documents.get(resource_id, {})
+    line = f"- {resource_graph.names.get(resource_id, document.get('name', ''))}"
+    if document.get("tags"):
+        line += " [" + ", ".join(f"{t['key']}={t['value']}" for t in document["tags"]) + "]"
+    if document.get("description"):
+        line += f": {_truncate(document['description'], MAX_DESCRIPTION_CHARS)}"
+    parents = resource_graph.parent_names(resource_id)
+    children = resource_graph.child_names(resource_id)
+    if parents:
+        line += f" | depende de: {_related(parents)}"
+    if children:
+        line += f" | afeta: {_related(children)}"
+    return line
+
+
+def _event_line(event_data: Dict[str, Any]) -> str:
+    timestamp = event_data["timestamp"].strftime("%Y-%m-%d %H:%M")
+    name = resource_graph.names.get(str(event_data["resource_id"]), "?")
+    line = f"- {timestamp} {name} {event_data['event_type']}"
+    if event_data.get("message"):
+        line += f": {_truncate(event_data['message'], MAX_MESSAGE_CHARS)}"
+    return line
+
+
+async def _recent_events(resource_ids: List[str]) -> List[Dict[str, Any]]:
+    """Os eventos mais recentes dos recursos indicados e do catálogo em geral, do mais recente para o mais antigo."""
+    events = crud.get_event_collection()
+    newest_first = [("timestamp", -1), ("_id", -1)]
+    found: Dict[Any, Dict[str, Any]] = {}
+    object_ids = [ObjectId(rid) for rid in resource_ids]
+    if object_ids:
+        async for event_data in events.find({"resource_id": {"$in": object_ids}}).sort(newest_first).limit(MAX_EVENTS // 2):
+            found[event_data["_id"]] = event_data
+    async for event_data in events.find({}).sort(newest_first).limit(MAX_EVENTS // 2):
+        found[event_data["_id"]] = event_data
+    return sorted(found.values(), key=lambda e: (e["timestamp"], e["_id"]), reverse=True)
+
+
+def _matching_resources(question: str) -> List[str]:
+    """Os recursos que correspondem a palavras da pergunta, por relevância, seguidos dos seus vizinhos diretos."""
+    terms = [t for t in tokenize(question) if len(t) >= MIN_TERM_LENGTH]
+    scores = search_index.score_any(terms)
+    matched = sorted(scores, key=lambda rid: -scores[rid])
+    ranked: Dict[str, None] = dict.fromkeys(matched)
+    for resource_id in matched:
+        for neighbour in list(resource_graph.parents.get(resource_id, {})) + resource_graph.children.get(resource_id, []):
+            if neighbour in resource_graph.names:
+                ranked.setdefault(neighbour)
+    return list(ranked)
+
+
+def _rank_resources(relevant: List[str], recent_events: List[Dict[str, Any]]) -> List[str]:
+    """Ordena todos os recursos: os relevantes, os com eventos recentes e, por fim, os restantes por nome."""
+    ranked: Dict[str, None] = dict.fromkeys(relevant)
+    for event_data in recent_events:
+        resource_id = str(event_data["resource_id"])
+        if resource_id in resource_graph.names:
+            ranked.setdefault(resource_id)
+    for resource_id in sorted(resource_graph.names, key=lambda rid: resource_graph.names[rid].casefold()):
+        ranked.setdefault(resource_id)
+    return list(ranked)
+
+
+async def build_context(question: str, token_budget: Optional[int] = None) -> AIContext:
+    """
+    Monta o contexto do catálogo relevante para uma pergunta, dentro do orçamento de tokens.
+
+    Args:
+        question (str): A pergunta do utilizador.
+        token_budget (Optional[int]): Orçamento em tokens; por omissão, 'AI_CONTEXT_TOKEN_BUDGET'.
+
+    Returns:
+        AIContext: O texto do contexto e os dados sobre a seleção feita.
+    """
+    started = time.perf_counter()
+    budget = token_budget or TOKEN_BUDGET
+    await resource_graph.ensure_loaded()
+    await search_index.ensure_loaded()
+
+    relevant = _matching_resources(question)
+    events = await _recent_events(relevant[:MAX_EVENTS // 2])
+    ranked = _rank_resources(relevant, events)
+
+    header = f"Recursos ({len(resource_graph.names)} no catálogo; mostrados os mais relevantes para a pergunta):"
+    lines = [header]
+    used = estimate_tokens(header)
+    resource_budget = int(budget * RESOURCE_BUDGET_SHARE)
+    selected: List[str] = []
+    for resource_id in ranked:
+        line = _resource_line(resource_id)
+        cost = estimate_tokens(line) + 1
+        if used + cost > resource_budget:
+            break
+        lines.append(line)
+        selected.append(resource_id)
+        used += cost
+
+    events_header = "Eventos recentes (do mais recente para o mais antigo):"
+    event_count = 0
+    if events and used + estimate_tokens(events_header) < budget:
+        lines.append(events_header)
+        used += estimate_tokens(events_header) + 1
+        for event_data in events:
+            line = _event_line(event_data)
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            lines.append(line)
+            event_count += 1
+            used += cost
+
+    text = "\n".join(lines)
+    return AIContext(text, selected, event_count, estimate_tokens(text), (time.perf_counter() - started) * 1000)
+
+
+def build_prompt(question: str, context: AIContext) -> str:
+    """Junta as instruções, o contexto e a pergunta no prompt enviado ao modelo."""
+    return f"""Você é um assistente de IA especialista em análise de dados de um catálogo de serviços de TI.
+Sua resposta deve ser em português do Brasil e em linguagem natural.
+Responda apenas com base no contexto abaixo; se ele não for suficiente, diga-o.
+
+Contexto da aplicação:
+{context.text}
+
+Pergunta do usuário: {question}
+"""
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza uma pergunta para a chave da cache (minúsculas, sem acentos e espaços repetidos)."""
+    return " ".join(normalize(question).split())
+
+
+async def _generate(question: str, config: AppConfig) -> str:
+    context = await build_context(question)
+    client = get_client(config.gemini_api_key)
+
+    async def call_model() -> str:
+        async with _get_semaphore():
+            response = await client.aio.models.generate_content(model=config.gemini_model, contents=build_prompt(question, context))
+        return response.text
+
+    try:
+        return await asyncio.wait_for(call_model(), timeout=TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="O modelo de IA não respondeu a tempo.")
+
+
+async def analyse(question: str, config: AppConfig) -> str:
+    """
+    Responde a uma pergunta sobre o catálogo, usando a cache de respostas quando possível.
+
+    Args:
+        question (str): A pergunta do utilizador.
+        config (AppConfig): A configuração com a chave da API e o modelo do Gemini.
+
+    Returns:
+        str: O texto da resposta do modelo.
+
+    Raises:
+        HTTPException: 504 se o modelo não responder em 'AI_TIMEOUT_SECONDS'.
+    """
+    key = (normalize_question(question), config.gemini_model or "", await crud.get_catalog_version())
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    pending = _in_flight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        text = await _generate(question, config)
+        response_cache.set(key, text)
+        future.set_result(text)
+        return text
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Evita o aviso de exceção não lida quando ninguém mais espera por esta resposta.
+        future.exception()
+        raise
+    finally:
+        del _in_flight[key]
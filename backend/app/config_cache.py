@@ -0,0 +1,111 @@
+# config_cache.py
+"""
+Cache em memória da configuração da aplicação (AppConfig).
+
+A configuração é lida do MongoDB uma vez e servida a partir da memória. Cada gravação
+incrementa um número de versão no documento de configuração; a nova versão é publicada
+num canal do Redis para que os outros workers descartem as suas cópias. Um tempo máximo
+de validade limita o atraso caso alguma notificação se perca.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from .database import get_database
+from .models import AppConfig
+
+CONFIG_INVALIDATION_CHANNEL = "service_catalog:app_config"
+APP_CONFIG_CACHE_TTL_SECONDS = float(os.getenv("APP_CONFIG_CACHE_TTL_SECONDS", 60))
+
+
+class AppConfigCache:
+    """Guarda a última AppConfig lida e a sua versão, e escuta invalidações via Redis."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.config: Optional[AppConfig] = None
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._database = None
+        self._loaded_at = 0.0
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def get(self) -> Optional[AppConfig]:
+        """Retorna uma cópia da configuração em cache, ou None se for preciso recarregá-la."""
+        if (
+            self.config is not None
+            and self._database is get_database()
+            and time.monotonic() - self._loaded_at < self.ttl
+        ):
+            self.hits += 1
+            return self.config.model_copy()
+        self.misses += 1
+        return None
+
+    def store(self, config: AppConfig, version: Optional[int]):
+        """Guarda a configuração lida do banco de dados e a respetiva versão."""
+        self.config = config.model_copy()
+        self.version = version
+        self._database = get_database()
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Descarta a configuração em cache; a próxima leitura vai ao MongoDB."""
+        self.config = None
+        self.version = None
+
+    def handle_message(self, data: Any):
+        """Processa uma notificação de nova versão publicada por outro worker."""
+        try:
+            version = int(data)
+        except (TypeError, ValueError):
+            return
+        if version != self.version:
+            self.invalidate()
+
+    async def publish(self, version: int):
+        """Notifica os outros workers de que a configuração mudou."""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(CONFIG_INVALIDATION_CHANNEL, str(version))
+        except Exception as e:
+            print(f"Falha ao publicar a invalidação da configuração: {e}")
+
+    async def start_listener(self, redis_instance):
+        """Subscreve o canal de invalidação no Redis (chamado no arranque da aplicação)."""
+        self._redis = redis_instance
+        pubsub = redis_instance.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(CONFIG_INVALIDATION_CHANNEL)
+
+        async def listen():
+            try:
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self.handle_message(message.get("data"))
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Escuta de invalidações da configuração interrompida: {e}")
+            finally:
+                await pubsub.close()
+
+        self._listener = asyncio.create_task(listen())
+
+    async def stop_listener(self):
+        """Cancela a subscrição (chamado no encerramento da aplicação)."""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._redis = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores de acertos e falhas e a versão em cache."""
+        return {"hits": self.hits, "misses": self.misses, "version": self.version}
+
+
+app_config_cache = AppConfigCache(ttl=APP_CONFIG_CACHE_TTL_SECONDS)
@@ -7,17 +7,97 @@ Ele abstrai a lógica de acesso ao banco, permitindo que as rotas (routers) perm
 limpas e focadas na lógica da API, sem se preocuparem com os detalhes do banco de dados.
 """
 from bson import ObjectId
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, List, Optional, Dict, Any, Set, Tuple, Union
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from .database import get_database
-from . import schemas
+from . import rollups, schemas
 from .models import Event, UserInDB, ResourceInDB, AppConfig
-from .security import get_password_hash
+from .security import get_password_hash_async, user_cache
+from .graph import resource_graph
+from .search import search_index
+from .tag_query import TagQueryError, compile_tag_query
+from .config_cache import app_config_cache
 from datetime import datetime, timezone
+import base64
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Número de operações enviadas ao MongoDB em cada escrita em lote da importação.
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+
+# Campos de um recurso que podem ser pedidos através do parâmetro 'fields'.
+# O '_id' e o 'name' são sempre devolvidos, pois formam a chave da paginação.
+RESOURCE_FIELDS = ("name", "description", "tags", "related_resources", "events")
+DEFAULT_RESOURCE_FIELDS = ("name", "description", "tags", "related_resources")
+
+async def _aiter(items: Iterable[Any]) -> AsyncIterator[Any]:
+    """Adapta um iterável síncrono para ser percorrido com 'async for'."""
+    for item in items:
+        yield item
+
+# --- Funções Auxiliares para Paginação por Cursor ---
+def encode_cursor(*values: Any) -> str:
+    """
+    Codifica os valores da chave de ordenação do último item de uma página num cursor opaco.
+
+    Args:
+        *values: Os valores (serializáveis em JSON) que identificam a posição na ordenação.
+
+    Returns:
+        str: O cursor codificado em base64 seguro para URLs.
+    """
+    raw = json.dumps(list(values), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Descodifica um cursor gerado por `encode_cursor`.
+
+    Raises:
+        ValueError: Se o cursor estiver malformado.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Cursor inválido.")
+    if not isinstance(values, list):
+        raise ValueError("Cursor inválido.")
+    return values
+
+def resource_projection(fields: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Monta a projeção do MongoDB para os campos de recurso pedidos.
+    Sem campos explícitos, o histórico de eventos é excluído.
+
+    Raises:
+        ValueError: Se algum campo pedido não existir.
+    """
+    requested = list(fields) if fields else list(DEFAULT_RESOURCE_FIELDS)
+    unknown = [f for f in requested if f not in RESOURCE_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}. Permitidos: {', '.join(RESOURCE_FIELDS)}.")
+    projection = {field: 1 for field in requested}
+    projection["name"] = 1
+    return projection
+
+class DuplicateResourceNameError(ValueError):
+    """Levantada quando já existe um recurso com o mesmo nome (sem distinção de maiúsculas)."""
+    def __init__(self, name: str):
+        super().__init__(f"Um recurso com o nome '{name}' já existe.")
+        self.name = name
+
+def name_key(name: str) -> str:
+    """
+    Normaliza um nome de recurso para comparação sem distinção de maiúsculas.
+    O valor é guardado no campo 'name_key', que tem um índice único.
+    """
+    return name.casefold()
+
 # --- Função Auxiliar para Tags ---
 def _normalize_tags(tags: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """
@@ -41,11 +121,135 @@ def get_user_collection():
     """Retorna a coleção 'users' do MongoDB."""
     return get_database().get_collection("users")
 
+def get_event_collection():
+    """Retorna a coleção 'events' do MongoDB, onde o histórico de eventos de cada recurso é guardado."""
+    return get_database().get_collection("events")
+
+def get_meta_collection():
+    """Retorna a coleção 'app_meta', com contadores partilhados por todos os workers."""
+    return get_database().get_collection("app_meta")
+
+# --- Versão do Catálogo ---
+
+async def get_catalog_version() -> int:
+    """
+    Retorna a versão atual do catálogo (recursos, relações e eventos).
+    O contador é guardado no MongoDB para ser partilhado por todos os workers.
+    """
+    meta = await get_meta_collection().find_one({"_id": "catalog"}, {"version": 1})
+    return meta["version"] if meta else 0
+
+async def get_resources_version() -> int:
+    """
+    Retorna a versão dos recursos (nomes, descrições, tags e relações), que, ao contrário da
+    versão do catálogo, não muda com a escrita de eventos. Guardada no mesmo documento partilhado.
+    """
+    meta = await get_meta_collection().find_one({"_id": "catalog"}, {"resources_version": 1})
+    return (meta or {}).get("resources_version", 0)
+
+async def bump_catalog_version(resources: bool = False) -> int:
+    """
+    Incrementa a versão do catálogo. Deve ser chamada por todas as funções que o alteram;
+    as que alteram recursos (e não apenas eventos) passam `resources=True`, o que também
+    incrementa a versão dos recursos. Estas funções atualizam os índices em memória
+    antes de chamar esta função.
+    """
+    increments = {"version": 1, "resources_version": 1} if resources else {"version": 1}
+    meta = await get_meta_collection().find_one_and_update(
+        {"_id": "catalog"}, {"$inc": increments}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    if resources:
+        # A escrita já foi aplicada ao índice em memória deste worker.
+        resource_graph.advance(meta["resources_version"])
+        search_index.advance(meta["resources_version"])
+    return meta["version"]
+
+# --- Facetas de Tags ---
+
+# Última agregação de facetas, válida enquanto a versão dos recursos não mudar.
+_tag_facets_cache: Dict[str, Any] = {"database": None, "version": None, "facets": None}
+
+async def get_tag_facets() -> Dict[str, Dict[str, int]]:
+    """
+    Conta, por chave e valor, as tags dos recursos, com uma agregação no MongoDB.
+    O resultado fica em cache até à próxima escrita de recursos (ver `get_resources_version`);
+    a escrita de eventos não o invalida.
+
+    Returns:
+        Dict[str, Dict[str, int]]: chave -> valor -> número de recursos. As chaves vêm por ordem
+        alfabética e os valores por contagem decrescente.
+    """
+    database = get_database()
+    version = await get_resources_version()
+    if _tag_facets_cache["database"] is database and _tag_facets_cache["version"] == version:
+        return _tag_facets_cache["facets"]
+    pipeline = [
+        {"$unwind": "$tags"},
+        {"$group": {"_id": {"key": "$tags.key", "value": "$tags.value"}, "count": {"$sum": 1}}},
+    ]
+    groups = [group async for group in get_resource_collection().aggregate(pipeline)]
+    groups.sort(key=lambda g: (g["_id"]["key"], -g["count"], g["_id"]["value"]))
+    facets: Dict[str, Dict[str, int]] = {}
+    for group in groups:
+        facets.setdefault(group["_id"]["key"], {})[group["_id"]["value"]] = group["count"]
+    _tag_facets_cache.update(database=database, version=version, facets=facets)
+    return facets
+
+# --- Funções Auxiliares para Eventos ---
+def _event_from_doc(event_data: Dict[str, Any]) -> Event:
+    """Converte um documento da coleção 'events' no modelo Event."""
+    return Event(event_type=event_data["event_type"], timestamp=event_data["timestamp"], message=event_data.get("message"))
+
+def _event_to_out(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte um documento da coleção 'events' diretamente no formato de saída de 'Event'."""
+    return {"event_type": event_data["event_type"], "timestamp": event_data["timestamp"], "message": event_data.get("message")}
+
+async def _load_events(
+    resource_ids: List[ObjectId],
+    convert: Callable[[Dict[str, Any]], Any] = _event_from_doc,
+) -> Dict[str, List[Any]]:
+    """
+    Carrega, numa única consulta, os eventos de vários recursos ordenados cronologicamente.
+
+    Args:
+        resource_ids (List[ObjectId]): Os IDs dos recursos.
+        convert: Função aplicada a cada documento (por omissão, converte no modelo Event).
+
+    Returns:
+        Dict[str, List[Any]]: Os eventos agrupados pelo ID (string) do recurso.
+    """
+    events_by_resource: Dict[str, List[Any]] = {str(rid): [] for rid in resource_ids}
+    if not resource_ids:
+        return events_by_resource
+    cursor = get_event_collection().find({"resource_id": {"$in": resource_ids}}).sort([("timestamp", 1), ("_id", 1)])
+    async for event_data in cursor:
+        events_by_resource[str(event_data["resource_id"])].append(convert(event_data))
+    return events_by_resource
+
+def resource_to_out(resource_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte um documento de recurso do MongoDB diretamente no formato de saída da API
+    ('schemas.ResourceOut'), sem passar pelos modelos Pydantic. Os campos ausentes
+    (por causa de uma projeção) recebem os mesmos valores por omissão do schema.
+    """
+    return {
+        "id": str(resource_data["_id"]),
+        "name": resource_data["name"],
+        "description": resource_data.get("description"),
+        "tags": [{"key": tag["key"], "value": tag["value"]} for tag in resource_data.get("tags") or []],
+        "related_resources": [str(res_id) for res_id in resource_data.get("related_resources") or []],
+        "events": resource_data.get("events") or [],
+    }
+
+def _resource_in_db(resource_out: Dict[str, Any]) -> ResourceInDB:
+    """Converte um recurso no formato de saída (ver `resource_to_out`) no modelo ResourceInDB."""
+    return ResourceInDB(**{**resource_out, "id": ObjectId(resource_out["id"])})
+
 # --- CRUD para Recursos ---
 
 async def get_resource_by_name(name: str) -> Optional[ResourceInDB]:
     """
-    Busca um único recurso pelo seu nome (case-insensitive).
+    Busca um único recurso pelo seu nome (case-insensitive), através do índice único em 'name_key'.
     
     Args:
         name (str): O nome do recurso a ser procurado.
@@ -53,7 +257,7 @@ async def get_resource_by_name(name: str) -> Optional[ResourceInDB]:
     Returns:
         Optional[ResourceInDB]: O objeto do recurso se encontrado, caso contrário None.
     """
-    resource_data = await get_resource_collection().find_one({"name": {"$regex": f"^{name}$", "$options": "i"}})
+    resource_data = await get_resource_collection().find_one({"name_key": name_key(name)}, {"events": 0})
     if resource_data:
         if 'related_resources' in resource_data:
             resource_data['related_resources'] = [str(res_id) for res_id in resource_data['related_resources']]
@@ -62,23 +266,33 @@ async def get_resource_by_name(name: str) -> Optional[ResourceInDB]:
 
 async def create_resource(resource: schemas.ResourceCreate) -> ResourceInDB:
     """
-    Cria um novo documento de recurso, normalizando as tags e inicializando os eventos.
+    Cria um novo documento de recurso, normalizando as tags.
+    Os eventos não fazem parte do documento: vivem na coleção 'events'.
     
     Args:
         resource (schemas.ResourceCreate): O objeto Pydantic com os dados do recurso a ser criado.
         
     Returns:
         ResourceInDB: O objeto do recurso recém-criado, validado pelo Pydantic.
+
+    Raises:
+        DuplicateResourceNameError: Se o nome já estiver em uso (garantido pelo índice único).
     """
     resource_dict = resource.model_dump()
+    resource_dict["name_key"] = name_key(resource.name)
     resource_dict["tags"] = _normalize_tags(resource_dict.get("tags", []))
-    resource_dict["events"] = []
     if "related_resources" in resource_dict:
         resource_dict["related_resources"] = [ObjectId(rid) for rid in resource.related_resources if ObjectId.is_valid(rid)]
-    new_resource = await get_resource_collection().insert_one(resource_dict)
+    try:
+        new_resource = await get_resource_collection().insert_one(resource_dict)
+    except DuplicateKeyError:
+        raise DuplicateResourceNameError(resource.name)
     created_resource_data = await get_resource_collection().find_one({"_id": new_resource.inserted_id})
     if 'related_resources' in created_resource_data:
         created_resource_data['related_resources'] = [str(res_id) for res_id in created_resource_data['related_resources']]
+    resource_graph.upsert(str(new_resource.inserted_id), created_resource_data["name"], created_resource_data.get("related_resources", []))
+    search_index.upsert(str(new_resource.inserted_id), created_resource_data)
+    await bump_catalog_version(resources=True)
     return ResourceInDB(**created_resource_data)
 
 async def update_resource(resource_id: str, resource_data: schemas.ResourceUpdate) -> Optional[ResourceInDB]:
@@ -91,20 +305,38 @@ async def update_resource(resource_id: str, resource_data: schemas.ResourceUpdat
         
     Returns:
         Optional[ResourceInDB]: O objeto do recurso atualizado, ou None se não for encontrado.
+
+    Raises:
+        DuplicateResourceNameError: Se o novo nome já estiver em uso por outro recurso.
     """
     if not ObjectId.is_valid(resource_id): return None
     update_data = resource_data.model_dump(exclude_unset=True) 
+    if update_data.get("name") is not None:
+        update_data["name_key"] = name_key(update_data["name"])
     if "tags" in update_data and update_data["tags"] is not None:
         update_data["tags"] = _normalize_tags(update_data["tags"])
     if "related_resources" in update_data and update_data["related_resources"] is not None:
         update_data["related_resources"] = [ObjectId(rid) for rid in update_data["related_resources"] if ObjectId.is_valid(rid)]
+    matched = False
     if len(update_data) >= 1:
-        await get_resource_collection().update_one({"_id": ObjectId(resource_id)}, {"$set": update_data})
-    return await get_resource(resource_id)
+        try:
+            result = await get_resource_collection().update_one({"_id": ObjectId(resource_id)}, {"$set": update_data})
+        except DuplicateKeyError:
+            raise DuplicateResourceNameError(update_data["name"])
+        if result.matched_count:
+            matched = True
+            resource_graph.upsert(resource_id, update_data.get("name"), update_data.get("related_resources"))
+    updated_resource = await get_resource(resource_id)
+    if updated_resource and {"name", "description", "tags"} & update_data.keys():
+        search_index.upsert(resource_id, updated_resource.model_dump())
+    if matched:
+        await bump_catalog_version(resources=True)
+    return updated_resource
 
 async def clone_resource(resource_id: str) -> Optional[ResourceInDB]:
     """
     Clona um recurso, criando uma cópia com um novo nome e sem o histórico de eventos.
+    Se o nome "<nome> - Cópia" já existir, é acrescentado um número ("<nome> - Cópia 2", ...).
     
     Args:
         resource_id (str): O ID do recurso a ser clonado.
@@ -112,147 +344,680 @@ async def clone_resource(resource_id: str) -> Optional[ResourceInDB]:
     Returns:
         Optional[ResourceInDB]: O objeto do recurso clonado, ou None se o original não for encontrado.
     """
-    original_resource = await get_resource(resource_id)
+    original_resource = await get_resource(resource_id, with_events=False)
     if not original_resource: return None
     
-    cloned_data = schemas.ResourceCreate(
-        name=f"{original_resource.name} - Cópia",
-        description=original_resource.description,
-        tags=original_resource.tags,
-        related_resources=original_resource.related_resources,
-    )
-    return await create_resource(cloned_data)
+    base_name = f"{original_resource.name} - Cópia"
+    for attempt in range(1, 101):
+        cloned_data = schemas.ResourceCreate(
+            name=base_name if attempt == 1 else f"{base_name} {attempt}",
+            description=original_resource.description,
+            tags=original_resource.tags,
+            related_resources=original_resource.related_resources,
+        )
+        try:
+            return await create_resource(cloned_data)
+        except DuplicateResourceNameError:
+            continue
+    raise DuplicateResourceNameError(base_name)
+
+async def _flush_import_chunk(chunk: List[Tuple[Any, str, str]], summary: Dict[str, Any], name_to_id_map: Dict[str, ObjectId]):
+    """
+    Aplica numa única escrita em lote (não ordenada) as operações de um bloco da importação.
 
-async def import_resources(resources_to_import: List[schemas.ResourceImport]) -> Dict[str, Any]:
+    Args:
+        chunk: Tuplos (operação, nome do recurso, "created" ou "updated").
+        summary: O sumário da importação, atualizado com contagens e erros.
+        name_to_id_map: O mapa nome normalizado -> ID; as criações falhadas são removidas dele.
+    """
+    if not chunk:
+        return
+    failed: Dict[int, str] = {}
+    try:
+        await get_resource_collection().bulk_write([op for op, _, _ in chunk], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error.get("errmsg", "erro de escrita")
+    for index, (_, name, outcome) in enumerate(chunk):
+        if index in failed:
+            summary["errors"].append(f"Item '{name}': {failed[index]}")
+            if outcome == "created":
+                name_to_id_map.pop(name_key(name), None)
+        else:
+            summary[outcome] += 1
+
+async def import_resources(
+    resources_to_import: Union[Iterable[schemas.ResourceImport], AsyncIterable[schemas.ResourceImport]],
+    chunk_size: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     Importa uma lista de recursos, criando novos ou atualizando existentes.
     Preserva os eventos dos recursos que são atualizados.
+
+    Os nomes existentes são obtidos numa única consulta e as alterações são aplicadas
+    com escritas em lote ('bulk_write') não ordenadas, em blocos de `chunk_size` itens.
+    A entrada pode ser um iterável assíncrono, permitindo importar um corpo NDJSON à medida
+    que é recebido, sem manter a lista completa de recursos em memória. As relações são
+    resolvidas por nome (sem distinção de maiúsculas), entre os recursos importados e os
+    já existentes no catálogo. Um nome repetido na própria importação (após a normalização)
+    é reportado como erro e ignorado; prevalece a primeira ocorrência.
     
     Args:
-        resources_to_import (List[schemas.ResourceImport]): Uma lista de objetos de recurso para importar.
+        resources_to_import: Os recursos a importar (iterável síncrono ou assíncrono).
+        chunk_size (Optional[int]): Número de operações por escrita em lote. Por omissão, IMPORT_CHUNK_SIZE.
         
     Returns:
         Dict[str, Any]: Um sumário da operação, com contagem de criados, atualizados e erros.
     """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
     summary = {"created": 0, "updated": 0, "errors": []}
-    name_to_id_map: Dict[str, str] = {}
-    
-    # Passagem 1: Criar/atualizar dados básicos e construir o mapa nome -> ID.
-    for res_import in resources_to_import:
-        try:
-            base_payload = {"name": res_import.name, "description": res_import.description, "tags": res_import.tags}
-            
-            existing_resource = await get_resource_by_name(res_import.name)
-            if existing_resource:
-                update_schema = schemas.ResourceUpdate(**base_payload)
-                updated_resource = await update_resource(str(existing_resource.id), update_schema)
-                name_to_id_map[res_import.name] = str(updated_resource.id)
-                summary["updated"] += 1
-            else:
-                create_schema = schemas.ResourceCreate(**base_payload)
-                new_resource = await create_resource(create_schema)
-                name_to_id_map[res_import.name] = str(new_resource.id)
-                summary["created"] += 1
-        except Exception as e:
-            summary["errors"].append(f"Item '{res_import.name}': {str(e)}")
-
-    # Passagem 2: Atualizar apenas as relações ('related_resources').
-    for res_import in resources_to_import:
-        res_name = res_import.name
-        res_id = name_to_id_map.get(res_name)
-        if not res_id: continue
+
+    # Uma única consulta (apenas o nome normalizado) para conhecer os recursos existentes.
+    name_to_id_map: Dict[str, ObjectId] = {}
+    async for resource_data in get_resource_collection().find({}, {"name": 1, "name_key": 1}):
+        name_to_id_map.setdefault(resource_data.get("name_key") or name_key(resource_data["name"]), resource_data["_id"])
+
+    if not hasattr(resources_to_import, "__aiter__"):
+        resources_to_import = _aiter(resources_to_import)
+
+    # Passagem 1: Criar/atualizar dados básicos, em blocos, guardando apenas as relações pendentes.
+    pending_relations: List[Tuple[ObjectId, str, List[str]]] = []
+    imported: Dict[ObjectId, Dict[str, Any]] = {}
+    # Nome normalizado -> nome da primeira ocorrência nesta importação.
+    seen_names: Dict[str, str] = {}
+    chunk: List[Tuple[Any, str, str]] = []
+    async for res_import in resources_to_import:
+        key = name_key(res_import.name)
+        if key in seen_names:
+            summary["errors"].append(f"Item '{res_import.name}': Nome repetido na importação (já importado como '{seen_names[key]}'); ignorado.")
+            continue
+        seen_names[key] = res_import.name
+        base_payload = {
+            "name": res_import.name,
+            "name_key": key,
+            "description": res_import.description,
+            "tags": _normalize_tags([tag.model_dump() for tag in res_import.tags]),
+        }
+        existing_id = name_to_id_map.get(key)
+        if existing_id:
+            chunk.append((UpdateOne({"_id": existing_id}, {"$set": base_payload}), res_import.name, "updated"))
+            resource_id = existing_id
+        else:
+            resource_id = ObjectId()
+            chunk.append((InsertOne({"_id": resource_id, **base_payload, "related_resources": []}), res_import.name, "created"))
+            name_to_id_map[key] = resource_id
+        imported[resource_id] = {"name": res_import.name}
+        pending_relations.append((resource_id, res_import.name, res_import.related_resources))
+        if len(chunk) >= chunk_size:
+            await _flush_import_chunk(chunk, summary, name_to_id_map)
+            chunk = []
+    await _flush_import_chunk(chunk, summary, name_to_id_map)
+
+    # Passagem 2: Atualizar apenas as relações ('related_resources'), também em lote.
+    relation_ops: List[Tuple[ObjectId, UpdateOne]] = []
+    for resource_id, res_name, related_names in pending_relations:
+        if name_to_id_map.get(name_key(res_name)) != resource_id:
+            continue  # A criação deste item falhou na primeira passagem.
+        related_ids = [name_to_id_map[name_key(n)] for n in related_names if name_key(n) in name_to_id_map]
+        imported[resource_id]["related"] = related_ids
+        relation_ops.append((resource_id, UpdateOne({"_id": resource_id}, {"$set": {"related_resources": related_ids}})))
+    for start in range(0, len(relation_ops), chunk_size):
+        batch = relation_ops[start:start + chunk_size]
         try:
-            related_ids = [name_to_id_map[name] for name in res_import.related_resources if name in name_to_id_map]
-            await get_resource_collection().update_one(
-                {"_id": ObjectId(res_id)},
-                {"$set": {"related_resources": [ObjectId(rid) for rid in related_ids]}}
-            )
-        except Exception as e:
-            summary["errors"].append(f"Item '{res_name}': Falha ao atualizar relações - {str(e)}")
+            await get_resource_collection().bulk_write([op for _, op in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_id = batch[error["index"]][0]
+                summary["errors"].append(f"Item '{imported[failed_id]['name']}': Falha ao atualizar relações - {error.get('errmsg')}")
+                imported[failed_id].pop("related", None)
+
+    for resource_id, data in imported.items():
+        if name_to_id_map.get(name_key(data["name"])) == resource_id:
+            resource_graph.upsert(str(resource_id), data["name"], [str(rid) for rid in data["related"]] if "related" in data else None)
+    if imported and search_index.is_loaded():
+        cursor = get_resource_collection().find({"_id": {"$in": list(imported)}}, {"name": 1, "description": 1, "tags": 1})
+        async for resource_data in cursor:
+            search_index.upsert(str(resource_data["_id"]), resource_data)
+    if imported:
+        await bump_catalog_version(resources=True)
 
     return summary
 
-async def get_resource(resource_id: str) -> Optional[ResourceInDB]:
+async def get_resource_out(resource_id: str, with_events: bool = True) -> Optional[Dict[str, Any]]:
     """
-    Busca um único recurso pelo seu ID.
+    Busca um único recurso pelo seu ID, já no formato de saída da API (ver `resource_to_out`).
     
     Args:
         resource_id (str): O ID do recurso a ser procurado.
+        with_events (bool): Se True, carrega o histórico de eventos da coleção 'events'.
         
     Returns:
-        Optional[ResourceInDB]: O objeto do recurso se encontrado, caso contrário None.
+        Optional[Dict[str, Any]]: O recurso se encontrado, caso contrário None.
     """
     if not ObjectId.is_valid(resource_id): return None
-    resource_data = await get_resource_collection().find_one({"_id": ObjectId(resource_id)})
-    if resource_data:
-        if 'related_resources' in resource_data:
-            resource_data['related_resources'] = [str(res_id) for res_id in resource_data['related_resources']]
-        return ResourceInDB(**resource_data)
-    return None
+    resource_data = await get_resource_collection().find_one({"_id": ObjectId(resource_id)}, {"events": 0})
+    if resource_data is None:
+        return None
+    if with_events:
+        resource_data["events"] = (await _load_events([resource_data["_id"]], _event_to_out))[resource_id]
+    return resource_to_out(resource_data)
 
-async def get_all_resources(name: Optional[str] = None, tags: Optional[str] = None) -> List[ResourceInDB]:
+async def get_resource(resource_id: str, with_events: bool = True) -> Optional[ResourceInDB]:
     """
-    Busca todos os recursos, com filtros opcionais por nome e tags.
+    Busca um único recurso pelo seu ID.
     
     Args:
-        name (Optional[str]): Filtra recursos cujo nome contenha este valor.
-        tags (Optional[str]): Filtra recursos que contenham as tags no formato "chave:valor,chave2:valor2".
+        resource_id (str): O ID do recurso a ser procurado.
+        with_events (bool): Se True, carrega o histórico de eventos da coleção 'events'.
         
     Returns:
-        List[ResourceInDB]: Uma lista de objetos de recurso.
+        Optional[ResourceInDB]: O objeto do recurso se encontrado, caso contrário None.
+    """
+    resource_data = await get_resource_out(resource_id, with_events)
+    return _resource_in_db(resource_data) if resource_data else None
+
+def _resource_filter_query(name: Optional[str] = None, tags: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Monta a query do MongoDB para os filtros de nome e de tags das listagens.
+
+    Args:
+        name (Optional[str]): Filtra recursos cujo nome contenha este valor.
+        tags (Optional[str]): Filtro de tags (ver 'tag_query'), ex: "env:prod AND NOT team:core".
+
+    Raises:
+        TagQueryError: Se o filtro de tags for inválido.
     """
     query = {}
     if name:
         query["name"] = {"$regex": name, "$options": "i"}
     if tags:
-        tag_list = []
-        for pair in tags.split(','):
-            if ':' in pair:
-                key, value = pair.split(':', 1)
-                tag_list.append({"key": key, "value": {"$regex": value, "$options": "i"}})
-        if tag_list:
-            query["tags"] = {"$elemMatch": {"$or": tag_list}}
+        tag_query = compile_tag_query(tags)
+        if tag_query:
+            query = {"$and": [query, tag_query]} if query else tag_query
+    return query
+
+async def get_all_resources_out(
+    name: Optional[str] = None,
+    tags: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Busca os recursos ordenados por nome, com filtros opcionais por nome e tags,
+    já no formato de saída da API (ver `resource_to_out`).
+    Suporta paginação por cursor (keyset sobre 'name' e '_id') e projeção de campos.
+    
+    Args:
+        name (Optional[str]): Filtra recursos cujo nome contenha este valor.
+        tags (Optional[str]): Filtro de tags (ver 'tag_query'), ex: "env:prod AND NOT team:core".
+        limit (Optional[int]): Número máximo de recursos a devolver.
+        after (Optional[str]): Cursor do último recurso da página anterior (ver `encode_cursor`).
+        fields (Optional[List[str]]): Campos a devolver. Por omissão, todos exceto 'events'.
+        
+    Returns:
+        List[Dict[str, Any]]: Os recursos encontrados.
+
+    Raises:
+        ValueError: Se o cursor ou os campos pedidos forem inválidos.
+    """
+    projection = resource_projection(fields)
+    # Os eventos vêm da coleção 'events', e não do documento do recurso.
+    with_events = projection.pop("events", None) is not None
+    query = _resource_filter_query(name, tags)
+    if after:
+        values = decode_cursor(after)
+        if len(values) != 2 or not ObjectId.is_valid(values[1]):
+            raise ValueError("Cursor inválido.")
+        after_name, after_id = values[0], ObjectId(values[1])
+        keyset = {"$or": [{"name": {"$gt": after_name}}, {"name": after_name, "_id": {"$gt": after_id}}]}
+        query = {"$and": [query, keyset]} if query else keyset
             
-    resources = []
-    cursor = get_resource_collection().find(query)
+    cursor = get_resource_collection().find(query, projection).sort([("name", 1), ("_id", 1)])
+    if limit:
+        cursor = cursor.limit(limit)
+    documents = [resource_data async for resource_data in cursor]
+    if with_events:
+        events_by_resource = await _load_events([r["_id"] for r in documents], _event_to_out)
+        for resource_data in documents:
+            resource_data["events"] = events_by_resource[str(resource_data["_id"])]
+    return [resource_to_out(resource_data) for resource_data in documents]
+
+async def get_resources_out_by_ids(resource_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Busca, numa única consulta, os recursos com os IDs indicados (sem o histórico de eventos),
+    no formato de saída da API.
+
+    Args:
+        resource_ids (List[str]): Os IDs dos recursos.
+
+    Returns:
+        List[Dict[str, Any]]: Os recursos encontrados, ordenados por nome.
+    """
+    object_ids = [ObjectId(rid) for rid in resource_ids if ObjectId.is_valid(rid)]
+    if not object_ids:
+        return []
+    cursor = get_resource_collection().find({"_id": {"$in": object_ids}}, resource_projection()).sort([("name", 1), ("_id", 1)])
+    return [resource_to_out(resource_data) async for resource_data in cursor]
+
+def _event_to_export(event: Event) -> Dict[str, Any]:
+    """Converte um evento no formato usado pela exportação."""
+    return {"event_type": event.event_type, "message": event.message, "timestamp": event.timestamp.isoformat()}
+
+async def iter_resources_for_export(
+    name: Optional[str] = None,
+    tags: Optional[str] = None,
+    include_events: bool = False,
+    batch_size: int = 200,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Percorre o catálogo, ordenado por nome, no formato aceite por `schemas.ResourceImport`:
+    as relações são devolvidas como nomes, e não como IDs. Os recursos são lidos em lotes
+    de `batch_size`, e os eventos de cada lote (se pedidos) numa única consulta.
+
+    Yields:
+        Dict[str, Any]: Um recurso pronto a ser serializado.
+    """
+    await resource_graph.ensure_loaded()
+    query = _resource_filter_query(name, tags)
+    projection = {"name": 1, "description": 1, "tags": 1, "related_resources": 1}
+    cursor = get_resource_collection().find(query, projection, batch_size=batch_size).sort([("name", 1), ("_id", 1)])
+
+    async def export_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        events_by_resource = await _load_events([r["_id"] for r in batch]) if include_events else {}
+        exported = []
+        for resource_data in batch:
+            item = {
+                "name": resource_data["name"],
+                "description": resource_data.get("description"),
+                "tags": resource_data.get("tags", []),
+                "related_resources": [
+                    resource_graph.names[str(rid)] for rid in resource_data.get("related_resources", [])
+                    if str(rid) in resource_graph.names
+                ],
+            }
+            if include_events:
+                item["events"] = [_event_to_export(e) for e in events_by_resource[str(resource_data["_id"])]]
+            exported.append(item)
+        return exported
+
+    batch: List[Dict[str, Any]] = []
     async for resource_data in cursor:
-        if 'related_resources' in resource_data:
-            resource_data['related_resources'] = [str(res_id) for res_id in resource_data['related_resources']]
-        resources.append(ResourceInDB(**resource_data))
-    return resources
+        batch.append(resource_data)
+        if len(batch) >= batch_size:
+            for item in await export_batch(batch):
+                yield item
+            batch = []
+    if batch:
+        for item in await export_batch(batch):
+            yield item
 
 async def delete_resource(resource_id: str) -> bool:
-    """Deleta um recurso e remove as suas referências de outros recursos."""
+    """Deleta um recurso, os seus eventos (ativos e arquivados) e remove as suas referências de outros recursos."""
     if not ObjectId.is_valid(resource_id): return False
-    await get_resource_collection().update_many({"related_resources": ObjectId(resource_id)}, {"$pull": {"related_resources": ObjectId(resource_id)}})
+    pull_result = await get_resource_collection().update_many({"related_resources": ObjectId(resource_id)}, {"$pull": {"related_resources": ObjectId(resource_id)}})
     delete_result = await get_resource_collection().delete_one({"_id": ObjectId(resource_id)})
+    await get_event_collection().delete_many({"resource_id": ObjectId(resource_id)})
+    await get_event_archive_collection().delete_many({"resource_id": ObjectId(resource_id)})
+    await get_retention_policy_collection().delete_many({"resource_id": ObjectId(resource_id)})
+    await rollups.remove_resources([ObjectId(resource_id)])
+    resource_graph.remove([resource_id])
+    search_index.remove([resource_id])
+    # Excluir um ID inexistente não pode invalidar os ETags nem os índices dos outros workers.
+    if delete_result.deleted_count or pull_result.modified_count:
+        await bump_catalog_version(resources=True)
     return delete_result.deleted_count > 0
 
 async def delete_multiple_resources(resource_ids: List[str]) -> int:
-    """Deleta múltiplos recursos e remove as suas referências."""
+    """Deleta múltiplos recursos, os seus eventos e remove as suas referências."""
     object_ids = [ObjectId(rid) for rid in resource_ids if ObjectId.is_valid(rid)]
     if not object_ids: return 0
-    await get_resource_collection().update_many({"related_resources": {"$in": object_ids}}, {"$pull": {"related_resources": {"$in": object_ids}}})
+    pull_result = await get_resource_collection().update_many({"related_resources": {"$in": object_ids}}, {"$pull": {"related_resources": {"$in": object_ids}}})
     delete_result = await get_resource_collection().delete_many({"_id": {"$in": object_ids}})
+    await get_event_collection().delete_many({"resource_id": {"$in": object_ids}})
+    await get_event_archive_collection().delete_many({"resource_id": {"$in": object_ids}})
+    await get_retention_policy_collection().delete_many({"resource_id": {"$in": object_ids}})
+    await rollups.remove_resources(object_ids)
+    resource_graph.remove([str(oid) for oid in object_ids])
+    search_index.remove([str(oid) for oid in object_ids])
+    if delete_result.deleted_count or pull_result.modified_count:
+        await bump_catalog_version(resources=True)
     return delete_result.deleted_count
 
-async def add_event_to_resource(resource_id: str, event: schemas.EventCreate) -> Optional[ResourceInDB]:
-    """Adiciona um evento ao array 'events' de um documento de recurso."""
-    if not ObjectId.is_valid(resource_id): return None
+async def resource_exists(resource_id: str) -> bool:
+    """Verifica, lendo apenas o '_id', se existe um recurso com este ID."""
+    if not ObjectId.is_valid(resource_id): return False
+    return await get_resource_collection().find_one({"_id": ObjectId(resource_id)}, {"_id": 1}) is not None
+
+async def existing_resource_ids(resource_ids: Iterable[ObjectId]) -> Set[ObjectId]:
+    """Retorna, dos IDs indicados, os que pertencem a recursos existentes (lendo apenas o '_id')."""
+    cursor = get_resource_collection().find({"_id": {"$in": list(resource_ids)}}, {"_id": 1})
+    return {resource_data["_id"] async for resource_data in cursor}
+
+async def existing_event_ids(event_ids: Iterable[ObjectId]) -> Set[ObjectId]:
+    """Retorna, dos IDs indicados, os de eventos já gravados (lendo apenas o '_id')."""
+    cursor = get_event_collection().find({"_id": {"$in": list(event_ids)}}, {"_id": 1})
+    return {event_data["_id"] async for event_data in cursor}
+
+def new_event_document(resource_id: str, event: schemas.EventCreate) -> Dict[str, Any]:
+    """
+    Prepara o documento de um novo evento, com a data atual, para gravação na coleção 'events'.
+    O '_id' é gerado já aqui, para que uma nova tentativa de gravação possa saber se ele foi gravado.
+    """
     event_dict = event.model_dump()
+    event_dict['_id'] = ObjectId()
     event_dict['timestamp'] = datetime.now(timezone.utc)
-    await get_resource_collection().update_one({"_id": ObjectId(resource_id)}, {"$push": {"events": event_dict}})
+    event_dict['resource_id'] = ObjectId(resource_id)
+    return event_dict
+
+async def insert_event_documents(documents: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Grava documentos de evento já preparados ('resource_id', 'event_type', 'message', 'timestamp')
+    numa única escrita em lote não ordenada, atualiza as contagens pré-agregadas ('rollups')
+    e incrementa a versão do catálogo. É o ponto comum a todos os caminhos de escrita de eventos.
+
+    Returns:
+        List[Optional[str]]: Para cada documento, None se foi gravado ou a mensagem de erro.
+    """
+    errors: List[Optional[str]] = [None] * len(documents)
+    if not documents:
+        return errors
+    try:
+        await get_event_collection().bulk_write([InsertOne(doc) for doc in documents], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            errors[error["index"]] = error.get("errmsg") or "Falha ao gravar o evento."
+    try:
+        await rollups.record([doc for doc, error in zip(documents, errors) if error is None])
+    except Exception as e:
+        # Os eventos já estão gravados; as contagens podem ser recalculadas com 'manage rebuild-rollups'.
+        print(f"Falha ao atualizar as contagens de eventos: {e}")
+    await bump_catalog_version()
+    return errors
+
+async def add_event_to_resource(resource_id: str, event: schemas.EventCreate) -> Optional[ResourceInDB]:
+    """Adiciona um evento ao histórico de um recurso, inserindo-o na coleção 'events'."""
+    if not await resource_exists(resource_id):
+        return None
+    await insert_event_documents([new_event_document(resource_id, event)])
     return await get_resource(resource_id)
 
-async def get_all_events() -> List[Event]:
-    """Busca todos os eventos de todos os recursos."""
-    events = []
-    cursor = get_resource_collection().find({}, {"events": 1, "_id": 0})
+async def add_events_batch(items: List[schemas.EventBatchItem]) -> Dict[str, Any]:
+    """
+    Insere vários eventos de uma só vez: os recursos (por ID ou nome) são resolvidos numa
+    única consulta e os eventos gravados numa única escrita em lote não ordenada.
+
+    Args:
+        items (List[schemas.EventBatchItem]): Os eventos a inserir.
+
+    Returns:
+        Dict[str, Any]: As contagens de eventos criados e falhados e o estado de cada item
+        (ver `schemas.EventBatchResult`).
+    """
+    results: List[Dict[str, Any]] = [{"index": i, "status": "error", "resource_id": None, "error": None} for i in range(len(items))]
+    names = {name_key(item.resource_name) for item in items if not item.resource_id and item.resource_name}
+    ids = {ObjectId(item.resource_id) for item in items if item.resource_id and ObjectId.is_valid(item.resource_id)}
+    clauses = []
+    if names:
+        clauses.append({"name_key": {"$in": list(names)}})
+    if ids:
+        clauses.append({"_id": {"$in": list(ids)}})
+    existing_ids: set = set()
+    id_by_name: Dict[str, ObjectId] = {}
+    if clauses:
+        async for resource_data in get_resource_collection().find({"$or": clauses}, {"name_key": 1}):
+            existing_ids.add(resource_data["_id"])
+            if resource_data.get("name_key"):
+                id_by_name[resource_data["name_key"]] = resource_data["_id"]
+
+    received_at = datetime.now(timezone.utc)
+    documents = []
+    positions = []
+    for i, item in enumerate(items):
+        if item.resource_id:
+            resource_id = ObjectId(item.resource_id) if ObjectId.is_valid(item.resource_id) else None
+            resource_id = resource_id if resource_id in existing_ids else None
+        elif item.resource_name:
+            resource_id = id_by_name.get(name_key(item.resource_name))
+        else:
+            results[i]["error"] = "Indique 'resource_id' ou 'resource_name'."
+            continue
+        if resource_id is None:
+            results[i]["error"] = f"Recurso '{item.resource_id or item.resource_name}' não encontrado."
+            continue
+        timestamp = item.timestamp or received_at
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        documents.append({
+            "resource_id": resource_id,
+            "event_type": item.event_type,
+            "message": item.message,
+            "timestamp": timestamp,
+        })
+        positions.append(i)
+        results[i].update(status="created", resource_id=str(resource_id))
+
+    for position, error in zip(positions, await insert_event_documents(documents)):
+        if error:
+            results[position].update(status="error", error=error)
+
+    created = sum(1 for r in results if r["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "items": results}
+
+async def get_event_timeline(
+    resource_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_types: Optional[List[str]] = None,
+    descending: bool = True,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+) -> Optional[Tuple[List[Event], Optional[str]]]:
+    """
+    Busca uma página da timeline de eventos de um recurso.
+    Os filtros, a ordenação e a paginação são resolvidos pelo MongoDB através
+    do índice (resource_id, timestamp, _id), sem carregar o histórico completo.
+
+    Args:
+        resource_id (str): O ID do recurso.
+        start_date (Optional[datetime]): Data mínima (inclusiva) dos eventos.
+        end_date (Optional[datetime]): Data máxima (inclusiva) dos eventos.
+        event_types (Optional[List[str]]): Tipos de evento a incluir.
+        descending (bool): Se True, os eventos mais recentes vêm primeiro.
+        limit (Optional[int]): Tamanho da página.
+        after (Optional[str]): Cursor devolvido pela página anterior.
+
+    Returns:
+        Optional[Tuple[List[Event], Optional[str]]]: Os eventos e o cursor da página seguinte
+        (None se não houver mais), ou None se o recurso não existir.
+
+    Raises:
+        ValueError: Se o cursor for inválido.
+    """
+    if not ObjectId.is_valid(resource_id): return None
+    if not await get_resource_collection().find_one({"_id": ObjectId(resource_id)}, {"_id": 1}):
+        return None
+
+    query: Dict[str, Any] = {"resource_id": ObjectId(resource_id)}
+    if start_date or end_date:
+        query["timestamp"] = {}
+        if start_date: query["timestamp"]["$gte"] = start_date
+        if end_date: query["timestamp"]["$lte"] = end_date
+    if event_types:
+        query["event_type"] = {"$in": event_types}
+    if after:
+        values = decode_cursor(after)
+        if len(values) != 2 or not ObjectId.is_valid(values[1]):
+            raise ValueError("Cursor inválido.")
+        try:
+            after_ts = datetime.fromisoformat(values[0])
+        except (TypeError, ValueError):
+            raise ValueError("Cursor inválido.")
+        op = "$lt" if descending else "$gt"
+        keyset = {"$or": [{"timestamp": {op: after_ts}}, {"timestamp": after_ts, "_id": {op: ObjectId(values[1])}}]}
+        query = {"$and": [query, keyset]}
+
+    direction = -1 if descending else 1
+    cursor = get_event_collection().find(query).sort([("timestamp", direction), ("_id", direction)])
+    if limit:
+        cursor = cursor.limit(limit)
+    event_docs = await cursor.to_list(length=None)
+
+    next_cursor = None
+    if limit and len(event_docs) == limit:
+        last = event_docs[-1]
+        next_cursor = encode_cursor(last["timestamp"].isoformat(), str(last["_id"]))
+    return [_event_from_doc(e) for e in event_docs], next_cursor
+
+async def iter_events(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_types: Optional[List[str]] = None,
+    resource_ids: Optional[List[str]] = None,
+    batch_size: int = 500,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Percorre os eventos de todos os recursos em ordem cronológica, diretamente a partir
+    de um cursor do MongoDB, sem os acumular em memória.
+
+    Args:
+        start_date (Optional[datetime]): Data mínima (inclusiva) dos eventos.
+        end_date (Optional[datetime]): Data máxima (inclusiva) dos eventos.
+        event_types (Optional[List[str]]): Tipos de evento a incluir.
+        resource_ids (Optional[List[str]]): IDs dos recursos a incluir.
+        batch_size (int): Número de documentos pedidos ao MongoDB por lote.
+
+    Yields:
+        Dict[str, Any]: Os documentos de evento, tal como estão na coleção 'events'.
+    """
+    query: Dict[str, Any] = {}
+    if start_date or end_date:
+        query["timestamp"] = {}
+        if start_date: query["timestamp"]["$gte"] = start_date
+        if end_date: query["timestamp"]["$lte"] = end_date
+    if event_types:
+        query["event_type"] = {"$in": event_types}
+    if resource_ids is not None:
+        query["resource_id"] = {"$in": [ObjectId(rid) for rid in resource_ids if ObjectId.is_valid(rid)]}
+    cursor = get_event_collection().find(query, batch_size=batch_size).sort([("timestamp", 1), ("_id", 1)])
+    async for event_data in cursor:
+        yield event_data
+
+async def backfill_name_keys() -> Dict[str, Any]:
+    """
+    Preenche o campo 'name_key' dos recursos criados antes de ele existir.
+
+    Recursos cujo nome colide (sem distinção de maiúsculas) com outro já preenchido
+    não são alterados e são listados em 'duplicates', para correção manual. As colisões são
+    detetadas sem depender do índice único, que pode ainda não existir (a função é executada
+    no arranque da aplicação, antes de 'apply_indexes'). Sem recursos por preencher, custa
+    apenas uma consulta.
+
+    Returns:
+        Dict[str, Any]: O número de recursos atualizados e os nomes em conflito.
+    """
+    summary = {"updated": 0, "duplicates": []}
+    legacy = await get_resource_collection().find({"name_key": {"$exists": False}}, {"name": 1}).to_list(length=None)
+    if not legacy:
+        return summary
+    cursor = get_resource_collection().find({"name_key": {"$type": "string"}}, {"name_key": 1})
+    taken = {resource_data["name_key"] async for resource_data in cursor}
+    for resource_data in legacy:
+        key = name_key(resource_data["name"])
+        if key in taken:
+            summary["duplicates"].append(resource_data["name"])
+            continue
+        try:
+            await get_resource_collection().update_one({"_id": resource_data["_id"]}, {"$set": {"name_key": key}})
+        except DuplicateKeyError:
+            summary["duplicates"].append(resource_data["name"])
+            continue
+        taken.add(key)
+        summary["updated"] += 1
+    return summary
+
+async def migrate_embedded_events(batch_size: int = 500) -> Dict[str, int]:
+    """
+    Move os eventos guardados no array 'events' dos documentos de recurso (formato antigo)
+    para a coleção 'events', removendo depois o array do documento.
+
+    Cada evento é identificado pelo recurso e pela sua posição no array ('legacy_index'), e a
+    inserção usa upserts sobre essa chave: eventos idênticos são todos migrados e voltar a executar
+    a migração após uma interrupção não duplica eventos (nem as suas contagens).
+
+    Returns:
+        Dict[str, int]: O número de recursos e de eventos migrados (inseridos nesta execução).
+    """
+    summary = {"resources": 0, "events": 0}
+    cursor = get_resource_collection().find({"events": {"$exists": True}}, {"events": 1})
     async for resource_data in cursor:
-        if "events" in resource_data:
-            for event_data in resource_data["events"]:
-                events.append(Event(**event_data))
-    return events
+        docs = [
+            {
+                "resource_id": resource_data["_id"],
+                "legacy_index": index,
+                "event_type": event_data.get("event_type"),
+                "message": event_data.get("message"),
+                "timestamp": event_data.get("timestamp"),
+            }
+            for index, event_data in enumerate(resource_data.get("events") or [])
+        ]
+        for start in range(0, len(docs), batch_size):
+            chunk = docs[start:start + batch_size]
+            operations = [
+                UpdateOne({"resource_id": doc["resource_id"], "legacy_index": doc["legacy_index"]}, {"$setOnInsert": doc}, upsert=True)
+                for doc in chunk
+            ]
+            result = await get_event_collection().bulk_write(operations, ordered=False)
+            # Só os eventos efetivamente inseridos entram no resumo e nas contagens.
+            inserted = [chunk[index] for index in result.upserted_ids]
+            await rollups.record(inserted)
+            summary["events"] += len(inserted)
+        await get_resource_collection().update_one({"_id": resource_data["_id"]}, {"$unset": {"events": ""}})
+        summary["resources"] += 1
+    if summary["resources"]:
+        await bump_catalog_version()
+    return summary
+
+# --- CRUD para Políticas de Retenção de Eventos ---
+
+def get_retention_policy_collection():
+    """Retorna a coleção 'retention_policies' do MongoDB."""
+    return get_database().get_collection("retention_policies")
+
+def get_event_archive_collection():
+    """Retorna a coleção 'events_archive' do MongoDB (blocos comprimidos de eventos expirados)."""
+    return get_database().get_collection("events_archive")
+
+def _retention_policy_to_out(policy_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(policy_data["_id"]),
+        "resource_id": str(policy_data["resource_id"]) if policy_data.get("resource_id") else None,
+        "event_type": policy_data.get("event_type"),
+        "max_count": policy_data.get("max_count"),
+        "max_age_days": policy_data.get("max_age_days"),
+    }
+
+async def get_retention_policies() -> List[Dict[str, Any]]:
+    """Busca todas as políticas de retenção de eventos."""
+    cursor = get_retention_policy_collection().find().sort("_id", 1)
+    return [_retention_policy_to_out(p) async for p in cursor]
+
+async def create_retention_policy(policy: schemas.RetentionPolicyCreate) -> Optional[Dict[str, Any]]:
+    """Cria uma política de retenção. Retorna None se o recurso indicado não existir."""
+    policy_dict = policy.model_dump()
+    if policy.resource_id is not None:
+        if not await resource_exists(policy.resource_id):
+            return None
+        policy_dict["resource_id"] = ObjectId(policy.resource_id)
+    result = await get_retention_policy_collection().insert_one(policy_dict)
+    policy_dict["_id"] = result.inserted_id
+    return _retention_policy_to_out(policy_dict)
+
+async def delete_retention_policy(policy_id: str) -> bool:
+    """Remove uma política de retenção. Os eventos já arquivados não são restaurados."""
+    if not ObjectId.is_valid(policy_id): return False
+    result = await get_retention_policy_collection().delete_one({"_id": ObjectId(policy_id)})
+    return result.deleted_count > 0
 
 # --- CRUD para Configuração da Aplicação ---
 
@@ -264,7 +1029,12 @@ async def get_app_config() -> AppConfig:
     """
     Busca a configuração da aplicação no banco de dados e complementa com variáveis de ambiente.
     Se não houver configuração no DB, retorna uma configuração padrão.
+    O resultado fica em cache em memória até à próxima alteração (ver `app_config_cache`).
     """
+    cached_config = app_config_cache.get()
+    if cached_config is not None:
+        return cached_config
+
     config_data = await get_app_config_collection().find_one({})
     if config_data:
         app_config = AppConfig(**config_data)
@@ -275,20 +1045,25 @@ async def get_app_config() -> AppConfig:
     app_config.gemini_api_key = os.getenv("GEMINI_API_KEY", app_config.gemini_api_key)
     app_config.gemini_model = os.getenv("GEMINI_MODEL", app_config.gemini_model)
 
+    app_config_cache.store(app_config, (config_data or {}).get("version"))
     return app_config
 
 async def update_app_config(config: AppConfig) -> AppConfig:
     """
     Atualiza a configuração da aplicação no banco de dados.
     Se não houver configuração, insere uma nova.
+    Cada atualização incrementa a versão da configuração e notifica os outros workers.
     """
     config_dict = config.model_dump(exclude_unset=True)
     # Usa upsert=True para inserir se não existir, ou atualizar se existir
-    await get_app_config_collection().update_one(
+    updated = await get_app_config_collection().find_one_and_update(
         {},
-        {"$set": config_dict},
-        upsert=True
+        {"$set": config_dict, "$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
+    app_config_cache.invalidate()
+    await app_config_cache.publish(updated["version"])
     return await get_app_config()
 
 # --- CRUD para Utilizadores ---
@@ -302,7 +1077,7 @@ async def get_user_by_username(username: str) -> Optional[UserInDB]:
 
 async def create_user(user: schemas.UserCreate) -> UserInDB:
     """Cria um novo utilizador, hasheando a sua senha antes de salvar."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     user_dict = user.model_dump(exclude={"password"})
     user_dict["hashed_password"] = hashed_password
     user_dict["disabled"] = False
@@ -331,11 +1106,16 @@ async def update_user(user_id: str, user_data: schemas.UserUpdate) -> Optional[U
     if not ObjectId.is_valid(user_id): return None
     update_data = user_data.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]:
-        update_data["hashed_password"] = get_password_hash(update_data["password"])
+        update_data["hashed_password"] = await get_password_hash_async(update_data["password"])
         del update_data["password"]
     if len(update_data) >= 1:
         await get_user_collection().update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-    return await get_user(user_id)
+    updated_user = await get_user(user_id)
+    if updated_user:
+        # Garante que alterações de permissão ou desativação têm efeito na próxima requisição.
+        user_cache.invalidate(updated_user.username)
+        await user_cache.publish(updated_user.username)
+    return updated_user
 
 async def delete_user(user_id: str) -> bool:
     """Deleta um utilizador, impedindo a exclusão do utilizador 'root'."""
@@ -343,4 +1123,6 @@ async def delete_user(user_id: str) -> bool:
     if not user_to_delete: return False
     if user_to_delete.username == "root": return False
     delete_result = await get_user_collection().delete_one({"_id": ObjectId(user_to_delete.id)})
+    user_cache.invalidate(user_to_delete.username)
+    await user_cache.publish(user_to_delete.username)
     return delete_result.deleted_count > 0
@@ -0,0 +1,207 @@
+# event_buffer.py
+"""
+Ingestão assíncrona de eventos (opcional, ativada com EVENT_INGESTION_MODE=buffered).
+
+Neste modo, os eventos enviados a '/resources/{id}/events' e '/resources/by-name/{nome}/events'
+são colocados numa fila limitada em memória e a rota responde de imediato com 202.
+Uma tarefa de fundo, iniciada no 'lifespan' da aplicação, grava-os em lote quando a fila
+junta EVENT_BUFFER_FLUSH_SIZE eventos ou a cada EVENT_BUFFER_FLUSH_INTERVAL_SECONDS.
+Com a fila cheia, novos eventos são recusados com HTTP 503 (Retry-After), em vez de
+acumularem memória; no encerramento, os eventos pendentes são todos gravados.
+
+Os eventos já foram aceites quando são gravados, pelo que uma falha do MongoDB (ex: failover)
+não os descarta: a gravação é repetida até EVENT_BUFFER_WRITE_RETRIES vezes, com espera
+crescente, e, se continuar a falhar, o lote fica retido e é o primeiro a ser gravado na
+gravação seguinte. Só no encerramento um lote que não possa ser gravado é dado como perdido.
+Os eventos de recursos excluídos entretanto são descartados, em vez de ficarem órfãos.
+
+A fila é de cada worker: com vários workers, cada um grava os seus próprios eventos.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from . import crud
+
+EVENT_INGESTION_MODE = os.getenv("EVENT_INGESTION_MODE", "sync")
+EVENT_BUFFER_MAX_SIZE = int(os.getenv("EVENT_BUFFER_MAX_SIZE", 10000))
+EVENT_BUFFER_FLUSH_SIZE = int(os.getenv("EVENT_BUFFER_FLUSH_SIZE", 500))
+EVENT_BUFFER_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL_SECONDS", 1.0))
+EVENT_BUFFER_WRITE_RETRIES = int(os.getenv("EVENT_BUFFER_WRITE_RETRIES", 3))
+# Espera antes da primeira repetição; duplica a cada nova tentativa.
+EVENT_BUFFER_RETRY_BACKOFF_SECONDS = float(os.getenv("EVENT_BUFFER_RETRY_BACKOFF_SECONDS", 0.5))
+
+
+class EventBuffer:
+    """Fila limitada de documentos de evento, gravada em lote por uma tarefa de fundo."""
+
+    def __init__(
+        self,
+        max_size: int,
+        flush_size: int,
+        flush_interval: float,
+        retries: int = EVENT_BUFFER_WRITE_RETRIES,
+        retry_backoff: float = EVENT_BUFFER_RETRY_BACKOFF_SECONDS,
+    ):
+        self.max_size = max(1, max_size)
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self._queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+        # Lote cuja gravação falhou; é gravado antes dos eventos da fila.
+        self._held: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Acorda a tarefa de gravação antes do fim do intervalo (fila com um lote completo ou encerramento).
+        self._wakeup: Optional[asyncio.Event] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.orphaned = 0
+        self.write_errors = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Indica se a tarefa de gravação está ativa (e, portanto, se a fila aceita eventos)."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Cria a fila e inicia a tarefa de gravação em segundo plano."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Para a tarefa de gravação e grava todos os eventos ainda na fila."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        if not await self._flush():
+            lost = self._held + self._take(self._queue.qsize())
+            self._held = []
+            self.failed += len(lost)
+            print(f"{len(lost)} eventos da fila perdidos no encerramento: o MongoDB não está disponível.")
+
+    def enqueue(self, document: Dict[str, Any]):
+        """
+        Coloca um documento de evento na fila.
+
+        Raises:
+            HTTPException: 503 se a fila estiver cheia.
+        """
+        try:
+            self._queue.put_nowait(document)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Event buffer is full, please retry.",
+                headers={"Retry-After": "1"},
+            )
+        self.accepted += 1
+        if self._queue.qsize() >= self.flush_size:
+            self._wakeup.set()
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """Grava a fila em lotes quando ela junta `flush_size` eventos ou quando passa `flush_interval`."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self) -> bool:
+        """
+        Grava o lote retido e a fila, em lotes de `flush_size`.
+
+        Returns:
+            bool: False se um lote não pôde ser gravado e ficou retido para a próxima gravação.
+        """
+        while self._held or not self._queue.empty():
+            resumed = bool(self._held)
+            batch = self._held or self._take(self.flush_size)
+            self._held = []
+            if not await self._write(batch, resumed):
+                self._held = batch
+                return False
+        return True
+
+    async def _write(self, batch: List[Dict[str, Any]], resumed: bool = False) -> bool:
+        """
+        Grava um lote, repetindo com espera crescente se o MongoDB falhar.
+
+        Args:
+            batch (List[Dict[str, Any]]): Os documentos de evento a gravar.
+            resumed (bool): Se o lote já falhou numa gravação anterior (ficou retido).
+
+        Returns:
+            bool: False se todas as tentativas falharem.
+        """
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                existing = await crud.existing_resource_ids({doc["resource_id"] for doc in batch})
+                # Numa repetição, parte do lote pode já ter sido gravada antes da falha.
+                written = await crud.existing_event_ids([doc["_id"] for doc in batch]) if attempt or resumed else set()
+                pending = [doc for doc in batch if doc["resource_id"] in existing and doc["_id"] not in written]
+                errors = await crud.insert_event_documents(pending)
+                break
+            except Exception as e:
+                self.write_errors += 1
+                print(f"Falha ao gravar {len(batch)} eventos da fila (tentativa {attempt + 1}): {e}")
+        else:
+            return False
+        orphaned = sum(1 for doc in batch if doc["resource_id"] not in existing)
+        failed = sum(1 for error in errors if error)
+        self.orphaned += orphaned
+        self.failed += failed
+        self.written += len(batch) - orphaned - failed
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores da fila para monitorização."""
+        return {
+            "running": self.running,
+            "queued": (self._queue.qsize() if self._queue is not None else 0) + len(self._held),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "orphaned": self.orphaned,
+            "write_errors": self.write_errors,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
+
+
+event_buffer = EventBuffer(
+    max_size=EVENT_BUFFER_MAX_SIZE,
+    flush_size=EVENT_BUFFER_FLUSH_SIZE,
+    flush_interval=EVENT_BUFFER_FLUSH_INTERVAL_SECONDS,
+)
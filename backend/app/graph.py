@@ -0,0 +1,112 @@
+# graph.py
+"""
+Índice em memória do grafo de relacionamentos entre recursos.
+
+Mantém, para cada recurso, o seu nome, a lista de filhos ('related_resources')
+e o conjunto de pais (adjacência reversa). O índice é construído a partir do MongoDB
+e, a partir daí, atualizado incrementalmente pelas funções de escrita do 'crud', o que
+permite resolver nomes de pais e filhos sem varrer a coleção a cada requisição
+(ver 'ResourceIndex' para a reconstrução após escritas de outros workers).
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from .resource_index import ResourceIndex
+
+
+class ResourceGraph(ResourceIndex):
+    """Adjacência (id -> filhos) e adjacência reversa (id -> pais) dos recursos."""
+
+    projection = {"name": 1, "related_resources": 1}
+
+    def __init__(self):
+        super().__init__()
+        # Incrementada sempre que a topologia (nós ou arestas) muda; nunca volta atrás.
+        self.version = 0
+        self.names: Dict[str, str] = {}
+        self.children: Dict[str, List[str]] = {}
+        # Dicionários são usados como conjuntos ordenados, preservando a ordem de inserção.
+        self.parents: Dict[str, Dict[str, None]] = {}
+
+    def _load(self, resource_id: str, resource_data: Dict[str, Any]):
+        self._set(resource_id, resource_data.get("name"), [str(rid) for rid in resource_data.get("related_resources", [])])
+
+    def _swap(self, other: "ResourceGraph"):
+        self.names, self.children, self.parents = other.names, other.children, other.parents
+        self.version += 1
+
+    def _set(self, resource_id: str, name: Optional[str], related: Optional[List[str]]):
+        if resource_id not in self.names or (related is not None and related != self.children.get(resource_id)):
+            self.version += 1
+        if name is not None:
+            self.names[resource_id] = name
+        if related is not None:
+            for old_child in self.children.get(resource_id, []):
+                self.parents.get(old_child, {}).pop(resource_id, None)
+            self.children[resource_id] = list(related)
+            for child in related:
+                self.parents.setdefault(child, {})[resource_id] = None
+
+    # --- Atualizações incrementais (chamadas pelo crud) ---
+
+    def upsert(self, resource_id: str, name: Optional[str] = None, related: Optional[Iterable[str]] = None):
+        """Regista a criação ou alteração de um recurso. Campos None não são alterados."""
+        if not self.is_loaded():
+            return
+        self._set(str(resource_id), name, [str(rid) for rid in related] if related is not None else None)
+
+    def remove(self, resource_ids: Iterable[str]):
+        """Remove recursos do índice, incluindo as arestas que apontam para eles."""
+        if not self.is_loaded():
+            return
+        for resource_id in [str(rid) for rid in resource_ids]:
+            if resource_id in self.names:
+                self.version += 1
+            self.names.pop(resource_id, None)
+            for child in self.children.pop(resource_id, []):
+                self.parents.get(child, {}).pop(resource_id, None)
+            for parent in self.parents.pop(resource_id, {}):
+                siblings = self.children.get(parent)
+                if siblings and resource_id in siblings:
+                    self.children[parent] = [c for c in siblings if c != resource_id]
+
+    # --- Consultas ---
+
+    def child_names(self, resource_id: str) -> List[str]:
+        """Retorna os nomes dos filhos existentes de um recurso."""
+        return [self.names[c] for c in self.children.get(str(resource_id), []) if c in self.names]
+
+    def parent_names(self, resource_id: str) -> List[str]:
+        """Retorna os nomes dos pais de um recurso."""
+        return [self.names[p] for p in self.parents.get(str(resource_id), {}) if p in self.names]
+
+    def walk(self, resource_id: str, upstream: bool, max_depth: Optional[int] = None) -> Dict[str, int]:
+        """
+        Percorre o grafo em largura a partir de um recurso.
+
+        Args:
+            resource_id (str): O recurso de partida (incluído no resultado com profundidade 0).
+            upstream (bool): Se True, segue os pais (dependências); se False, os filhos (impacto).
+            max_depth (Optional[int]): Número máximo de níveis a percorrer.
+
+        Returns:
+            Dict[str, int]: Os IDs alcançados e a respetiva distância ao recurso de partida.
+        """
+        start = str(resource_id)
+        if start not in self.names:
+            return {}
+        depths = {start: 0}
+        frontier = [start]
+        while frontier and (max_depth is None or depths[frontier[0]] < max_depth):
+            next_frontier = []
+            for node in frontier:
+                neighbours = self.parents.get(node, {}) if upstream else self.children.get(node, [])
+                for neighbour in neighbours:
+                    if neighbour in self.names and neighbour not in depths:
+                        depths[neighbour] = depths[node] + 1
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return depths
+
+
+# Instância partilhada por toda a aplicação.
+resource_graph = ResourceGraph()
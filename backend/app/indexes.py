@@ -0,0 +1,113 @@
+# indexes.py
+"""
+Registo declarativo dos índices do MongoDB usados pela aplicação.
+
+Cada entrada de `INDEXES` descreve um índice (coleção, chaves e opções). A função
+`apply_indexes` cria os índices em falta de forma idempotente e é chamada no arranque
+da aplicação; `check_indexes` compara o registo com o estado real do banco de dados,
+reportando índices em falta, divergentes ou não declarados. Ambas podem ser executadas
+sem iniciar o servidor através de 'python -m app.manage indexes'.
+"""
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from pymongo.errors import OperationFailure
+
+from .database import get_database
+
+
+class IndexSpec(NamedTuple):
+    """Definição de um índice: coleção, chaves (campo, direção) e opções do 'create_index'."""
+    collection: str
+    keys: List[Tuple[str, int]]
+    options: Dict[str, Any] = {}
+    reason: str = ""
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", [("username", 1)], {"unique": True},
+              "Autenticação: 'get_user_by_username' em cada requisição."),
+    IndexSpec("resources", [("name_key", 1)], {"unique": True, "partialFilterExpression": {"name_key": {"$type": "string"}}},
+              "Nomes únicos sem distinção de maiúsculas; ignora documentos antigos sem 'name_key'."),
+    IndexSpec("resources", [("name", 1), ("_id", 1)], {},
+              "Listagem ordenada por nome e paginação por cursor."),
+    IndexSpec("resources", [("related_resources", 1)], {},
+              "Remoção de referências ('$pull') ao excluir recursos."),
+    IndexSpec("resources", [("tags.key", 1), ("tags.value", 1)], {},
+              "Filtros e metadados por tags."),
+    IndexSpec("events", [("resource_id", 1), ("timestamp", 1), ("_id", 1)], {},
+              "Timeline de um recurso, ordenada por data, com paginação por cursor."),
+    IndexSpec("events", [("resource_id", 1), ("event_type", 1), ("timestamp", 1), ("_id", 1)], {},
+              "Timeline de um recurso filtrada por tipo de evento."),
+    IndexSpec("events", [("timestamp", 1), ("_id", 1)], {},
+              "Feed global de eventos por intervalo de datas."),
+    IndexSpec("event_rollups", [("resource_id", 1), ("granularity", 1), ("event_type", 1), ("bucket", 1)], {"unique": True},
+              "Upserts das contagens pré-agregadas e histograma de um recurso."),
+    IndexSpec("event_rollups", [("granularity", 1), ("bucket", 1)], {},
+              "Histograma de todos os recursos por intervalo de datas."),
+    IndexSpec("events_archive", [("resource_id", 1), ("start", 1)], {},
+              "Consulta do arquivo de eventos de um recurso por intervalo de datas."),
+    IndexSpec("events_archive", [("start", 1)], {},
+              "Consulta do arquivo de eventos de todos os recursos por intervalo de datas."),
+]
+
+# Opções comparadas entre o registo e os índices existentes.
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _key_of(keys) -> Tuple[Tuple[str, int], ...]:
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+async def check_indexes(database=None) -> Dict[str, List[str]]:
+    """
+    Compara os índices declarados em `INDEXES` com os existentes no banco de dados.
+
+    Returns:
+        Dict[str, List[str]]: Descrições dos índices em falta ('missing'), existentes mas com
+        opções diferentes ('divergent') e existentes mas não declarados ('extra').
+    """
+    database = database if database is not None else get_database()
+    report = {"missing": [], "divergent": [], "extra": []}
+    collections = sorted({spec.collection for spec in INDEXES})
+    for collection in collections:
+        existing = await database.get_collection(collection).index_information()
+        existing_by_key = {_key_of(info["key"]): (name, info) for name, info in existing.items()}
+        declared = set()
+        for spec in (s for s in INDEXES if s.collection == collection):
+            key = _key_of(spec.keys)
+            declared.add(key)
+            label = f"{collection}: {dict(spec.keys)}"
+            if key not in existing_by_key:
+                report["missing"].append(label)
+                continue
+            _, info = existing_by_key[key]
+            for option in _COMPARED_OPTIONS:
+                if spec.options.get(option) != info.get(option) and (spec.options.get(option) or info.get(option)):
+                    report["divergent"].append(f"{label} ({option}: esperado {spec.options.get(option)!r}, atual {info.get(option)!r})")
+        for key, (name, _) in existing_by_key.items():
+            if name != "_id_" and key not in declared:
+                report["extra"].append(f"{collection}: {name}")
+    return report
+
+
+async def apply_indexes(database=None) -> Dict[str, List[str]]:
+    """
+    Cria, de forma idempotente, todos os índices declarados em `INDEXES`.
+    Índices não declarados nunca são removidos automaticamente. Um índice que não possa
+    ser criado (ex: índice único sobre dados duplicados) não impede a criação dos restantes.
+
+    Returns:
+        Dict[str, List[str]]: O relatório de `check_indexes` obtido antes da criação,
+        acrescido dos índices cuja criação falhou ('failed').
+    """
+    database = database if database is not None else get_database()
+    if database is None:
+        return {"missing": [], "divergent": [], "extra": [], "failed": []}
+    report = await check_indexes(database)
+    report["failed"] = []
+    for spec in INDEXES:
+        try:
+            await database.get_collection(spec.collection).create_index(spec.keys, **spec.options)
+        except OperationFailure as e:
+            report["failed"].append(f"{spec.collection}: {dict(spec.keys)} ({e})")
+    return report
@@ -0,0 +1,175 @@
+# layout.py
+"""
+Cálculo do layout do mapa de serviços no servidor.
+
+Implementa um layout em camadas para grafos dirigidos (estilo Sugiyama):
+1. Remoção de ciclos, invertendo as arestas de retorno encontradas numa DFS.
+2. Atribuição de camadas pelo caminho mais longo a partir das origens.
+3. Inserção de nós fictícios nas arestas que atravessam mais de uma camada (até MAX_DUMMY_SPAN).
+4. Redução de cruzamentos com a heurística do baricentro (varrimentos alternados).
+5. Atribuição de coordenadas, centrando cada camada.
+
+As posições devolvidas são o canto superior esquerdo de cada nó, no formato
+esperado pelo ReactFlow, com as mesmas dimensões usadas pelo frontend.
+Os resultados ficam em cache por versão da topologia do grafo ('ResourceGraph.version').
+"""
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+NODE_WIDTH = 172
+NODE_HEIGHT = 50
+NODE_SEPARATION = 50
+RANK_SEPARATION = 100
+ORDERING_SWEEPS = 4
+# Arestas mais longas do que isto (em camadas) não recebem nós fictícios; os seus extremos
+# são tratados como vizinhos diretos, limitando o custo em grafos muito profundos.
+MAX_DUMMY_SPAN = 8
+
+
+def _remove_cycles(nodes: List[str], adjacency: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    """Retorna as arestas do grafo com as arestas de retorno invertidas, tornando-o acíclico."""
+    state: Dict[str, int] = {}  # 1 = na pilha da DFS, 2 = concluído
+    edges: List[Tuple[str, str]] = []
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(adjacency.get(root, [])))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+            elif child == node:
+                continue  # Auto-relações não influenciam o layout.
+            elif state.get(child) == 1:
+                edges.append((child, node))
+            else:
+                edges.append((node, child))
+                if child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(adjacency.get(child, []))))
+    return list(dict.fromkeys(edges))
+
+
+def _assign_layers(nodes: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Atribui a cada nó a camada do caminho mais longo desde uma origem (ordem topológica de Kahn)."""
+    successors: Dict[str, List[str]] = {n: [] for n in nodes}
+    in_degree: Dict[str, int] = {n: 0 for n in nodes}
+    for source, target in edges:
+        successors[source].append(target)
+        in_degree[target] += 1
+    layer = {n: 0 for n in nodes}
+    queue = [n for n in nodes if in_degree[n] == 0]
+    while queue:
+        node = queue.pop()
+        for target in successors[node]:
+            layer[target] = max(layer[target], layer[node] + 1)
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                queue.append(target)
+    return layer
+
+
+def compute_layout(node_ids: Iterable[str], adjacency: Dict[str, List[str]]) -> Dict[str, Dict[str, float]]:
+    """
+    Calcula as posições dos nós de um grafo dirigido, de cima para baixo.
+
+    Args:
+        node_ids: Os IDs dos nós a posicionar, na ordem de desempate desejada.
+        adjacency: Para cada nó, a lista dos seus filhos. Arestas para nós fora de `node_ids` são ignoradas.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Para cada nó, a posição {"x", "y"} do canto superior esquerdo.
+    """
+    nodes = list(dict.fromkeys(node_ids))
+    if not nodes:
+        return {}
+    node_set = set(nodes)
+    filtered = {n: [c for c in adjacency.get(n, []) if c in node_set] for n in nodes}
+    edges = _remove_cycles(nodes, filtered)
+    layer = _assign_layers(nodes, edges)
+
+    # Nós fictícios ao longo das arestas longas, para que participem na redução de cruzamentos.
+    layers: Dict[int, List[Hashable]] = {}
+    for node in nodes:
+        layers.setdefault(layer[node], []).append(node)
+    up: Dict[Hashable, List[Hashable]] = {}
+    down: Dict[Hashable, List[Hashable]] = {}
+    for source, target in edges:
+        previous: Hashable = source
+        span = layer[target] - layer[source]
+        for rank in range(layer[source] + 1, layer[target] if span <= MAX_DUMMY_SPAN else layer[source] + 1):
+            dummy = ("dummy", source, target, rank)
+            layers.setdefault(rank, []).append(dummy)
+            down.setdefault(previous, []).append(dummy)
+            up.setdefault(dummy, []).append(previous)
+            previous = dummy
+        down.setdefault(previous, []).append(target)
+        up.setdefault(target, []).append(previous)
+
+    ranks = [layers[r] for r in sorted(layers)]
+    position = {node: i for rank in ranks for i, node in enumerate(rank)}
+
+    def sweep(rank_indexes, neighbours):
+        for r in rank_indexes:
+            rank = ranks[r]
+
+            def barycenter(node):
+                linked = neighbours.get(node)
+                if not linked:
+                    return position[node]
+                return sum(position[n] for n in linked) / len(linked)
+
+            rank.sort(key=lambda n: (barycenter(n), position[n]))
+            for i, node in enumerate(rank):
+                position[node] = i
+
+    for iteration in range(ORDERING_SWEEPS):
+        if iteration % 2 == 0:
+            sweep(range(1, len(ranks)), up)
+        else:
+            sweep(range(len(ranks) - 2, -1, -1), down)
+
+    # Coordenadas: cada camada é centrada em relação à camada mais larga.
+    step = NODE_WIDTH + NODE_SEPARATION
+    widest = max(len(rank) for rank in ranks)
+    positions: Dict[str, Dict[str, float]] = {}
+    for r, rank in enumerate(ranks):
+        offset = (widest - len(rank)) * step / 2
+        for i, node in enumerate(rank):
+            if node in node_set:
+                positions[node] = {"x": offset + i * step, "y": r * (NODE_HEIGHT + RANK_SEPARATION)}
+    return positions
+
+
+class LayoutCache:
+    """Cache LRU de layouts, indexada pela versão da topologia e pelo conjunto de nós."""
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, FrozenSet[str]], Dict[str, Dict[str, float]]]" = OrderedDict()
+
+    def get_or_compute(self, version: int, node_ids: List[str], adjacency: Dict[str, List[str]]) -> Dict[str, Dict[str, float]]:
+        """Retorna o layout em cache para esta versão e conjunto de nós, calculando-o se necessário."""
+        key = (version, frozenset(node_ids))
+        cached: Optional[Dict[str, Dict[str, float]]] = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        positions = compute_layout(node_ids, adjacency)
+        self._entries[key] = positions
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return positions
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+layout_cache = LayoutCache()
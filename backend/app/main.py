@@ -12,13 +12,17 @@ from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from google import genai
 import redis.asyncio as redis
 import os
 
 from .database import connect_to_mongo, close_mongo_connection, setup_root_user
-from .routers import auth, users, resources, config
-from . import crud
+from .indexes import apply_indexes
+from .config_cache import app_config_cache
+from .event_buffer import EVENT_INGESTION_MODE, event_buffer
+from .layout import layout_cache
+from .retention import retention_job
+from .routers import auth, users, resources, config, events
+from . import ai, crud, security
 from .models import AppConfig
 
 from fastapi_limiter import FastAPILimiter
@@ -32,18 +36,45 @@ async def lifespan(app: FastAPI):
     """
     # Código executado na inicialização
     await connect_to_mongo()
+    # Recursos anteriores ao 'name_key' precisam dele para a procura por nome e o índice único de nomes.
+    name_key_report = await crud.backfill_name_keys()
+    if name_key_report["updated"]:
+        print(f"Nome normalizado preenchido em {name_key_report['updated']} recursos.")
+    if name_key_report["duplicates"]:
+        print(f"Nomes de recursos em conflito, por corrigir manualmente: {', '.join(name_key_report['duplicates'])}")
+    index_report = await apply_indexes()
+    if index_report["missing"]:
+        print(f"Índices criados: {', '.join(index_report['missing'])}")
+    if index_report["failed"]:
+        print(f"Falha ao criar índices: {', '.join(index_report['failed'])}")
+    if index_report["divergent"] or index_report["extra"]:
+        print(f"Índices a rever (ver 'python -m app.manage indexes --check'): {', '.join(index_report['divergent'] + index_report['extra'])}")
     await setup_root_user()
 
     # Initialize FastAPI-Limiter
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
     redis_instance = redis.from_url(redis_url, encoding="utf8", decode_responses=True)
     await FastAPILimiter.init(redis_instance)
+    # Invalidação da configuração em cache entre workers.
+    await app_config_cache.start_listener(redis_instance)
+    # Invalidação dos utilizadores autenticados em cache entre workers.
+    await security.user_cache.start_listener(redis_instance)
+    # Ingestão assíncrona de eventos (opcional): a fila é gravada em lote por uma tarefa de fundo.
+    if EVENT_INGESTION_MODE == "buffered":
+        event_buffer.start()
+    # Compactação periódica dos eventos expirados pelas políticas de retenção.
+    retention_job.start()
     
     yield # A aplicação fica em execução aqui.
     
     # Código executado no encerramento
+    await retention_job.stop()
+    await event_buffer.stop() # Grava os eventos pendentes antes de fechar a ligação ao MongoDB.
+    await app_config_cache.stop_listener()
+    await security.user_cache.stop_listener()
     await close_mongo_connection()
     await FastAPILimiter.close() # Close Redis connection
+    security.password_hasher.shutdown()
 
 # Cria a instância da aplicação FastAPI, agora com o gestor de ciclo de vida.
 app = FastAPI(
@@ -66,6 +97,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"], # Restrict methods
     allow_headers=["Content-Type", "Authorization", "X-Requested-With"], # Restrict headers
+    expose_headers=["X-Next-Cursor", "ETag"], # Cursor da próxima página e ETag dos GETs condicionais
 )
 
 # Middleware para adicionar cabeçalhos de segurança
@@ -84,6 +116,7 @@ app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(users.router, prefix="/api", tags=["Users"])
 app.include_router(resources.router, prefix="/api", tags=["Resources"])
 app.include_router(config.router, prefix="/api", tags=["Configuration"])
+app.include_router(events.router, prefix="/api", tags=["Events"])
 
 class AIPrompt(BaseModel):
     prompt: str
@@ -93,27 +126,12 @@ async def analyse_prompt(prompt: AIPrompt, config: AppConfig = Depends(crud.get_
     if not config.gemini_api_key:
         raise HTTPException(status_code=500, detail="API key for Google Gemini is not configured.")
 
-    client = genai.Client(api_key=config.gemini_api_key)
-
-    resources = await crud.get_all_resources()
-    events = await crud.get_all_events()
-
-    full_prompt = f"""Você é um assistente de IA especialista em análise de dados de um catálogo de serviços de TI.
-    Sua resposta deve ser em português do Brasil e em linguagem natural.
-    
-    Aqui está o contexto da aplicação:
-    Recursos: {resources}
-    Eventos: {events}
-    
-    Pergunta do usuário: {prompt.prompt}
-    """
-
+    # O contexto inclui apenas os recursos e eventos relevantes, dentro do orçamento de tokens;
+    # a chamada ao modelo é assíncrona e as respostas ficam em cache até o catálogo mudar.
     try:
-        response = client.models.generate_content(
-            model=config.gemini_model,
-            contents=full_prompt
-        )
-        return {"response": response.text}
+        return {"response": await ai.analyse(prompt.prompt, config)}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -128,3 +146,17 @@ async def read_root():
 async def health_check():
     """Endpoint simples para verificar a saúde da API."""
     return {"status": "ok", "message": "Service Catalog API is running!"}
+
+
+@app.get("/api/metrics", tags=["Monitoring"], dependencies=[Depends(security.get_current_active_admin_user)])
+async def get_metrics():
+    """Retorna contadores internos de desempenho (apenas para administradores)."""
+    return {
+        "user_cache": security.user_cache.stats(),
+        "password_hasher": security.password_hasher.stats(),
+        "app_config_cache": app_config_cache.stats(),
+        "layout_cache": layout_cache.stats(),
+        "ai_response_cache": ai.response_cache.stats(),
+        "event_buffer": event_buffer.stats(),
+        "event_retention": retention_job.stats(),
+    }
@@ -0,0 +1,116 @@
+# manage.py
+"""
+Comandos de manutenção executados fora do servidor web.
+
+Uso (a partir da pasta 'backend', ou dentro do contêiner):
+    python -m app.manage migrate-events
+    python -m app.manage backfill-name-keys
+    python -m app.manage indexes [--check]
+    python -m app.manage compact-events [--batch-size N]
+    python -m app.manage rebuild-rollups
+"""
+import argparse
+import asyncio
+
+from . import crud, retention, rollups
+from .database import connect_to_mongo, close_mongo_connection
+from .indexes import apply_indexes, check_indexes
+
+
+async def migrate_events(args: argparse.Namespace):
+    """Move os eventos embutidos nos documentos de recurso para a coleção 'events'."""
+    await apply_indexes()
+    summary = await crud.migrate_embedded_events(batch_size=args.batch_size)
+    print(f"{summary['events']} eventos de {summary['resources']} recursos migrados para a coleção 'events'.")
+
+
+async def backfill_name_keys(args: argparse.Namespace):
+    """Preenche o nome normalizado ('name_key') dos recursos antigos."""
+    summary = await crud.backfill_name_keys()
+    await apply_indexes()
+    print(f"{summary['updated']} recursos atualizados.")
+    if summary["duplicates"]:
+        print("Nomes em conflito (renomeie-os e execute o comando novamente):")
+        for name in summary["duplicates"]:
+            print(f"  - {name}")
+
+
+async def indexes(args: argparse.Namespace):
+    """
+    Cria os índices declarados em 'app/indexes.py' ou, com --check, apenas os verifica.
+    Termina com código 1 se houver índices em falta (--check), com falha ou divergentes.
+    """
+    report = await (check_indexes() if args.check else apply_indexes())
+    titles = {
+        "missing": "Em falta" if args.check else "Criados",
+        "divergent": "Com opções diferentes do registo",
+        "extra": "Não declarados no registo",
+        "failed": "Falharam",
+    }
+    for section, title in titles.items():
+        if section not in report:
+            continue
+        print(f"{title}: {len(report[section])}")
+        for label in report[section]:
+            print(f"  - {label}")
+    if report["missing" if args.check else "failed"] or report["divergent"]:
+        raise SystemExit(1)
+
+
+async def compact_events(args: argparse.Namespace):
+    """Aplica as políticas de retenção, movendo os eventos expirados para o arquivo comprimido."""
+    summary = await retention.retention_job.run_once(batch_size=args.batch_size)
+    if summary is None:
+        print("Já está em curso uma compactação de eventos (noutro worker ou comando).")
+        raise SystemExit(1)
+    print(f"{summary['archived']} eventos arquivados em {summary['chunks']} blocos ({summary['policies']} políticas).")
+
+
+async def rebuild_rollups(args: argparse.Namespace):
+    """Recalcula as contagens pré-agregadas a partir dos eventos ativos e arquivados."""
+    summary = await rollups.rebuild(crud.iter_events(), retention.iter_archived_events())
+    print(f"{summary['rollups']} contagens recalculadas a partir de {summary['events']} eventos.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Define os subcomandos disponíveis."""
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Comandos de manutenção do Catálogo de Serviços.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate-events", help="Move os eventos embutidos para a coleção 'events'.")
+    migrate.add_argument("--batch-size", type=int, default=500, help="Número de eventos por escrita em lote.")
+    migrate.set_defaults(handler=migrate_events)
+
+    backfill = subparsers.add_parser("backfill-name-keys", help="Preenche o nome normalizado usado pelo índice único de nomes.")
+    backfill.set_defaults(handler=backfill_name_keys)
+
+    index_cmd = subparsers.add_parser("indexes", help="Cria os índices declarados e reporta divergências.")
+    index_cmd.add_argument("--check", action="store_true", help="Apenas verifica, sem criar índices.")
+    index_cmd.set_defaults(handler=indexes)
+
+    compact = subparsers.add_parser("compact-events", help="Move os eventos expirados pelas políticas de retenção para o arquivo.")
+    compact.add_argument("--batch-size", type=int, default=retention.EVENT_ARCHIVE_CHUNK_SIZE, help="Número máximo de eventos por bloco do arquivo.")
+    compact.set_defaults(handler=compact_events)
+
+    rebuild = subparsers.add_parser("rebuild-rollups", help="Recalcula as contagens de eventos usadas pelo histograma.")
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    return parser
+
+
+async def run(args: argparse.Namespace):
+    """Abre a ligação ao MongoDB, executa o comando e fecha a ligação."""
+    await connect_to_mongo()
+    try:
+        await args.handler(args)
+    finally:
+        await close_mongo_connection()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
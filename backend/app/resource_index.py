@@ -0,0 +1,86 @@
+# resource_index.py
+"""
+Ciclo de vida comum aos índices em memória construídos a partir da coleção 'resources'
+('ResourceGraph' e 'SearchIndex').
+
+Cada índice é construído a partir do MongoDB e, a partir daí, atualizado incrementalmente
+pelas funções de escrita do 'crud'. O índice guarda a versão dos recursos
+('crud.get_resources_version') a partir da qual foi construído: se outro worker alterar os
+recursos, a versão partilhada avança sem que este índice seja atualizado, e ele é reconstruído
+no próximo `ensure_loaded`.
+
+A reconstrução é feita numa instância nova, cujas estruturas só substituem as do índice depois
+de lido todo o cursor: as requisições em curso continuam a consultar o índice anterior, completo,
+e nunca um meio construído.
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from .database import get_database
+
+
+class ResourceIndex:
+    """Base dos índices em memória dos recursos; as subclasses definem `projection`, `_load` e `_swap`."""
+
+    # Campos de cada recurso lidos na reconstrução.
+    projection: Dict[str, int] = {}
+
+    def __init__(self):
+        self._database = None
+        self._lock = asyncio.Lock()
+        # Versão dos recursos (partilhada no MongoDB) refletida pelo índice.
+        self.loaded_version: Optional[int] = None
+
+    def is_loaded(self) -> bool:
+        """Indica se o índice foi construído para o banco de dados atualmente conectado."""
+        database = get_database()
+        return database is not None and self._database is database
+
+    def reset(self):
+        """Descarta o índice; ele será reconstruído no próximo acesso."""
+        self._database = None
+        self.loaded_version = None
+        self._swap(type(self)())
+
+    async def ensure_loaded(self):
+        """
+        Constrói o índice a partir do MongoDB caso ainda não tenha sido construído, ou
+        reconstrói-o se os recursos tiverem sido alterados por outro worker.
+        """
+        from .crud import get_resources_version
+        version = await get_resources_version()
+        if self.is_loaded() and self.loaded_version == version:
+            return
+        async with self._lock:
+            if not self.is_loaded() or self.loaded_version != version:
+                await self.reload(version)
+
+    async def reload(self, version: Optional[int] = None):
+        """Reconstrói o índice lendo apenas os campos indexados de cada recurso."""
+        from .crud import get_resources_version
+        database = get_database()
+        # A versão é lida antes dos recursos: uma escrita durante a leitura força nova reconstrução.
+        version = version if version is not None else await get_resources_version()
+        index = type(self)()
+        async for resource_data in database.get_collection("resources").find({}, self.projection):
+            index._load(str(resource_data["_id"]), resource_data)
+        self._swap(index)
+        self._database = database
+        self.loaded_version = version
+
+    def advance(self, version: int):
+        """
+        Regista a nova versão dos recursos após uma escrita deste worker, já aplicada ao índice.
+        Se a versão anterior não era a do índice, houve escritas de outro worker pelo meio e o
+        índice continua desatualizado (será reconstruído no próximo `ensure_loaded`).
+        """
+        if self.is_loaded() and self.loaded_version == version - 1:
+            self.loaded_version = version
+
+    def _load(self, resource_id: str, resource_data: Dict[str, Any]):
+        """Acrescenta um recurso lido do MongoDB a um índice em construção."""
+        raise NotImplementedError
+
+    def _swap(self, other: "ResourceIndex"):
+        """Passa a usar as estruturas de outro índice, todas de uma vez (sem 'await' pelo meio)."""
+        raise NotImplementedError
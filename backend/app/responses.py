@@ -0,0 +1,29 @@
+# responses.py
+"""
+Resposta JSON rápida para as rotas de leitura mais usadas.
+
+As rotas de leitura do catálogo montam diretamente dicionários no formato de saída
+(ver 'crud.resource_to_out') e devolvem-nos numa FastJSONResponse, serializada com orjson.
+Como a rota devolve uma Response, o FastAPI não volta a validar o conteúdo contra o
+'response_model', que continua a ser usado apenas para a documentação (OpenAPI).
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# Datas sem fuso (como as devolvidas pelo MongoDB) são tratadas como UTC e escritas com
+# sufixo "Z", no mesmo formato que a serialização do Pydantic.
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    """Serializa um valor para JSON (bytes) com orjson."""
+    return orjson.dumps(content, default=str, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,325 @@
+# retention.py
+"""
+Retenção, compactação e arquivo de eventos.
+
+As políticas de retenção (coleção 'retention_policies', geridas em '/api/events/retention-policies')
+limitam o número de eventos mantidos por recurso ('max_count') e/ou a sua idade ('max_age_days'),
+para um recurso ou para todos, e opcionalmente para um único tipo de evento. Quando várias
+políticas se aplicam ao mesmo evento, prevalece a mais restritiva.
+
+A compactação move os eventos expirados da coleção 'events' para 'events_archive', agrupados
+por recurso em blocos de até EVENT_ARCHIVE_CHUNK_SIZE eventos, serializados em JSON e comprimidos
+com zlib. Cada bloco guarda o intervalo de datas e os tipos de evento que contém, para que o
+arquivo possa ser consultado por recurso, data e tipo sem descomprimir os restantes blocos.
+O '_id' de cada bloco é derivado dos IDs dos eventos que contém: se uma compactação for
+interrompida entre a gravação do arquivo e a remoção dos eventos, a seguinte volta a gerar os
+mesmos blocos e não os duplica.
+
+A compactação corre numa tarefa de fundo a cada EVENT_RETENTION_INTERVAL_SECONDS (0 desativa)
+e pode ser executada manualmente ('POST /api/events/retention/run' ou 'python -m app.manage
+compact-events'). Todas as execuções passam por `RetentionJob.run_once`, protegido por um 'lease'
+no MongoDB: duas compactações simultâneas leriam os mesmos eventos e duplicá-los-iam no arquivo.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from . import crud
+from .responses import dumps
+
+EVENT_RETENTION_INTERVAL_SECONDS = float(os.getenv("EVENT_RETENTION_INTERVAL_SECONDS", 3600))
+EVENT_ARCHIVE_CHUNK_SIZE = int(os.getenv("EVENT_ARCHIVE_CHUNK_SIZE", 1000))
+# Duração máxima do 'lease' da compactação: se o worker que a executa terminar sem o libertar,
+# outro pode retomá-la depois deste tempo.
+RETENTION_LEASE_SECONDS = 3600
+
+
+# --- Formato do arquivo ---
+
+def chunk_id(event_docs: List[Dict[str, Any]]) -> str:
+    """Identificador determinístico de um bloco: o SHA-1 dos IDs dos seus eventos, por ordem."""
+    return hashlib.sha1(b"".join(e["_id"].binary for e in event_docs)).hexdigest()
+
+
+def encode_chunk(resource_id: ObjectId, event_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Monta um bloco do arquivo com os eventos (de um único recurso, por ordem cronológica)."""
+    events = [
+        {"id": str(e["_id"]), "event_type": e["event_type"], "message": e.get("message"), "timestamp": e["timestamp"]}
+        for e in event_docs
+    ]
+    return {
+        "_id": chunk_id(event_docs),
+        "resource_id": resource_id,
+        "start": event_docs[0]["timestamp"],
+        "end": event_docs[-1]["timestamp"],
+        "count": len(events),
+        "event_types": sorted({e["event_type"] for e in events}),
+        "data": zlib.compress(dumps(events)),
+        "archived_at": datetime.now(timezone.utc),
+    }
+
+
+def decode_chunk(chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Descomprime um bloco do arquivo, devolvendo documentos no formato da coleção 'events'."""
+    events = []
+    for e in orjson.loads(zlib.decompress(chunk["data"])):
+        events.append({
+            "_id": ObjectId(e["id"]),
+            "resource_id": chunk["resource_id"],
+            "event_type": e["event_type"],
+            "message": e.get("message"),
+            "timestamp": datetime.fromisoformat(e["timestamp"].replace("Z", "+00:00")),
+        })
+    return events
+
+
+# --- Compactação ---
+
+async def _expiration_queries(policy: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+    """Traduz uma política nas queries que selecionam os eventos expirados por ela."""
+    events = crud.get_event_collection()
+    base: Dict[str, Any] = {}
+    if policy.get("resource_id"):
+        base["resource_id"] = policy["resource_id"]
+    if policy.get("event_type"):
+        base["event_type"] = policy["event_type"]
+
+    queries = []
+    if policy.get("max_age_days"):
+        queries.append({**base, "timestamp": {"$lt": now - timedelta(days=policy["max_age_days"])}})
+    if policy.get("max_count"):
+        max_count = policy["max_count"]
+        if "resource_id" in base:
+            resource_ids = [base["resource_id"]]
+        else:
+            # Apenas os recursos com mais eventos do que o limite.
+            pipeline = [
+                {"$match": base},
+                {"$group": {"_id": "$resource_id", "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": max_count}}},
+            ]
+            resource_ids = [group["_id"] async for group in events.aggregate(pipeline)]
+        for resource_id in resource_ids:
+            query = {**base, "resource_id": resource_id}
+            # O evento mais recente já fora do limite: ele e todos os anteriores expiram.
+            boundary = await events.find(query, {"timestamp": 1}).sort([("timestamp", -1), ("_id", -1)]).skip(max_count).limit(1).to_list(length=1)
+            if boundary:
+                last = boundary[0]
+                queries.append({**query, "$or": [
+                    {"timestamp": {"$lt": last["timestamp"]}},
+                    {"timestamp": last["timestamp"], "_id": {"$lte": last["_id"]}},
+                ]})
+    return queries
+
+
+async def _archive(query: Dict[str, Any], batch_size: int, summary: Dict[str, int]):
+    """Move, em lotes, os eventos selecionados pela query para o arquivo."""
+    events = crud.get_event_collection()
+    while True:
+        event_docs = await events.find(query).sort([("timestamp", 1), ("_id", 1)]).limit(batch_size).to_list(length=None)
+        if not event_docs:
+            return
+        by_resource: Dict[ObjectId, List[Dict[str, Any]]] = defaultdict(list)
+        for event_data in event_docs:
+            by_resource[event_data["resource_id"]].append(event_data)
+        chunks = [encode_chunk(resource_id, docs) for resource_id, docs in by_resource.items()]
+        # Grava o arquivo antes de remover: uma interrupção entre os dois passos nunca perde eventos.
+        # Os blocos já gravados por uma compactação interrompida são mantidos, e não duplicados.
+        result = await crud.get_event_archive_collection().bulk_write([
+            UpdateOne({"_id": chunk["_id"]}, {"$setOnInsert": {k: v for k, v in chunk.items() if k != "_id"}}, upsert=True)
+            for chunk in chunks
+        ], ordered=False)
+        await events.delete_many({"_id": {"$in": [e["_id"] for e in event_docs]}})
+        summary["archived"] += len(event_docs)
+        summary["chunks"] += len(result.upserted_ids)
+        if len(event_docs) < batch_size:
+            return
+
+
+async def compact_events(now: Optional[datetime] = None, batch_size: int = EVENT_ARCHIVE_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Aplica todas as políticas de retenção, movendo os eventos expirados para o arquivo.
+
+    Args:
+        now (Optional[datetime]): A data de referência para 'max_age_days' (por omissão, agora).
+        batch_size (int): Número máximo de eventos lidos por lote (e por bloco do arquivo).
+
+    Returns:
+        Dict[str, int]: O número de políticas aplicadas, de eventos arquivados e de blocos gravados.
+    """
+    now = now or datetime.now(timezone.utc)
+    summary = {"policies": 0, "archived": 0, "chunks": 0}
+    async for policy in crud.get_retention_policy_collection().find():
+        summary["policies"] += 1
+        for query in await _expiration_queries(policy, now):
+            await _archive(query, batch_size, summary)
+    if summary["archived"]:
+        await crud.bump_catalog_version()
+    return summary
+
+
+# --- Consulta do arquivo ---
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def iter_archived_events(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_types: Optional[List[str]] = None,
+    resource_ids: Optional[List[str]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Percorre os eventos arquivados, descomprimindo apenas os blocos que podem conter eventos
+    dos recursos, datas e tipos pedidos. Os blocos são lidos por ordem de data inicial e os
+    eventos de cada bloco estão em ordem cronológica.
+
+    Yields:
+        Dict[str, Any]: Documentos de evento, no mesmo formato da coleção 'events'.
+    """
+    query: Dict[str, Any] = {}
+    if resource_ids is not None:
+        query["resource_id"] = {"$in": [ObjectId(rid) for rid in resource_ids if ObjectId.is_valid(rid)]}
+    if end_date:
+        query["start"] = {"$lte": end_date}
+    if start_date:
+        query["end"] = {"$gte": start_date}
+    if event_types:
+        query["event_types"] = {"$in": event_types}
+    start_date = _as_utc(start_date)
+    end_date = _as_utc(end_date)
+    cursor = crud.get_event_archive_collection().find(query).sort([("start", 1), ("_id", 1)])
+    async for chunk in cursor:
+        for event_data in decode_chunk(chunk):
+            if start_date and event_data["timestamp"] < start_date: continue
+            if end_date and event_data["timestamp"] > end_date: continue
+            if event_types and event_data["event_type"] not in event_types: continue
+            yield event_data
+
+
+# --- Execução periódica ---
+
+async def acquire_lease(name: str, seconds: float) -> Optional[str]:
+    """
+    Reserva uma tarefa para este worker durante, no máximo, `seconds` segundos.
+
+    Returns:
+        Optional[str]: O identificador da reserva (para `release_lease`), ou None se outro
+        worker (ou outra execução) tiver uma reserva ainda válida.
+    """
+    now = datetime.now(timezone.utc)
+    owner = uuid.uuid4().hex
+    try:
+        await crud.get_meta_collection().find_one_and_update(
+            {"_id": f"lease:{name}", "expires_at": {"$lt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=seconds), "owner": owner}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return None
+    return owner
+
+
+async def release_lease(name: str, owner: str):
+    """Liberta uma reserva, se ainda pertencer a quem a obteve."""
+    await crud.get_meta_collection().delete_one({"_id": f"lease:{name}", "owner": owner})
+
+
+class RetentionJob:
+    """Tarefa de fundo que executa `compact_events` periodicamente."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self.runs = 0
+        self.archived = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Inicia a tarefa periódica (se o intervalo for positivo)."""
+        if self.running or self.interval <= 0:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Para a tarefa periódica, esperando pelo fim de uma compactação em curso."""
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    async def run_once(self, batch_size: int = EVENT_ARCHIVE_CHUNK_SIZE) -> Optional[Dict[str, int]]:
+        """
+        Executa uma compactação, se nenhuma outra estiver em curso (neste ou noutro worker).
+
+        Returns:
+            Optional[Dict[str, int]]: O resumo de `compact_events`, ou None se outra compactação
+            estiver em curso.
+        """
+        owner = await acquire_lease("retention", RETENTION_LEASE_SECONDS)
+        if owner is None:
+            return None
+        started = time.perf_counter()
+        try:
+            summary = await compact_events(batch_size=batch_size)
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        finally:
+            await release_lease("retention", owner)
+        self.runs += 1
+        self.archived += summary["archived"]
+        self.last_run_at = datetime.now(timezone.utc)
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        self.last_error = None
+        return summary
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                # Uma falha não pode parar a tarefa periódica; é repetida no próximo intervalo.
+                print(f"Falha na compactação de eventos: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores da compactação para monitorização."""
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "last_error": self.last_error,
+        }
+
+
+retention_job = RetentionJob(interval=EVENT_RETENTION_INTERVAL_SECONDS)
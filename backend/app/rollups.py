@@ -0,0 +1,151 @@
+# rollups.py
+"""
+Contagens pré-agregadas de eventos ('rollups') e o histograma construído a partir delas.
+
+A coleção 'event_rollups' guarda, para cada recurso, tipo de evento e intervalo de uma hora
+ou de um dia (em UTC), o número de eventos registados. As contagens são incrementadas ('$inc'
+com upsert) em cada escrita de eventos ('crud.insert_event_documents'), pelo que um histograma
+de meses de histórico lê algumas centenas de intervalos em vez de percorrer todos os eventos.
+
+Os eventos arquivados pelas políticas de retenção continuam contados. Se as contagens
+divergirem dos eventos (ex: eventos inseridos diretamente no MongoDB), podem ser recalculadas
+com 'python -m app.manage rebuild-rollups'.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+
+from .database import get_database
+
+GRANULARITIES = ("hour", "day")
+# Campo de agrupamento do histograma para cada valor de 'group_by'.
+GROUP_FIELDS = {"event_type": "$event_type", "resource": "$resource_id", "none": None}
+
+RollupKey = Tuple[ObjectId, str, str, datetime]
+
+
+def get_rollup_collection():
+    """Retorna a coleção 'event_rollups' do MongoDB."""
+    return get_database().get_collection("event_rollups")
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    """Converte uma data para UTC sem fuso, o formato em que o MongoDB devolve as datas."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Retorna o início (UTC) da hora ou do dia que contém a data."""
+    timestamp = _as_naive_utc(timestamp).replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0) if granularity == "day" else timestamp
+
+
+def _count(documents: Iterable[Dict[str, Any]], counts: "Counter[RollupKey]"):
+    for event_data in documents:
+        if not isinstance(event_data.get("timestamp"), datetime):
+            continue
+        for granularity in GRANULARITIES:
+            key = (event_data["resource_id"], event_data["event_type"], granularity, bucket_start(event_data["timestamp"], granularity))
+            counts[key] += 1
+
+
+def _key_filter(key: RollupKey) -> Dict[str, Any]:
+    resource_id, event_type, granularity, bucket = key
+    return {"resource_id": resource_id, "event_type": event_type, "granularity": granularity, "bucket": bucket}
+
+
+async def record(documents: List[Dict[str, Any]]):
+    """Incrementa as contagens com os eventos acabados de gravar, numa única escrita em lote."""
+    counts: "Counter[RollupKey]" = Counter()
+    _count(documents, counts)
+    if not counts:
+        return
+    operations = [UpdateOne(_key_filter(key), {"$inc": {"count": n}}, upsert=True) for key, n in counts.items()]
+    await get_rollup_collection().bulk_write(operations, ordered=False)
+
+
+async def remove_resources(resource_ids: List[ObjectId]):
+    """Remove as contagens dos recursos excluídos."""
+    await get_rollup_collection().delete_many({"resource_id": {"$in": resource_ids}})
+
+
+async def rebuild(*sources: AsyncIterable[Dict[str, Any]], batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recalcula todas as contagens a partir dos eventos (ex: 'crud.iter_events()' e os eventos arquivados).
+    Eventos gravados durante o recálculo podem não ser contados; execute-o com pouca atividade.
+
+    Returns:
+        Dict[str, int]: O número de eventos lidos e de contagens gravadas.
+    """
+    counts: "Counter[RollupKey]" = Counter()
+    events = 0
+    for source in sources:
+        batch = []
+        async for event_data in source:
+            batch.append(event_data)
+            if len(batch) >= batch_size:
+                _count(batch, counts)
+                events += len(batch)
+                batch = []
+        _count(batch, counts)
+        events += len(batch)
+
+    collection = get_rollup_collection()
+    await collection.delete_many({})
+    operations = [InsertOne({**_key_filter(key), "count": n}) for key, n in counts.items()]
+    for start in range(0, len(operations), batch_size):
+        await collection.bulk_write(operations[start:start + batch_size], ordered=False)
+    return {"events": events, "rollups": len(operations)}
+
+
+async def histogram(
+    granularity: str = "day",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_types: Optional[List[str]] = None,
+    resource_ids: Optional[List[str]] = None,
+    group_by: str = "event_type",
+) -> Dict[str, Any]:
+    """
+    Conta os eventos por intervalo de tempo a partir das contagens pré-agregadas.
+
+    Args:
+        granularity (str): 'hour' ou 'day'.
+        start_date (Optional[datetime]): Inclui o intervalo que contém esta data e os seguintes.
+        end_date (Optional[datetime]): Inclui os intervalos que começam até esta data.
+        event_types (Optional[List[str]]): Tipos de evento a incluir.
+        resource_ids (Optional[List[str]]): IDs dos recursos a incluir.
+        group_by (str): 'event_type', 'resource' (por ID) ou 'none'.
+
+    Returns:
+        Dict[str, Any]: Os intervalos com eventos, por ordem cronológica, cada um com o início
+        ('start'), o total ('count') e, se agrupado, o total de cada tipo ou recurso ('by').
+    """
+    query: Dict[str, Any] = {"granularity": granularity}
+    if start_date or end_date:
+        query["bucket"] = {}
+        if start_date: query["bucket"]["$gte"] = bucket_start(start_date, granularity)
+        if end_date: query["bucket"]["$lte"] = _as_naive_utc(end_date)
+    if event_types:
+        query["event_type"] = {"$in": event_types}
+    if resource_ids is not None:
+        query["resource_id"] = {"$in": [ObjectId(rid) for rid in resource_ids if ObjectId.is_valid(rid)]}
+
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": {"bucket": "$bucket", "key": GROUP_FIELDS[group_by]}, "count": {"$sum": "$count"}}},
+    ]
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    async for group in get_rollup_collection().aggregate(pipeline):
+        start = group["_id"]["bucket"]
+        bucket = buckets.setdefault(start, {"start": start.replace(tzinfo=timezone.utc), "count": 0, "by": {}})
+        bucket["count"] += group["count"]
+        key = group["_id"].get("key")
+        if key is not None:
+            bucket["by"][str(key)] = bucket["by"].get(str(key), 0) + group["count"]
+    return {"granularity": granularity, "group_by": group_by, "buckets": [buckets[start] for start in sorted(buckets)]}
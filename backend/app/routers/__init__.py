@@ -1 +1 @@
-from . import auth, users, resources, config
\ No newline at end of file
+from . import auth, users, resources, config, events
\ No newline at end of file
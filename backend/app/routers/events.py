@@ -0,0 +1,195 @@
+# routers/events.py
+"""
+Define os endpoints da API que operam sobre os eventos de todos os recursos.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, Dict, List, Literal, Optional
+from datetime import datetime, timezone
+import json
+import os
+
+from .. import crud, retention, rollups, schemas
+from ..graph import resource_graph
+from ..streaming import json_stream_response
+from .resources import require_role
+
+router = APIRouter()
+
+# Número máximo de eventos aceites num único pedido de ingestão em lote.
+EVENT_BATCH_MAX_SIZE = int(os.getenv("EVENT_BATCH_MAX_SIZE", 5000))
+# Tamanho máximo (bytes) do corpo de um pedido de ingestão em lote, verificado antes de o ler e validar.
+EVENT_BATCH_MAX_BYTES = int(os.getenv("EVENT_BATCH_MAX_BYTES", EVENT_BATCH_MAX_SIZE * 1024))
+
+
+def _event_to_json(event_data: Dict[str, Any]) -> str:
+    """Serializa um documento de evento para uma linha JSON."""
+    timestamp = event_data["timestamp"]
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    resource_id = str(event_data["resource_id"])
+    return json.dumps({
+        "resource_id": resource_id,
+        "resource_name": resource_graph.names.get(resource_id),
+        "event_type": event_data["event_type"],
+        "message": event_data.get("message"),
+        "timestamp": timestamp.isoformat(),
+    }, ensure_ascii=False)
+
+
+def _split(value: Optional[str]):
+    """Converte um parâmetro separado por vírgulas numa lista (ou None)."""
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+@router.get("/events", dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
+async def stream_events(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    format: Literal["ndjson", "json"] = "ndjson",
+):
+    """
+    Transmite os eventos de todos os recursos em ordem cronológica, à medida que são lidos do MongoDB.
+
+    Filtros opcionais: intervalo de datas, tipos de evento (ex: "DEPLOY,ERROR") e IDs de recurso
+    separados por vírgulas. Com `format=ndjson` (padrão) cada linha é um evento; com `format=json`
+    a resposta é um único array JSON, também enviado em partes.
+    """
+    await resource_graph.ensure_loaded()
+    events = crud.iter_events(
+        start_date=start_date, end_date=end_date,
+        event_types=_split(event_type), resource_ids=_split(resource_id),
+    )
+
+    return json_stream_response(events, format=format, serialize=_event_to_json)
+
+
+@router.get("/events/histogram", response_model=schemas.EventHistogram, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
+async def get_event_histogram(
+    granularity: Literal["hour", "day"] = "day",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    group_by: Literal["event_type", "resource", "none"] = "event_type",
+):
+    """
+    Número de eventos por hora ou por dia (UTC), lido das contagens pré-agregadas em vez dos eventos.
+    Aceita os mesmos filtros de '/events'; os intervalos sem eventos são omitidos. Inclui os
+    eventos já arquivados pelas políticas de retenção.
+    """
+    return await rollups.histogram(
+        granularity=granularity, start_date=start_date, end_date=end_date,
+        event_types=_split(event_type), resource_ids=_split(resource_id), group_by=group_by,
+    )
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+async def _read_limited_body(request: Request, limit: int) -> bytes:
+    """
+    Lê o corpo do pedido, recusando-o com 413 pelo 'Content-Length' ou assim que o que
+    já foi recebido exceder `limit` bytes, sem o ler nem validar por inteiro.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(f"No máximo {limit} bytes por pedido.")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _too_large(f"No máximo {limit} bytes por pedido.")
+    return bytes(body)
+
+
+_batch_adapter = TypeAdapter(List[schemas.EventBatchItem])
+
+
+@router.post(
+    "/events/batch",
+    response_model=schemas.EventBatchResult,
+    dependencies=[Depends(require_role(["administrador", "usuario"]))],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": schemas.EventBatchItem.model_json_schema()}},
+    }}},
+)
+async def add_events_batch(request: Request):
+    """
+    Ingestão de eventos em lote (ex: pipelines de CI/CD). Cada item indica o recurso pelo
+    'resource_id' ou pelo 'resource_name'; todos os nomes são resolvidos numa única consulta e
+    os eventos gravados numa única escrita em lote. A resposta traz o estado de cada item,
+    pela mesma ordem do pedido: um item inválido não impede a gravação dos restantes.
+
+    Um corpo maior do que EVENT_BATCH_MAX_BYTES é recusado com 413 antes de ser validado.
+    """
+    body = await _read_limited_body(request, EVENT_BATCH_MAX_BYTES)
+    try:
+        items = _batch_adapter.validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    if len(items) > EVENT_BATCH_MAX_SIZE:
+        raise _too_large(f"No máximo {EVENT_BATCH_MAX_SIZE} eventos por pedido.")
+    return await crud.add_events_batch(items)
+
+
+@router.get("/events/archive", dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
+async def stream_archived_events(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    format: Literal["ndjson", "json"] = "ndjson",
+):
+    """
+    Transmite os eventos movidos para o arquivo pelas políticas de retenção, com os mesmos
+    filtros e formatos de '/events'. Só são descomprimidos os blocos do arquivo que podem
+    conter eventos dos recursos, datas e tipos pedidos.
+    """
+    await resource_graph.ensure_loaded()
+    events = retention.iter_archived_events(
+        start_date=start_date, end_date=end_date,
+        event_types=_split(event_type), resource_ids=_split(resource_id),
+    )
+    return json_stream_response(events, format=format, serialize=_event_to_json)
+
+
+@router.get("/events/retention-policies", response_model=List[schemas.RetentionPolicyOut], dependencies=[Depends(require_role(["administrador"]))])
+async def list_retention_policies():
+    """Lista as políticas de retenção de eventos."""
+    return await crud.get_retention_policies()
+
+
+@router.post("/events/retention-policies", response_model=schemas.RetentionPolicyOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role(["administrador"]))])
+async def create_retention_policy(policy: schemas.RetentionPolicyCreate):
+    """
+    Cria uma política de retenção de eventos, aplicada na próxima compactação.
+    Sem 'resource_id' aplica-se a todos os recursos; sem 'event_type', a todos os tipos de evento.
+    """
+    created = await crud.create_retention_policy(policy)
+    if created is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return created
+
+
+@router.delete("/events/retention-policies/{policy_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_role(["administrador"]))])
+async def delete_retention_policy(policy_id: str):
+    """Remove uma política de retenção. Os eventos já arquivados continuam no arquivo."""
+    if not await crud.delete_retention_policy(policy_id):
+        raise HTTPException(status_code=404, detail="Retention policy not found")
+    return
+
+
+@router.post("/events/retention/run", response_model=schemas.RetentionRunResult, responses={409: {"description": "Outra compactação em curso."}}, dependencies=[Depends(require_role(["administrador"]))])
+async def run_retention():
+    """
+    Aplica de imediato todas as políticas de retenção, sem esperar pela tarefa periódica.
+    Responde 409 se outra compactação estiver em curso.
+    """
+    summary = await retention.retention_job.run_once()
+    if summary is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Já está em curso uma compactação de eventos.")
+    return summary
@@ -3,12 +3,20 @@
 Define todos os endpoints (rotas) da API relacionados ao gerenciamento de Recursos.
 Inclui rotas para criar, listar, atualizar, deletar, clonar, e obter metadados de recursos.
 """
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+from typing import AsyncIterator, Dict, List, Literal, Optional
 from datetime import datetime
+import hashlib
 
 from .. import crud, schemas, security
-from ..crud import get_resource_collection 
+from ..graph import resource_graph
+from ..event_buffer import event_buffer
+from ..layout import layout_cache
+from ..search import search_index
+from ..responses import FastJSONResponse
+from ..streaming import json_stream_response
 from ..models import UserInDB
 from ..models import BulkDeleteRequest
 
@@ -35,110 +43,262 @@ def require_role(required_roles: List[str]):
         return current_user
     return role_checker
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara o cabeçalho If-None-Match com uma ETag (comparação fraca, como pede o RFC 9110)."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+async def catalog_etag(request: Request, response: Response) -> str:
+    """
+    Função de dependência para GETs condicionais sobre dados do catálogo.
+
+    A ETag é derivada da versão do catálogo (incrementada por todas as escritas no 'crud')
+    e do URL pedido. Se o cliente enviar uma ETag igual em If-None-Match, a rota não é
+    executada e é devolvido 304 Not Modified, sem corpo.
+    """
+    version = await crud.get_catalog_version()
+    digest = hashlib.sha1(str(request.url).encode()).hexdigest()[:12]
+    etag = f'"{version}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return etag
+
 @router.post("/resources", response_model=schemas.ResourceOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role(["administrador", "usuario"]))])
 async def create_new_resource(resource: schemas.ResourceCreate):
-    """Cria um novo recurso, validando se o nome já existe."""
-    db_resource = await crud.get_resource_by_name(resource.name)
-    if db_resource:
-        raise HTTPException(status_code=409, detail=f"Um recurso com o nome '{resource.name}' já existe.")
-    created_resource = await crud.create_resource(resource)
+    """Cria um novo recurso. A unicidade do nome é garantida pelo índice único do MongoDB."""
+    try:
+        created_resource = await crud.create_resource(resource)
+    except crud.DuplicateResourceNameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return schemas.ResourceOut.model_validate(created_resource, from_attributes=True)
 
-@router.get("/resources", response_model=List[schemas.ResourceWithRelationsOut], dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
-async def get_all_resources_list(name: Optional[str] = None, tags: Optional[str] = None):
+@router.get("/resources", response_model=List[schemas.ResourceWithRelationsOut], dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_all_resources_list(
+    response: Response,
+    name: Optional[str] = None,
+    tags: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
     Retorna uma lista de recursos.
     A lógica aqui é enriquecer os dados dos recursos com os nomes de seus pais e filhos
     para exibição na tabela do frontend.
+
+    Com 'limit', a lista é paginada: se houver mais resultados, o cabeçalho
+    'X-Next-Cursor' contém o valor a enviar em 'after' para obter a página seguinte.
+    O parâmetro 'fields' (ex: "name,tags,events") escolhe os campos devolvidos;
+    por omissão, o histórico de eventos não é incluído.
     """
-    # 1. Busca todos os recursos para mapeamento completo das relações.
-    all_resources_for_mapping = await crud.get_all_resources()
-    parent_map = {}
-    for parent_resource in all_resources_for_mapping:
-        for child_id_str in parent_resource.related_resources:
-            if child_id_str not in parent_map:
-                parent_map[child_id_str] = []
-            parent_map[child_id_str].append(parent_resource.name)
+    # 1. Garante que o índice de relações em memória está construído.
+    await resource_graph.ensure_loaded()
 
     # 2. Busca os recursos que correspondem aos filtros da query.
-    filtered_resources = await crud.get_all_resources(name=name, tags=tags)
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        filtered_resources = await crud.get_all_resources_out(name=name, tags=tags, limit=limit, after=after, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit and len(filtered_resources) == limit:
+        last = filtered_resources[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last["name"], last["id"])
     
-    # 3. Monta a resposta, adicionando os nomes de pais e filhos.
-    response_list = []
+    # 3. Completa a resposta, resolvendo os nomes de pais e filhos através do índice.
+    #    Os recursos já estão no formato de saída, pelo que são serializados sem nova validação.
     for resource in filtered_resources:
-        child_names = [r.name for r in all_resources_for_mapping if str(r.id) in resource.related_resources]
-        parent_names = parent_map.get(str(resource.id), [])
+        resource["parents"] = resource_graph.parent_names(resource["id"])
+        resource["children"] = resource_graph.child_names(resource["id"])
         
-        resource_out = schemas.ResourceWithRelationsOut(
-            **resource.model_dump(),
-            parents=parent_names,
-            children=child_names
-        )
-        response_list.append(resource_out)
-        
-    return response_list
+    return FastJSONResponse(filtered_resources, headers=response.headers)
 
-@router.get("/resources/map", response_model=schemas.ServiceMap, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
-async def get_service_map(name: Optional[str] = None, tags: Optional[str] = None):
+@router.get("/resources/map", response_model=schemas.ServiceMap, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_service_map(response: Response, name: Optional[str] = None, tags: Optional[str] = None):
     """
     Retorna os dados formatados para a biblioteca ReactFlow,
     gerando a estrutura de 'nós' (nodes) e 'arestas' (edges) para o mapa.
+    As posições dos nós são calculadas no servidor (layout em camadas) e reutilizadas
+    enquanto a topologia do grafo não mudar.
+    """
+    await resource_graph.ensure_loaded()
+    try:
+        resources = await crud.get_all_resources_out(name=name, tags=tags)
+    except crud.TagQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(_build_service_map(resources), headers=response.headers)
+
+def _build_service_map(resources: List[dict], extra_data: Optional[dict] = None) -> dict:
     """
-    resources = await crud.get_all_resources(name=name, tags=tags)
+    Monta a estrutura de nós e arestas do ReactFlow ('schemas.ServiceMap') para um conjunto
+    de recursos no formato de saída, com as posições calculadas pelo layout em camadas
+    (em cache por versão da topologia).
+
+    Args:
+        resources: Os recursos a incluir; apenas as arestas entre eles são devolvidas.
+        extra_data: Campos adicionais a juntar ao 'data' de cada nó, por ID de recurso.
+    """
+    resource_ids = [r["id"] for r in resources]
+    positions = layout_cache.get_or_compute(resource_graph.version, resource_ids, resource_graph.children)
+    resource_ids_set = set(resource_ids)
     nodes = []
     edges = []
-    resource_ids_in_filter = {str(r.id) for r in resources}
     for res in resources:
-        res_id_str = str(res.id)
-        nodes.append(schemas.Node(
-            id=res_id_str,
-            data={"label": res.name, "description": res.description or "", "tags": [t.model_dump() for t in res.tags]},
-            position={"x": 0, "y": 0} 
-        ))
-        for related_id in res.related_resources:
-            related_id_str = str(related_id)
-            if related_id_str in resource_ids_in_filter:
-                edges.append(schemas.Edge(
-                    id=f"{res_id_str}-{related_id_str}",
-                    source=res_id_str,
-                    target=related_id_str
-                ))
-    return schemas.ServiceMap(nodes=nodes, edges=edges)
-
-@router.get("/resources/{resource_id}", response_model=schemas.ResourceOut, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
-async def get_single_resource(resource_id: str):
+        res_id_str = res["id"]
+        data = {"label": res["name"], "description": res["description"] or "", "tags": res["tags"]}
+        if extra_data and res_id_str in extra_data:
+            data.update(extra_data[res_id_str])
+        nodes.append({"id": res_id_str, "type": "default", "data": data, "position": positions.get(res_id_str, {"x": 0, "y": 0})})
+        for related_id_str in res["related_resources"]:
+            if related_id_str in resource_ids_set:
+                edges.append({
+                    "id": f"{res_id_str}-{related_id_str}",
+                    "source": res_id_str,
+                    "target": related_id_str,
+                    "animated": True,
+                    "style": {"stroke": "#6b7280"},
+                })
+    return {"nodes": nodes, "edges": edges}
+
+async def _subgraph(resource_id: str, upstream: bool, depth: Optional[int]) -> dict:
+    """Calcula, por BFS no índice de relações, o subgrafo a montante ou a jusante de um recurso."""
+    await resource_graph.ensure_loaded()
+    depths = resource_graph.walk(resource_id, upstream=upstream, max_depth=depth)
+    if not depths:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    resources = await crud.get_resources_out_by_ids(list(depths))
+    return _build_service_map(resources, {rid: {"depth": d} for rid, d in depths.items()})
+
+@router.get("/resources/search", response_model=List[schemas.ResourceSearchResult], dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def search_resources(response: Response, q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=100)):
+    """
+    Pesquisa textual no nome, na descrição e nas tags dos recursos, com resultados ordenados
+    por relevância. Todos os termos têm de ocorrer (em qualquer campo); o último termo também
+    corresponde a palavras que comecem por ele. Os destaques vêm com as palavras encontradas
+    entre <mark> e </mark> (o restante texto é escapado para HTML).
+    """
+    await search_index.ensure_loaded()
+    return FastJSONResponse(search_index.search(q, limit=limit), headers=response.headers)
+
+@router.get("/resources/export", dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
+async def export_resources(
+    name: Optional[str] = None,
+    tags: Optional[str] = None,
+    include_events: bool = False,
+    format: Literal["ndjson", "json"] = "ndjson",
+):
+    """
+    Exporta o catálogo no mesmo formato aceite por '/resources/import' (relações por nome),
+    transmitindo os recursos à medida que são lidos do MongoDB. Com `include_events=true`,
+    cada recurso inclui também o seu histórico de eventos.
+    """
+    # O filtro de tags é validado antes de a transmissão começar, para poder responder 400.
+    try:
+        crud.compile_tag_query(tags or "")
+    except crud.TagQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    resources = crud.iter_resources_for_export(name=name, tags=tags, include_events=include_events)
+    return json_stream_response(resources, format=format, filename="recursos")
+
+@router.get("/resources/{resource_id}", response_model=schemas.ResourceOut, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_single_resource(resource_id: str, response: Response):
     """Busca e retorna um único recurso pelo seu ID."""
-    resource = await crud.get_resource(resource_id)
+    resource = await crud.get_resource_out(resource_id)
     if resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
-    return schemas.ResourceOut.model_validate(resource, from_attributes=True)
+    return FastJSONResponse(resource, headers=response.headers)
+
+@router.get("/resources/{resource_id}/dependencies", response_model=schemas.ServiceMap, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_resource_dependencies(resource_id: str, response: Response, depth: Optional[int] = Query(None, ge=1, le=100)):
+    """
+    Retorna o subgrafo a montante de um recurso: os recursos de que ele depende (pais, avós, ...),
+    até `depth` níveis. Cada nó inclui em 'data.depth' a sua distância ao recurso pedido.
+    """
+    return FastJSONResponse(await _subgraph(resource_id, upstream=True, depth=depth), headers=response.headers)
+
+@router.get("/resources/{resource_id}/impact", response_model=schemas.ServiceMap, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_resource_impact(resource_id: str, response: Response, depth: Optional[int] = Query(None, ge=1, le=100)):
+    """
+    Retorna o subgrafo a jusante de um recurso: os recursos afetados por ele (filhos, netos, ...),
+    até `depth` níveis. Cada nó inclui em 'data.depth' a sua distância ao recurso pedido.
+    """
+    return FastJSONResponse(await _subgraph(resource_id, upstream=False, depth=depth), headers=response.headers)
 
 @router.put("/resources/{resource_id}", response_model=schemas.ResourceOut, dependencies=[Depends(require_role(["administrador", "usuario"]))])
 async def update_existing_resource(resource_id: str, resource: schemas.ResourceUpdate):
-    """Atualiza um recurso, validando se o novo nome entra em conflito com outro recurso."""
-    if resource.name:
-        db_resource = await crud.get_resource_by_name(resource.name)
-        # Se um recurso com o novo nome foi encontrado, e o seu ID é diferente do que estamos a editar...
-        if db_resource and str(db_resource.id) != resource_id:
-            raise HTTPException(status_code=409, detail=f"Um recurso com o nome '{resource.name}' já existe.")
-    updated_resource = await crud.update_resource(resource_id, resource)
+    """Atualiza um recurso. Um novo nome que entre em conflito com outro recurso é rejeitado pelo índice único."""
+    try:
+        updated_resource = await crud.update_resource(resource_id, resource)
+    except crud.DuplicateResourceNameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if updated_resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
     return schemas.ResourceOut.model_validate(updated_resource, from_attributes=True)
 
-@router.post("/resources/import", dependencies=[Depends(require_role(["administrador", "usuario"]))])
-async def import_resources_from_file(resources: List[schemas.ResourceImport]):
+async def _parse_ndjson_import(request: Request, errors: List[str]) -> AsyncIterator[schemas.ResourceImport]:
+    """
+    Lê um corpo NDJSON à medida que chega, produzindo um ResourceImport por linha.
+    As linhas inválidas são registadas em `errors` e ignoradas.
+    """
+    buffer = b""
+    line_number = 0
+
+    def parse(line: bytes):
+        try:
+            return schemas.ResourceImport.model_validate_json(line)
+        except ValidationError as e:
+            errors.append(f"Linha {line_number}: {e.errors()[0]['msg']}")
+            return None
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip() and (item := parse(line)):
+                yield item
+    if buffer.strip():
+        line_number += 1
+        if item := parse(buffer):
+            yield item
+
+_import_list_adapter = TypeAdapter(List[schemas.ResourceImport])
+
+@router.post(
+    "/resources/import",
+    dependencies=[Depends(require_role(["administrador", "usuario"]))],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": schemas.ResourceImport.model_json_schema()}},
+        "application/x-ndjson": {"schema": {"type": "string", "description": "Um ResourceImport (JSON) por linha."}},
+    }}},
+)
+async def import_resources_from_file(request: Request, chunk_size: Optional[int] = Query(None, ge=1, le=10000)):
     """
-    Importa recursos a partir de um corpo JSON.
-    O FastAPI valida automaticamente se a entrada é uma lista do tipo ResourceImport.
+    Importa recursos a partir de um corpo JSON (lista de ResourceImport) ou NDJSON
+    ('Content-Type: application/x-ndjson', um recurso por linha). O corpo NDJSON é
+    processado à medida que é recebido, sem ser carregado por inteiro em memória.
     """
-    summary = await crud.import_resources(resources)
-    return summary
+    if "ndjson" in request.headers.get("content-type", ""):
+        parse_errors: List[str] = []
+        summary = await crud.import_resources(_parse_ndjson_import(request, parse_errors), chunk_size=chunk_size)
+        summary["errors"] = parse_errors + summary["errors"]
+        return summary
+    try:
+        resources = _import_list_adapter.validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return await crud.import_resources(resources, chunk_size=chunk_size)
 
 @router.post("/resources/{resource_id}/clone", response_model=schemas.ResourceOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role(["administrador", "usuario"]))])
 async def clone_existing_resource(resource_id: str):
     """Clona um recurso existente, criando uma cópia com um novo nome."""
-    cloned_resource = await crud.clone_resource(resource_id)
+    try:
+        cloned_resource = await crud.clone_resource(resource_id)
+    except crud.DuplicateResourceNameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if cloned_resource is None:
         raise HTTPException(status_code=404, detail="Recurso não encontrado para clonar")
     return schemas.ResourceOut.model_validate(cloned_resource, from_attributes=True)
@@ -159,24 +319,45 @@ async def delete_existing_resource(resource_id: str):
         raise HTTPException(status_code=404, detail="Resource not found")
     return
 
-@router.post("/resources/{resource_id}/events", response_model=schemas.ResourceOut, dependencies=[Depends(require_role(["administrador", "usuario"]))])
+def _accept_buffered_event(resource_id: str, event: schemas.EventCreate) -> JSONResponse:
+    """Coloca o evento na fila de ingestão assíncrona e responde 202 (ou 503, com a fila cheia)."""
+    event_buffer.enqueue(crud.new_event_document(resource_id, event))
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"status": "accepted", "resource_id": resource_id})
+
+# Resposta das rotas de eventos no modo de ingestão assíncrona (EVENT_INGESTION_MODE=buffered).
+BUFFERED_EVENT_RESPONSES = {
+    202: {"description": "Evento aceite na fila de ingestão assíncrona; será gravado em lote."},
+    503: {"description": "Fila de ingestão cheia; repetir após 'Retry-After'."},
+}
+
+@router.post("/resources/{resource_id}/events", response_model=schemas.ResourceOut, responses=BUFFERED_EVENT_RESPONSES, dependencies=[Depends(require_role(["administrador", "usuario"]))])
 async def add_event(resource_id: str, event: schemas.EventCreate):
-    """Adiciona um novo evento ao histórico de um recurso."""
+    """
+    Adiciona um novo evento ao histórico de um recurso.
+    No modo de ingestão assíncrona, responde 202 assim que o evento entra na fila.
+    """
+    if event_buffer.running:
+        if not await crud.resource_exists(resource_id):
+            raise HTTPException(status_code=404, detail="Resource not found")
+        return _accept_buffered_event(resource_id, event)
     resource = await crud.add_event_to_resource(resource_id, event)
     if resource is None:
         raise HTTPException(status_code=404, detail="Resource not found")
     return schemas.ResourceOut.model_validate(resource, from_attributes=True)
 
-@router.post("/resources/by-name/{resource_name}/events", response_model=schemas.ResourceOut, dependencies=[Depends(require_role(["administrador", "usuario"]))])
+@router.post("/resources/by-name/{resource_name}/events", response_model=schemas.ResourceOut, responses=BUFFERED_EVENT_RESPONSES, dependencies=[Depends(require_role(["administrador", "usuario"]))])
 async def add_event_by_name(resource_name: str, event: schemas.EventCreate):
     """
     Adiciona um novo evento ao histórico de um recurso, buscando-o pelo seu nome.
     Útil para automações e scripts onde o nome é mais acessível que o ID.
+    No modo de ingestão assíncrona, responde 202 assim que o evento entra na fila.
     """
     # 1. Busca o recurso pelo nome para obter o seu ID.
     resource = await crud.get_resource_by_name(resource_name)
     if resource is None:
         raise HTTPException(status_code=404, detail=f"Recurso com o nome '{resource_name}' não foi encontrado.")
+    if event_buffer.running:
+        return _accept_buffered_event(str(resource.id), event)
     
     # 2. Usa o ID encontrado para chamar a função CRUD existente.
     updated_resource = await crud.add_event_to_resource(str(resource.id), event)
@@ -187,22 +368,47 @@ async def add_event_by_name(resource_name: str, event: schemas.EventCreate):
     return schemas.ResourceOut.model_validate(updated_resource, from_attributes=True)
 
 @router.get("/resources/{resource_id}/timeline", response_model=List[schemas.Event], dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
-async def get_event_timeline(resource_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
-    """Retorna a timeline de eventos para um recurso, com filtros opcionais de data."""
-    resource = await crud.get_resource(resource_id)
-    if resource is None:
+async def get_event_timeline(
+    resource_id: str,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    order: Literal["asc", "desc"] = "desc",
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+):
+    """
+    Retorna a timeline de eventos para um recurso, com filtros opcionais de data e de tipo
+    (ex: "DEPLOY,ERROR"). A filtragem, a ordenação e a paginação são feitas no MongoDB.
+    Com 'limit', o cabeçalho 'X-Next-Cursor' contém o valor a enviar em 'after' para a página seguinte.
+    """
+    event_types = [t.strip() for t in event_type.split(",") if t.strip()] if event_type else None
+    try:
+        timeline = await crud.get_event_timeline(
+            resource_id, start_date=start_date, end_date=end_date, event_types=event_types,
+            descending=(order == "desc"), limit=limit, after=after,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if timeline is None:
         raise HTTPException(status_code=404, detail="Resource not found")
-    events = [schemas.Event.model_validate(e, from_attributes=True) for e in resource.events]
-    events.sort(key=lambda x: x.timestamp, reverse=True)
-    if start_date:
-        events = [e for e in events if e.timestamp >= start_date]
-    if end_date:
-        events = [e for e in events if e.timestamp <= end_date]
+    events, next_cursor = timeline
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return events
 
-@router.get("/meta/config", response_model=dict, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"]))])
+@router.get("/meta/config", response_model=dict, dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
 async def get_app_config():
     """Retorna dados de configuração para o frontend, como tipos de eventos e chaves de tags existentes."""
     event_types = ["DEPLOY", "BUILD", "RESTART", "UPDATE", "DOWN", "UP", "INFO", "WARNING", "ERROR", "CRITICAL", "DISASTER"]
-    all_tags = await get_resource_collection().distinct("tags.key")
-    return {"event_types": event_types, "tag_keys": all_tags}
+    facets = await crud.get_tag_facets()
+    return {"event_types": event_types, "tag_keys": list(facets)}
+
+@router.get("/tags/facets", response_model=Dict[str, Dict[str, int]], dependencies=[Depends(require_role(["administrador", "usuario", "visualizador"])), Depends(catalog_etag)])
+async def get_tag_facets():
+    """
+    Retorna, para cada chave de tag, os seus valores e o número de recursos com cada um
+    (ex: {"ENV": {"PROD": 12, "DEV": 3}}), para os filtros do frontend.
+    """
+    return await crud.get_tag_facets()
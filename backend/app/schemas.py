@@ -9,8 +9,8 @@ Estes schemas são usados pelo FastAPI para:
 
 Eles atuam como a "camada de contrato" entre o frontend e o backend.
 """
-from pydantic import BaseModel, Field, BeforeValidator
-from typing import List, Optional, Annotated
+from pydantic import BaseModel, Field, BeforeValidator, model_validator
+from typing import Dict, List, Optional, Annotated
 from datetime import datetime
 from bson import ObjectId
 
@@ -52,6 +52,15 @@ class ResourceWithRelationsOut(ResourceOut):
     parents: List[str] = []
     children: List[str] = []
 
+class ResourceSearchResult(BaseModel):
+    """Schema para um resultado da pesquisa textual de recursos."""
+    id: str
+    name: str
+    description: Optional[str] = None
+    tags: List[Tag] = []
+    score: float = Field(..., description="Relevância do resultado (maior é mais relevante)")
+    highlights: dict = Field({}, description="Campos correspondentes, com as palavras encontradas entre <mark> e </mark>")
+
 class ResourceCreate(BaseModel):
     """Schema para os dados de entrada ao criar um novo recurso."""
     name: str = Field(..., description="Nome do recurso")
@@ -71,6 +80,66 @@ class EventCreate(BaseModel):
     event_type: str
     message: Optional[str] = None
 
+class EventBatchItem(BaseModel):
+    """Um evento da ingestão em lote. O recurso é indicado pelo ID ou pelo nome (sem distinção de maiúsculas)."""
+    resource_id: Optional[str] = None
+    resource_name: Optional[str] = None
+    event_type: str
+    message: Optional[str] = None
+    timestamp: Optional[datetime] = Field(None, description="Data do evento; por omissão, o momento da receção")
+
+class EventBatchItemResult(BaseModel):
+    """O resultado de um item da ingestão em lote, na mesma posição do pedido."""
+    index: int
+    status: str = Field(..., description="'created' ou 'error'")
+    resource_id: Optional[str] = None
+    error: Optional[str] = None
+
+class EventBatchResult(BaseModel):
+    """Schema para a resposta da ingestão de eventos em lote."""
+    created: int
+    failed: int
+    items: List[EventBatchItemResult]
+
+class RetentionPolicyCreate(BaseModel):
+    """
+    Schema para criar uma política de retenção de eventos. Sem 'resource_id', a política aplica-se
+    a todos os recursos; sem 'event_type', a todos os tipos de evento. Pelo menos um dos limites
+    ('max_count' ou 'max_age_days') é obrigatório.
+    """
+    resource_id: Optional[str] = None
+    event_type: Optional[str] = None
+    max_count: Optional[int] = Field(None, ge=1, description="Número máximo de eventos mantidos por recurso (os mais recentes)")
+    max_age_days: Optional[int] = Field(None, ge=1, description="Idade máxima, em dias, dos eventos mantidos")
+
+    @model_validator(mode="after")
+    def check_limits(self):
+        if self.max_count is None and self.max_age_days is None:
+            raise ValueError("Indique 'max_count', 'max_age_days' ou ambos.")
+        return self
+
+class RetentionPolicyOut(RetentionPolicyCreate):
+    """Schema para a resposta ao obter uma política de retenção."""
+    id: ObjectIdStr
+
+class RetentionRunResult(BaseModel):
+    """Schema para o resumo de uma execução da compactação de eventos."""
+    policies: int
+    archived: int = Field(..., description="Eventos movidos para o arquivo")
+    chunks: int = Field(..., description="Blocos comprimidos gravados no arquivo")
+
+class EventHistogramBucket(BaseModel):
+    """Um intervalo (hora ou dia, em UTC) do histograma de eventos."""
+    start: datetime
+    count: int
+    by: Dict[str, int] = Field({}, description="Total por tipo de evento ou por ID de recurso, conforme 'group_by'")
+
+class EventHistogram(BaseModel):
+    """Schema para a resposta do histograma de eventos."""
+    granularity: str
+    group_by: str
+    buckets: List[EventHistogramBucket]
+
 class Node(BaseModel):
     """Schema que representa um 'nó' no formato esperado pela biblioteca ReactFlow."""
     id: str
@@ -0,0 +1,246 @@
+# search.py
+"""
+Índice invertido em memória para a pesquisa textual de recursos.
+
+Indexa o nome, a descrição e as tags (chaves e valores) de cada recurso. Os termos são
+normalizados (minúsculas e sem acentos), pelo que "Configuração" e "configuracao" são
+equivalentes, e o último termo da pesquisa é também procurado como prefixo, para
+permitir pesquisa enquanto se escreve.
+
+Tal como o 'ResourceGraph', o índice é construído, reconstruído e atualizado
+incrementalmente segundo o ciclo de vida de 'ResourceIndex'.
+"""
+import bisect
+import heapq
+import html
+import math
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from .resource_index import ResourceIndex
+
+# Peso de cada campo na relevância: um termo no nome vale mais do que na descrição.
+FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "description": 1.0}
+# Uma correspondência apenas por prefixo vale menos do que a palavra completa.
+PREFIX_WEIGHT = 0.5
+# Tamanho aproximado do excerto da descrição devolvido nos destaques.
+SNIPPET_LENGTH = 160
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Converte um texto para minúsculas e remove os acentos."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Divide um texto nos seus termos normalizados."""
+    return _WORD.findall(normalize(text)) if text else []
+
+
+def _highlight(text: str, terms: List[str], prefix: Optional[str]) -> Optional[str]:
+    """
+    Retorna o texto (escapado para HTML) com as palavras correspondentes entre <mark> e </mark>,
+    ou None se nenhuma palavra corresponder.
+    """
+    parts = []
+    position = 0
+    matched = False
+    for match in _WORD.finditer(text):
+        word = normalize(match.group())
+        if word in terms or (prefix and word.startswith(prefix)):
+            parts.append(html.escape(text[position:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group())}</mark>")
+            position = match.end()
+            matched = True
+    if not matched:
+        return None
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+def _snippet(text: str, terms: List[str], prefix: Optional[str]) -> Optional[str]:
+    """Como `_highlight`, mas limitado a um excerto de cerca de SNIPPET_LENGTH caracteres à volta da primeira correspondência."""
+    if len(text) <= SNIPPET_LENGTH:
+        return _highlight(text, terms, prefix)
+    for match in _WORD.finditer(text):
+        word = normalize(match.group())
+        if word in terms or (prefix and word.startswith(prefix)):
+            start = max(0, match.start() - SNIPPET_LENGTH // 4)
+            end = min(len(text), start + SNIPPET_LENGTH)
+            excerpt = _highlight(text[start:end], terms, prefix)
+            return ("…" if start > 0 else "") + excerpt + ("…" if end < len(text) else "")
+    return None
+
+
+class SearchIndex(ResourceIndex):
+    """Índice invertido (termo -> recursos) sobre o nome, a descrição e as tags dos recursos."""
+
+    projection = {"name": 1, "description": 1, "tags": 1}
+
+    def __init__(self):
+        super().__init__()
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        # Para cada termo, o peso acumulado (por campo) em cada recurso que o contém.
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self._sorted_terms: Optional[List[str]] = None
+
+    def _load(self, resource_id: str, resource_data: Dict[str, Any]):
+        self._add(resource_id, resource_data)
+
+    def _swap(self, other: "SearchIndex"):
+        self.documents, self.postings, self._sorted_terms = other.documents, other.postings, other._sorted_terms
+
+    def _add(self, resource_id: str, resource_data: Dict[str, Any]):
+        document = {
+            "name": resource_data.get("name") or "",
+            "description": resource_data.get("description") or "",
+            "tags": [{"key": t.get("key", ""), "value": t.get("value", "")} for t in resource_data.get("tags") or []],
+        }
+        fields = {
+            "name": tokenize(document["name"]),
+            "description": tokenize(document["description"]),
+            "tags": [term for tag in document["tags"] for term in tokenize(f"{tag['key']} {tag['value']}")],
+        }
+        document["normalized_name"] = " ".join(fields["name"])
+        self.documents[resource_id] = document
+        for field, terms in fields.items():
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    self._sorted_terms = None
+                postings[resource_id] = postings.get(resource_id, 0.0) + FIELD_WEIGHTS[field]
+
+    def _discard(self, resource_id: str):
+        document = self.documents.pop(resource_id, None)
+        if document is None:
+            return
+        terms = set(tokenize(document["name"])) | set(tokenize(document["description"]))
+        terms.update(term for tag in document["tags"] for term in tokenize(f"{tag['key']} {tag['value']}"))
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(resource_id, None)
+                if not postings:
+                    del self.postings[term]
+                    self._sorted_terms = None
+
+    # --- Atualizações incrementais (chamadas pelo crud) ---
+
+    def upsert(self, resource_id: str, resource_data: Dict[str, Any]):
+        """Regista a criação ou alteração de um recurso, a partir do documento completo."""
+        if not self.is_loaded():
+            return
+        self._discard(str(resource_id))
+        self._add(str(resource_id), resource_data)
+
+    def remove(self, resource_ids: Iterable[str]):
+        """Remove recursos do índice."""
+        if not self.is_loaded():
+            return
+        for resource_id in resource_ids:
+            self._discard(str(resource_id))
+
+    # --- Consultas ---
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        end = bisect.bisect_left(self._sorted_terms, prefix + "\U0010ffff")
+        return self._sorted_terms[start:end]
+
+    def score_any(self, terms: Iterable[str]) -> Dict[str, float]:
+        """
+        Relevância de cada recurso que contenha pelo menos um dos termos (já normalizados),
+        sem correspondência por prefixo. Usado para escolher o contexto das perguntas à IA.
+        """
+        total = len(self.documents)
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for resource_id, weight in postings.items():
+                scores[resource_id] = scores.get(resource_id, 0.0) + weight * idf
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Pesquisa recursos que contenham todos os termos da consulta (em qualquer campo).
+
+        Args:
+            query (str): O texto pesquisado. O último termo também corresponde a palavras que comecem por ele.
+            limit (int): Número máximo de resultados.
+
+        Returns:
+            List[Dict[str, Any]]: Os resultados ordenados por relevância, cada um com 'id', 'score'
+            e 'highlights' (os campos correspondentes, com as palavras encontradas entre <mark>).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        prefix = terms[-1]
+        total = len(self.documents)
+        scores: Optional[Dict[str, float]] = None
+        for term in terms:
+            candidates = [(term, 1.0)] if term in self.postings else []
+            if term == prefix:
+                candidates += [(t, PREFIX_WEIGHT) for t in self._prefix_terms(term) if t != term]
+            term_scores: Dict[str, float] = {}
+            for candidate, factor in candidates:
+                postings = self.postings[candidate]
+                idf = math.log(1 + total / len(postings))
+                for resource_id, weight in postings.items():
+                    score = weight * idf * factor
+                    if score > term_scores.get(resource_id, 0.0):
+                        term_scores[resource_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {rid: s + term_scores[rid] for rid, s in scores.items() if rid in term_scores}
+            if not scores:
+                return []
+
+        normalized_query = " ".join(terms)
+        for resource_id in scores:
+            # Bónus para nomes iguais à pesquisa ou que comecem por ela.
+            name = self.documents[resource_id]["normalized_name"]
+            if name == normalized_query:
+                scores[resource_id] *= 2
+            elif name.startswith(normalized_query):
+                scores[resource_id] *= 1.5
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], self.documents[item[0]]["normalized_name"]))
+
+        exact_terms = terms[:-1] + [prefix]
+        results = []
+        for resource_id, score in ranked:
+            document = self.documents[resource_id]
+            highlights: Dict[str, Any] = {}
+            name = _highlight(document["name"], exact_terms, prefix)
+            if name:
+                highlights["name"] = name
+            description = _snippet(document["description"], exact_terms, prefix)
+            if description:
+                highlights["description"] = description
+            tags = [t for t in (_highlight(f"{tag['key']}:{tag['value']}", exact_terms, prefix) for tag in document["tags"]) if t]
+            if tags:
+                highlights["tags"] = tags
+            results.append({
+                "id": resource_id,
+                "name": document["name"],
+                "description": document["description"] or None,
+                "tags": document["tags"],
+                "score": round(score, 4),
+                "highlights": highlights,
+            })
+        return results
+
+
+# Instância partilhada por toda a aplicação.
+search_index = SearchIndex()
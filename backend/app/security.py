@@ -2,9 +2,13 @@
 """
 Módulo responsável por todas as funcionalidades de segurança e autenticação.
 """
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
@@ -21,11 +25,189 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 1024))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64))
+USER_INVALIDATION_CHANNEL = "service_catalog:users"
 
 # --- Configuração de Hashing de Senhas ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
+# --- Cache de Utilizadores Autenticados ---
+class UserCache:
+    """
+    Cache limitada (LRU) com expiração (TTL) de token verificado -> UserInDB.
+
+    Evita a consulta ao MongoDB em cada requisição autenticada. Cada entrada expira
+    após `ttl` segundos ou quando o próprio token expira (o que ocorrer primeiro),
+    e é invalidada explicitamente quando o utilizador é alterado ou excluído. O nome do
+    utilizador é publicado num canal do Redis para que os outros workers descartem também
+    as suas entradas (tal como a 'AppConfigCache'); o TTL limita o atraso se a notificação se perder.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, UserInDB]]" = OrderedDict()
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        """Retorna o utilizador associado ao token, se estiver na cache e não tiver expirado."""
+        entry = self._entries.get(token)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[token]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, user: UserInDB, token_expires_at: Optional[float] = None):
+        """Guarda o utilizador de um token, removendo as entradas menos usadas se a cache estiver cheia."""
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, time.monotonic() + max(0.0, token_expires_at - time.time()))
+        self._entries[token] = (expires_at, user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None):
+        """Remove as entradas de um utilizador (ou todas, se `username` for None)."""
+        if username is None:
+            self._entries.clear()
+            return
+        for token in [t for t, (_, user) in self._entries.items() if user.username == username]:
+            del self._entries[token]
+
+    def handle_message(self, data: Any):
+        """Processa a invalidação de um utilizador publicada por outro worker."""
+        if isinstance(data, bytes):
+            data = data.decode()
+        if isinstance(data, str) and data:
+            self.invalidate(data)
+
+    async def publish(self, username: str):
+        """Notifica os outros workers de que o utilizador foi alterado ou excluído."""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(USER_INVALIDATION_CHANNEL, username)
+        except Exception as e:
+            print(f"Falha ao publicar a invalidação do utilizador: {e}")
+
+    async def start_listener(self, redis_instance):
+        """Subscreve o canal de invalidação no Redis (chamado no arranque da aplicação)."""
+        self._redis = redis_instance
+        pubsub = redis_instance.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(USER_INVALIDATION_CHANNEL)
+
+        async def listen():
+            try:
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self.handle_message(message.get("data"))
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Escuta de invalidações de utilizadores interrompida: {e}")
+            finally:
+                await pubsub.close()
+
+        self._listener = asyncio.create_task(listen())
+
+    async def stop_listener(self):
+        """Cancela a subscrição (chamado no encerramento da aplicação)."""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._redis = None
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores de acertos e falhas e o tamanho atual da cache."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+
+user_cache = UserCache(ttl=USER_CACHE_TTL_SECONDS, max_size=USER_CACHE_MAX_SIZE)
+
+# --- Execução do bcrypt fora do Event Loop ---
+class PasswordHasher:
+    """
+    Executa as operações de bcrypt (lentas por design) num pool de threads limitado,
+    para que não bloqueiem o event loop do asyncio enquanto são calculadas.
+
+    O número de operações à espera de uma thread é limitado: acima de `queue_limit`,
+    novas operações são recusadas com HTTP 503, em vez de acumularem latência.
+    Os tempos de espera na fila são registados para monitorização.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Executa `func(*args)` numa thread do pool e aguarda o resultado."""
+        if self._in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations, please retry.",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        submitted_at = time.perf_counter()
+
+        def task():
+            wait = time.perf_counter() - submitted_at
+            return wait, func(*args)
+
+        self._in_flight += 1
+        try:
+            wait, result = await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            self._in_flight -= 1
+        self.completed += 1
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        return result
+
+    def shutdown(self):
+        """Encerra o pool de threads (chamado no encerramento da aplicação)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do pool, incluindo o tempo médio e máximo de espera na fila."""
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait_ms": round(1000 * self.total_wait_seconds / self.completed, 3) if self.completed else 0.0,
+            "max_queue_wait_ms": round(1000 * self.max_wait_seconds, 3),
+        }
+
+
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, queue_limit=PASSWORD_HASH_QUEUE_LIMIT)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se uma senha em texto plano corresponde a um hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -34,6 +216,14 @@ def get_password_hash(password: str) -> str:
     """Gera o hash para uma senha em texto plano usando bcrypt."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão de `verify_password` para handlers assíncronos, executada no `password_hasher`."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Versão de `get_password_hash` para handlers assíncronos, executada no `password_hasher`."""
+    return await password_hasher.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Cria um novo token de acesso JWT."""
     to_encode = data.copy()
@@ -46,9 +236,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
-    """Dependência FastAPI para decodificar um token e obter os dados do utilizador."""
+    """
+    Dependência FastAPI para decodificar um token e obter os dados do utilizador.
+    Os utilizadores de tokens já verificados são servidos pela `user_cache`.
+    """
     # A importação é feita aqui, dentro da função, para evitar o ciclo.
     from . import crud
+
+    cached_user = user_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,6 +264,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     user = await crud.get_user_by_username(username=token_data.username)
     if user is None:
         raise credentials_exception
+    user_cache.set(token, user, token_expires_at=payload.get("exp"))
     return user
 
 async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
@@ -92,6 +290,6 @@ async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     user = await crud.get_user_by_username(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
@@ -0,0 +1,52 @@
+# streaming.py
+"""
+Funções auxiliares para respostas transmitidas (streaming) em JSON.
+
+Permitem enviar coleções grandes ao cliente à medida que são lidas do MongoDB,
+em NDJSON (um objeto por linha) ou como um único array JSON enviado em partes,
+sem construir a resposta completa em memória.
+"""
+import json
+from typing import Any, AsyncIterator, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+
+def _default_serializer(item: Any) -> str:
+    return json.dumps(item, ensure_ascii=False, default=str)
+
+
+def json_stream_response(
+    items: AsyncIterator[Any],
+    format: str = "ndjson",
+    serialize: Callable[[Any], str] = _default_serializer,
+    filename: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Cria uma StreamingResponse a partir de um iterável assíncrono.
+
+    Args:
+        items: Os itens a enviar.
+        format: "ndjson" (um item por linha) ou "json" (um array JSON).
+        serialize: Função que converte um item numa string JSON.
+        filename: Se indicado, a resposta é marcada como anexo com este nome (sem extensão).
+    """
+    async def ndjson() -> AsyncIterator[str]:
+        async for item in items:
+            yield serialize(item) + "\n"
+
+    async def json_array() -> AsyncIterator[str]:
+        yield "["
+        separator = ""
+        async for item in items:
+            yield separator + serialize(item)
+            separator = ","
+        yield "]"
+
+    is_json = format == "json"
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.{"json" if is_json else "ndjson"}"'
+    if is_json:
+        return StreamingResponse(json_array(), media_type="application/json", headers=headers)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,130 @@
+# tag_query.py
+"""
+Linguagem de filtro por tags e a sua compilação para queries do MongoDB.
+
+Gramática (por ordem crescente de precedência):
+    expressão  := termo_e (("OR" | "|" | ",") termo_e)*
+    termo_e    := negação (("AND" | "&")? negação)*      (termos seguidos equivalem a AND)
+    negação    := ("NOT" | "!") negação | átomo
+    átomo      := "(" expressão ")" | chave ":" valor | chave
+
+Exemplos:
+    env:prod,env:dev                 recursos com ENV=PROD ou ENV=DEV (formato antigo: vírgula = OR)
+    env:prod AND team:core           recursos com as duas tags
+    env:prod NOT (team:core | owner) ENV=PROD, exceto os da equipa CORE ou com a tag OWNER
+    owner                            recursos que têm a chave OWNER, com qualquer valor
+    app:"portal web"                 valores com espaços ou símbolos vão entre aspas
+
+As chaves e os valores são normalizados como em 'crud._normalize_tags' (maiúsculas), pelo que
+a comparação é exata e usa o índice composto multikey (tags.key, tags.value).
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r'\s*(?:(?P<op>[(),|&!])|(?P<term>[^\s(),|&!":]+(?::(?:"[^"]*"|[^\s(),|&!"]*))?))')
+_KEYWORDS = {"AND": "&", "OR": "|", "NOT": "!"}
+
+
+class TagQueryError(ValueError):
+    """Levantada quando um filtro de tags não respeita a gramática."""
+    def __init__(self, message: str):
+        super().__init__(f"Filtro de tags inválido: {message}")
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise TagQueryError(f"caractere inesperado na posição {position + 1}.")
+        position = match.end()
+        if match.group("op"):
+            operator = match.group("op")
+            tokens.append(("op", "|" if operator == "," else operator))
+        elif match.group("term").upper() in _KEYWORDS:
+            tokens.append(("op", _KEYWORDS[match.group("term").upper()]))
+        else:
+            tokens.append(("term", match.group("term")))
+    return tokens
+
+
+def _compile_term(term: str) -> Dict[str, Any]:
+    key, _, value = term.partition(":")
+    key = key.upper()
+    if value.startswith('"'):
+        value = value[1:-1]
+    if not value or value == "*":
+        return {"tags.key": key}
+    return {"tags": {"$elemMatch": {"key": key, "value": value.upper()}}}
+
+
+class _Parser:
+    """Analisador descendente recursivo que produz diretamente a query do MongoDB."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def accept(self, operator: str) -> bool:
+        if self.peek() == ("op", operator):
+            self.position += 1
+            return True
+        return False
+
+    def expression(self) -> Dict[str, Any]:
+        clauses = [self.conjunction()]
+        while self.accept("|"):
+            clauses.append(self.conjunction())
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    def conjunction(self) -> Dict[str, Any]:
+        clauses = [self.negation()]
+        while True:
+            if self.accept("&"):
+                clauses.append(self.negation())
+            elif self.peek() in (("op", "!"), ("op", "(")) or (self.peek() or ("",))[0] == "term":
+                clauses.append(self.negation())
+            else:
+                break
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def negation(self) -> Dict[str, Any]:
+        if self.accept("!"):
+            return {"$nor": [self.negation()]}
+        return self.atom()
+
+    def atom(self) -> Dict[str, Any]:
+        token = self.peek()
+        if token is None:
+            raise TagQueryError("a expressão termina de forma inesperada.")
+        self.position += 1
+        if token == ("op", "("):
+            query = self.expression()
+            if not self.accept(")"):
+                raise TagQueryError("falta fechar um parêntese.")
+            return query
+        if token[0] == "term":
+            return _compile_term(token[1])
+        raise TagQueryError(f"operador '{token[1]}' fora de lugar.")
+
+
+def compile_tag_query(text: str) -> Dict[str, Any]:
+    """
+    Compila um filtro de tags (ver a gramática no topo do módulo) numa query do MongoDB.
+
+    Raises:
+        TagQueryError: Se o filtro for inválido.
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        return {}
+    parser = _Parser(tokens)
+    query = parser.expression()
+    if parser.peek() is not None:
+        raise TagQueryError(f"'{parser.peek()[1]}' inesperado.")
+    return query
@@ -0,0 +1,89 @@
+# benchmarks/serialization.py
+"""
+Micro-benchmark do custo de serialização por recurso na listagem (GET /api/resources).
+
+Compara o caminho anterior (documento -> ResourceInDB -> model_dump -> ResourceWithRelationsOut,
+validado de novo pelo 'response_model' e serializado com json.dumps) com o caminho rápido
+(documento -> dicionário de saída com 'crud.resource_to_out', serializado com orjson).
+Não precisa de MongoDB: os documentos são gerados em memória.
+
+Uso (a partir da pasta 'backend'):
+    python -m benchmarks.serialization [--resources 1000] [--events 5] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from app import crud, schemas
+from app.models import ResourceInDB
+from app.responses import dumps
+
+
+def make_documents(count: int, events: int) -> List[dict]:
+    """Gera documentos com a forma dos devolvidos pelo MongoDB (ObjectId e datas sem fuso)."""
+    ids = [ObjectId() for _ in range(count)]
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ids[i],
+            "name": f"Recurso {i:05d}",
+            "description": f"Descrição do recurso {i}",
+            "tags": [{"key": "ENV", "value": "PROD"}, {"key": "TEAM", "value": f"EQUIPA{i % 7}"}],
+            "related_resources": [ids[(i + 1) % count], ids[(i + 2) % count]],
+            "events": [
+                {"event_type": "DEPLOY", "timestamp": start + timedelta(minutes=i + n), "message": f"v{n}"}
+                for n in range(events)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def previous_path(documents: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[schemas.ResourceWithRelationsOut])
+    response_list = []
+    for doc in documents:
+        data = dict(doc)
+        data["related_resources"] = [str(rid) for rid in data["related_resources"]]
+        resource = ResourceInDB(**data)
+        response_list.append(schemas.ResourceWithRelationsOut(**resource.model_dump(), parents=["A"], children=["B"]))
+    # O que o FastAPI faz com o 'response_model': validar de novo e serializar.
+    content = adapter.dump_python(adapter.validate_python(response_list), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_path(documents: List[dict]) -> bytes:
+    response_list = []
+    for doc in documents:
+        resource = crud.resource_to_out(doc)
+        resource["events"] = [crud._event_to_out(e) for e in doc["events"]]
+        resource["parents"] = ["A"]
+        resource["children"] = ["B"]
+        response_list.append(resource)
+    return dumps(response_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = make_documents(args.resources, args.events)
+    assert json.loads(previous_path(documents)) == json.loads(fast_path(documents)), "Os dois caminhos divergem."
+    for label, path in [("anterior", previous_path), ("rápido", fast_path)]:
+        best = min(timeit.repeat(lambda: path(documents), number=1, repeat=args.repeat))
+        print(f"{label:>9}: {best * 1e6 / args.resources:8.1f} µs por recurso ({best * 1e3:.1f} ms no total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,12 @@ import pytest_asyncio
 import mongomock_motor
 from httpx import AsyncClient, ASGITransport
 from unittest.mock import patch
+from bson import ObjectId
 
 from app.main import app
+from app.indexes import apply_indexes
+from app import security
+from app.models import UserInDB
 
 @pytest_asyncio.fixture(scope="function")
 async def test_client():
@@ -18,6 +22,7 @@ async def test_client():
     
     with patch("app.database.client", mock_mongo_client), \
          patch("app.database.db", mock_mongo_client.service_catalog_test):
+        await apply_indexes()
         
         # A nova abordagem com lifespan não requer chamadas explícitas aqui,
         # pois o próprio AsyncClient irá gerir o ciclo de vida da app.
@@ -26,3 +31,22 @@ async def test_client():
         transport = ASGITransport(app=app)
         async with AsyncClient(transport=transport, base_url="http://test") as client:
             yield client
+
+@pytest_asyncio.fixture(scope="function")
+async def admin_client(test_client):
+    """
+    Fixture que reutiliza o cliente de teste, mas substitui a autenticação
+    por um utilizador administrador fixo, permitindo testar as rotas protegidas.
+    """
+    admin = UserInDB(
+        _id=ObjectId(),
+        username="admin",
+        email="admin@example.com",
+        role="administrador",
+        hashed_password="x",
+    )
+    app.dependency_overrides[security.get_current_active_user] = lambda: admin
+    try:
+        yield test_client
+    finally:
+        app.dependency_overrides.pop(security.get_current_active_user, None)
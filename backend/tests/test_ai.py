@@ -0,0 +1,111 @@
+# tests/test_ai.py
+"""Testes para a construção do contexto e a rota de análise por IA (ai.py), com um cliente local no lugar do Gemini."""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from types import SimpleNamespace
+from app import ai, crud, schemas
+from app.models import AppConfig
+
+
+class StubModels:
+    """Substitui 'client.aio.models', guardando os prompts recebidos."""
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+
+    async def generate_content(self, model, contents):
+        self.calls.append({"model": model, "contents": contents})
+        number = len(self.calls)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return SimpleNamespace(text=f"Resposta {number}")
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    """Substitui o cliente do Gemini por um cliente local e começa com a cache de respostas vazia."""
+    models = StubModels()
+    monkeypatch.setattr(ai, "create_client", lambda api_key: SimpleNamespace(aio=SimpleNamespace(models=models)))
+    monkeypatch.setattr(ai, "_client", None)
+    monkeypatch.setattr(ai, "response_cache", ai.ResponseCache(ttl=60, max_size=10))
+    return models
+
+
+async def _catalog():
+    db = await crud.create_resource(schemas.ResourceCreate(name="Base de Dados Pagamentos"))
+    api = await crud.create_resource(schemas.ResourceCreate(
+        name="API de Pagamentos", description="Processa cobranças.", tags=[{"key": "team", "value": "financeiro"}],
+        related_resources=[str(db.id)],
+    ))
+    for i in range(200):
+        await crud.create_resource(schemas.ResourceCreate(name=f"Serviço {i:03d}", description="Serviço interno sem relação. " * 5))
+    await crud.add_event_to_resource(str(api.id), schemas.EventCreate(event_type="ERROR", message="Timeout ao contactar o banco"))
+    return api, db
+
+@pytest.mark.asyncio
+async def test_build_context_selects_relevant_resources_within_budget(test_client):
+    """Testa se o contexto inclui os recursos relevantes, os seus vizinhos e eventos, sem exceder o orçamento."""
+    api, db = await _catalog()
+
+    context = await ai.build_context("Porque é que os pagamentos estão a falhar?", token_budget=400)
+    assert set(context.resource_ids[:2]) == {str(api.id), str(db.id)}
+    assert context.tokens <= 400
+    assert len(context.resource_ids) < 50
+    assert "API de Pagamentos [TEAM=FINANCEIRO]: Processa cobranças. | afeta: Base de Dados Pagamentos" in context.text
+    assert "API de Pagamentos ERROR: Timeout ao contactar o banco" in context.text
+    assert context.event_count == 1
+    assert context.build_ms < 1000
+
+@pytest.mark.asyncio
+async def test_analyse_sends_budgeted_context_to_model(test_client, stub_models, monkeypatch):
+    """Testa a rota de análise com um cliente local: o prompt contém apenas o contexto selecionado."""
+    await _catalog()
+    await crud.update_app_config(AppConfig(gemini_api_key="chave-de-teste", gemini_model="modelo-teste"))
+    monkeypatch.setattr(ai, "TOKEN_BUDGET", 300)
+
+    response = await test_client.post("/api/ai/analyse", json={"prompt": "Como está a API de pagamentos?"})
+    assert response.status_code == 200
+    assert response.json() == {"response": "Resposta 1"}
+    prompt = stub_models.calls[0]["contents"]
+    assert stub_models.calls[0]["model"] == "modelo-teste"
+    assert "API de Pagamentos" in prompt and "Pergunta do usuário: Como está a API de pagamentos?" in prompt
+    assert ai.estimate_tokens(prompt) < 500
+
+@pytest.mark.asyncio
+async def test_analyse_caches_responses_per_catalog_version(test_client, stub_models):
+    """Testa a cache de respostas: perguntas iguais reutilizam a resposta até o catálogo mudar."""
+    api, _ = await _catalog()
+    config = AppConfig(gemini_api_key="chave-de-teste", gemini_model="modelo-teste")
+
+    assert await ai.analyse("Como está a API?", config) == "Resposta 1"
+    # A normalização ignora maiúsculas, acentos e espaços repetidos.
+    assert await ai.analyse("  como   ESTÁ a api?", config) == "Resposta 1"
+    assert len(stub_models.calls) == 1
+    assert await ai.analyse("Como está a API?", config.model_copy(update={"gemini_model": "outro"})) == "Resposta 2"
+
+    await crud.add_event_to_resource(str(api.id), schemas.EventCreate(event_type="DEPLOY"))
+    assert await ai.analyse("Como está a API?", config) == "Resposta 3"
+    assert ai.response_cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_analyse_limits_concurrency_and_times_out(test_client, stub_models, monkeypatch):
+    """Testa o limite de chamadas simultâneas, a partilha de perguntas iguais em curso e o tempo máximo."""
+    await _catalog()
+    config = AppConfig(gemini_api_key="chave-de-teste", gemini_model="modelo-teste")
+    monkeypatch.setattr(ai, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(ai, "_semaphore", None)
+    stub_models.delay = 0.05
+
+    answers = await asyncio.gather(*[ai.analyse(f"Pergunta {i % 4}", config) for i in range(8)])
+    assert len(stub_models.calls) == 4
+    assert len(set(answers)) == 4
+    assert stub_models.max_running == 2
+
+    monkeypatch.setattr(ai, "TIMEOUT_SECONDS", 0.01)
+    with pytest.raises(HTTPException) as exc_info:
+        await ai.analyse("Pergunta demorada", config)
+    assert exc_info.value.status_code == 504
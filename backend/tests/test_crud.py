@@ -2,7 +2,10 @@
 """Testes para as funções CRUD (crud.py)."""
 import pytest
 from app import crud, schemas
+from app.models import AppConfig
+from app.config_cache import app_config_cache
 from bson import ObjectId
+from datetime import datetime
 
 @pytest.mark.asyncio
 async def test_create_and_get_user(test_client):
@@ -61,3 +64,71 @@ async def test_add_event_to_resource(test_client):
     assert len(updated_resource.events) == 1
     assert updated_resource.events[0].event_type == "DEPLOY"
     assert updated_resource.events[0].message == "Versão 1.0 implantada."
+
+@pytest.mark.asyncio
+async def test_migrate_embedded_events(test_client):
+    """Testa a migração dos eventos embutidos (formato antigo) para a coleção 'events'."""
+    legacy = await crud.get_resource_collection().insert_one({
+        "name": "Legado",
+        "tags": [],
+        "related_resources": [],
+        "events": [
+            {"event_type": "DEPLOY", "message": "v1", "timestamp": datetime(2024, 1, 1)},
+            {"event_type": "RESTART", "message": None, "timestamp": datetime(2024, 1, 2)},
+            {"event_type": "RESTART", "message": None, "timestamp": datetime(2024, 1, 2)},
+        ],
+    })
+    # Simula uma execução interrompida depois de gravar o primeiro evento.
+    await crud.get_event_collection().insert_one({
+        "resource_id": legacy.inserted_id, "legacy_index": 0,
+        "event_type": "DEPLOY", "message": "v1", "timestamp": datetime(2024, 1, 1),
+    })
+
+    summary = await crud.migrate_embedded_events()
+    # Eventos idênticos são mantidos; o já migrado não é duplicado nem contado.
+    assert summary == {"resources": 1, "events": 2}
+    # Uma segunda execução não duplica eventos.
+    await crud.migrate_embedded_events()
+
+    raw = await crud.get_resource_collection().find_one({"_id": legacy.inserted_id})
+    assert "events" not in raw
+    resource = await crud.get_resource(str(legacy.inserted_id))
+    assert [e.event_type for e in resource.events] == ["DEPLOY", "RESTART", "RESTART"]
+    assert await crud.get_event_collection().count_documents({}) == 3
+
+@pytest.mark.asyncio
+async def test_backfill_name_keys_before_indexes(test_client):
+    """Testa o preenchimento do 'name_key' dos recursos antigos, executado no arranque da aplicação."""
+    await crud.create_resource(schemas.ResourceCreate(name="Fila"))
+    await crud.get_resource_collection().insert_many([
+        {"name": "Legacy API", "tags": [], "related_resources": []},
+        {"name": "LEGACY API", "tags": [], "related_resources": []},
+        {"name": "fila", "tags": [], "related_resources": []},
+    ])
+    assert await crud.get_resource_by_name("legacy api") is None
+
+    summary = await crud.backfill_name_keys()
+    assert summary == {"updated": 1, "duplicates": ["LEGACY API", "fila"]}
+    assert (await crud.get_resource_by_name("legacy api")).name == "Legacy API"
+    assert await crud.backfill_name_keys() == {"updated": 0, "duplicates": ["LEGACY API", "fila"]}
+
+    with pytest.raises(crud.DuplicateResourceNameError):
+        await crud.create_resource(schemas.ResourceCreate(name="legacy API"))
+
+@pytest.mark.asyncio
+async def test_app_config_is_cached_and_versioned(test_client):
+    """Testa se a configuração é servida da cache e se cada gravação incrementa a versão."""
+    await crud.update_app_config(AppConfig(icon_url="https://exemplo/a.png"))
+    assert app_config_cache.version == 1
+
+    # Alterações feitas diretamente no banco não são vistas enquanto a cache for válida...
+    await crud.get_app_config_collection().update_one({}, {"$set": {"icon_url": "https://exemplo/b.png"}})
+    assert (await crud.get_app_config()).icon_url == "https://exemplo/a.png"
+
+    # ...até que outro worker notifique uma nova versão.
+    app_config_cache.handle_message("2")
+    assert (await crud.get_app_config()).icon_url == "https://exemplo/b.png"
+
+    updated = await crud.update_app_config(AppConfig(icon_url="https://exemplo/c.png"))
+    assert updated.icon_url == "https://exemplo/c.png"
+    assert app_config_cache.version == 2
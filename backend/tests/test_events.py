@@ -0,0 +1,274 @@
+# tests/test_events.py
+"""Testes para as rotas de eventos (routers/events.py)."""
+import asyncio
+import json
+import pytest
+from bson import ObjectId
+from datetime import datetime, timezone
+from app import crud, retention, rollups, schemas
+from app.event_buffer import EventBuffer
+from app.routers import events as events_router, resources as resources_router
+
+
+@pytest.mark.asyncio
+async def test_stream_events_as_ndjson_with_filters(admin_client):
+    """Testa o feed global de eventos em NDJSON, com filtros de tipo e de recurso."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    worker = await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+    await crud.get_event_collection().insert_many([
+        {"resource_id": api.id, "event_type": "DEPLOY", "message": "a1", "timestamp": datetime(2024, 1, 1)},
+        {"resource_id": worker.id, "event_type": "ERROR", "message": "w1", "timestamp": datetime(2024, 1, 2)},
+        {"resource_id": api.id, "event_type": "ERROR", "message": "a2", "timestamp": datetime(2024, 1, 3)},
+    ])
+
+    response = await admin_client.get("/api/events")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["message"] for e in lines] == ["a1", "w1", "a2"]
+    assert lines[0]["resource_name"] == "API"
+
+    response = await admin_client.get("/api/events", params={"event_type": "ERROR", "resource_id": str(api.id), "format": "json"})
+    assert [e["message"] for e in response.json()] == ["a2"]
+
+@pytest.mark.asyncio
+async def test_batch_ingestion_reports_per_item_status(admin_client):
+    """Testa a ingestão em lote: resolução por nome e por ID, e estado de cada item."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    worker = await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+
+    response = await admin_client.post("/api/events/batch", json=[
+        {"resource_name": "api", "event_type": "DEPLOY", "message": "v2"},
+        {"resource_id": str(worker.id), "event_type": "RESTART", "timestamp": "2024-01-01T10:00:00Z"},
+        {"resource_name": "Inexistente", "event_type": "BUILD"},
+        {"resource_id": "invalido", "event_type": "BUILD"},
+        {"event_type": "BUILD"},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 3)
+    assert [item["status"] for item in body["items"]] == ["created", "created", "error", "error", "error"]
+    assert body["items"][0]["resource_id"] == str(api.id)
+
+    worker_events = (await crud.get_resource(str(worker.id))).events
+    assert [(e.event_type, e.timestamp.year) for e in worker_events] == [("RESTART", 2024)]
+    assert [e.message for e in (await crud.get_resource(str(api.id))).events] == ["v2"]
+
+@pytest.mark.asyncio
+async def test_batch_ingestion_rejects_oversized_bodies_before_parsing(admin_client, monkeypatch):
+    """Testa se um lote acima dos limites é recusado com 413, pelo tamanho do corpo (com ou sem 'Content-Length') ou pelo número de itens."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    monkeypatch.setattr(events_router, "EVENT_BATCH_MAX_BYTES", 200)
+    monkeypatch.setattr(events_router, "EVENT_BATCH_MAX_SIZE", 2)
+    batch_adapter = events_router._batch_adapter
+    parsed = []
+    monkeypatch.setattr(events_router, "_batch_adapter", type("Adapter", (), {"validate_json": lambda self, body: parsed.append(body) or []})())
+    body = json.dumps([{"resource_id": str(api.id), "event_type": "DEPLOY", "message": "x" * 100}] * 3).encode()
+
+    response = await admin_client.post("/api/events/batch", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+
+    async def chunked():
+        for start in range(0, len(body), 64):
+            yield body[start:start + 64]
+    response = await admin_client.post("/api/events/batch", content=chunked(), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert parsed == []
+
+    # Dentro do limite de bytes, o número de itens continua a ser verificado.
+    monkeypatch.setattr(events_router, "_batch_adapter", batch_adapter)
+    monkeypatch.setattr(events_router, "EVENT_BATCH_MAX_BYTES", 10000)
+    response = await admin_client.post("/api/events/batch", json=[{"resource_id": str(api.id), "event_type": "DEPLOY"}] * 3)
+    assert response.status_code == 413
+    assert (await admin_client.post("/api/events/batch", json=[{"message": "sem tipo"}])).status_code == 422
+
+@pytest.mark.asyncio
+async def test_buffered_ingestion_accepts_flushes_and_drains(admin_client, monkeypatch):
+    """Testa a ingestão assíncrona: 202 imediato, gravação em lote, recusa com a fila cheia e gravação no encerramento."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    buffer = EventBuffer(max_size=3, flush_size=2, flush_interval=60)
+    monkeypatch.setattr(resources_router, "event_buffer", buffer)
+    buffer.start()
+    try:
+        response = await admin_client.post(f"/api/resources/{api.id}/events", json={"event_type": "DEPLOY"})
+        assert response.status_code == 202
+        assert response.json() == {"status": "accepted", "resource_id": str(api.id)}
+        assert (await admin_client.post(f"/api/resources/{ObjectId()}/events", json={"event_type": "DEPLOY"})).status_code == 404
+
+        # O segundo evento completa um lote, que é gravado sem esperar pelo intervalo.
+        await admin_client.post("/api/resources/by-name/api/events", json={"event_type": "BUILD"})
+        for _ in range(50):
+            if buffer.written == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert buffer.written == 2
+
+        buffer.flush_size = 10
+        for _ in range(3):
+            await admin_client.post(f"/api/resources/{api.id}/events", json={"event_type": "RESTART"})
+        full = await admin_client.post(f"/api/resources/{api.id}/events", json={"event_type": "RESTART"})
+        assert full.status_code == 503
+        assert full.headers["Retry-After"] == "1"
+    finally:
+        await buffer.stop()
+
+    assert buffer.stats()["written"] == 5
+    assert len((await crud.get_resource(str(api.id))).events) == 5
+
+@pytest.mark.asyncio
+async def test_buffered_ingestion_retries_holds_and_drops_orphans(test_client, monkeypatch):
+    """Testa se uma falha do MongoDB não perde eventos aceites, sem os duplicar, e se os de recursos excluídos são descartados."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    removed = await crud.create_resource(schemas.ResourceCreate(name="Removido"))
+    buffer = EventBuffer(max_size=10, flush_size=10, flush_interval=60, retries=1, retry_backoff=0)
+    buffer.start()
+
+    insert_event_documents = crud.insert_event_documents
+    failures = []
+    async def flaky_insert(documents):
+        # Cada falha grava o primeiro evento antes de perder a ligação, como num failover a meio do lote.
+        if failures:
+            await insert_event_documents(documents[:1])
+            raise ConnectionError(failures.pop())
+        return await insert_event_documents(documents)
+    monkeypatch.setattr(crud, "insert_event_documents", flaky_insert)
+
+    try:
+        for event_type in ("DEPLOY", "BUILD"):
+            buffer.enqueue(crud.new_event_document(str(api.id), schemas.EventCreate(event_type=event_type)))
+        buffer.enqueue(crud.new_event_document(str(removed.id), schemas.EventCreate(event_type="DEPLOY")))
+        await crud.delete_resource(str(removed.id))
+
+        # Todas as tentativas falham: o lote fica retido, e não perdido.
+        failures[:] = ["failover", "failover"]
+        assert await buffer._flush() is False
+        assert buffer.stats()["queued"] == 3 and buffer.failed == 0
+        assert await crud.get_event_collection().count_documents({"resource_id": api.id}) == 2
+
+        # Na gravação seguinte, os eventos já gravados não são repetidos e o do recurso excluído é descartado.
+        assert await buffer._flush() is True
+    finally:
+        await buffer.stop()
+
+    stats = buffer.stats()
+    assert (stats["queued"], stats["written"], stats["orphaned"], stats["failed"], stats["write_errors"]) == (0, 2, 1, 0, 2)
+    assert sorted(e.event_type for e in (await crud.get_resource(str(api.id))).events) == ["BUILD", "DEPLOY"]
+    assert await crud.get_event_collection().count_documents({"resource_id": removed.id}) == 0
+
+@pytest.mark.asyncio
+async def test_retention_policies_archive_and_query(admin_client):
+    """Testa as políticas de retenção: compactação por contagem e idade, arquivo comprimido e a sua consulta."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    worker = await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+    await crud.get_event_collection().insert_many(
+        [{"resource_id": api.id, "event_type": "DEPLOY", "message": f"d{day}", "timestamp": datetime(2024, 1, day)} for day in range(1, 6)]
+        + [{"resource_id": api.id, "event_type": "ERROR", "message": "e1", "timestamp": datetime(2024, 1, 2)}]
+        + [{"resource_id": worker.id, "event_type": "ERROR", "message": f"w{day}", "timestamp": datetime(2024, 3, day)} for day in (1, 20)]
+    )
+
+    assert (await admin_client.post("/api/events/retention-policies", json={"event_type": "DEPLOY"})).status_code == 422
+    assert (await admin_client.post("/api/events/retention-policies", json={"resource_id": str(ObjectId()), "max_count": 1})).status_code == 404
+    # Mantém os 2 DEPLOY mais recentes do API e, em todos os recursos, os eventos dos últimos 15 dias.
+    created = await admin_client.post("/api/events/retention-policies", json={"resource_id": str(api.id), "event_type": "DEPLOY", "max_count": 2})
+    assert created.status_code == 201
+    await admin_client.post("/api/events/retention-policies", json={"max_age_days": 15})
+    assert len((await admin_client.get("/api/events/retention-policies")).json()) == 2
+
+    summary = await retention.compact_events(now=datetime(2024, 3, 25, tzinfo=timezone.utc), batch_size=2)
+    assert summary == {"policies": 2, "archived": 7, "chunks": 5}
+    remaining = [e["message"] async for e in crud.iter_events()]
+    assert remaining == ["w20"]
+    chunk = await crud.get_event_archive_collection().find_one({"resource_id": worker.id})
+    assert chunk["count"] == 1 and isinstance(chunk["data"], bytes)
+
+    response = await admin_client.get("/api/events/archive", params={"resource_id": str(api.id), "format": "json"})
+    assert sorted(e["message"] for e in response.json()) == ["d1", "d2", "d3", "d4", "d5", "e1"]
+    response = await admin_client.get("/api/events/archive", params={"event_type": "DEPLOY", "start_date": "2024-01-04T00:00:00Z"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(e["message"], e["resource_name"]) for e in lines] == [("d4", "API"), ("d5", "API")]
+
+    assert (await admin_client.delete(f"/api/events/retention-policies/{created.json()['id']}")).status_code == 204
+    await crud.delete_resource(str(api.id))
+    assert await crud.get_event_archive_collection().count_documents({"resource_id": api.id}) == 0
+    assert len(await crud.get_retention_policies()) == 1
+
+    # Só uma compactação de cada vez: uma execução manual com outra em curso recebe 409.
+    owner = await retention.acquire_lease("retention", 60)
+    assert owner is not None
+    assert await retention.acquire_lease("retention", 60) is None
+    assert (await admin_client.post("/api/events/retention/run")).status_code == 409
+    await retention.release_lease("retention", owner)
+    response = await admin_client.post("/api/events/retention/run")
+    assert response.status_code == 200 and response.json()["policies"] == 1
+    # O 'lease' é libertado no fim da execução.
+    assert await retention.acquire_lease("retention", 60) is not None
+
+@pytest.mark.asyncio
+async def test_retention_resumes_interrupted_compaction_without_duplicates(test_client, monkeypatch):
+    """Testa se uma compactação interrompida entre a gravação do arquivo e a remoção dos eventos não os duplica no arquivo."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    await crud.get_event_collection().insert_many(
+        [{"resource_id": api.id, "event_type": "DEPLOY", "message": f"d{day}", "timestamp": datetime(2024, 1, day)} for day in range(1, 4)]
+    )
+    await crud.create_retention_policy(schemas.RetentionPolicyCreate(max_age_days=1))
+
+    class CrashingEvents:
+        """Coleção de eventos cuja remoção falha, como numa queda do processo após gravar o arquivo."""
+        def __init__(self, collection):
+            self.collection = collection
+        def __getattr__(self, name):
+            return getattr(self.collection, name)
+        async def delete_many(self, *args, **kwargs):
+            raise ConnectionError("queda")
+
+    get_event_collection = crud.get_event_collection
+    monkeypatch.setattr(crud, "get_event_collection", lambda: CrashingEvents(get_event_collection()))
+    with pytest.raises(ConnectionError):
+        await retention.compact_events(batch_size=2)
+    assert await crud.get_event_archive_collection().count_documents({}) == 1
+    monkeypatch.setattr(crud, "get_event_collection", get_event_collection)
+
+    summary = await retention.compact_events(batch_size=2)
+    assert summary == {"policies": 1, "archived": 3, "chunks": 1}
+    assert sorted([e["message"] async for e in retention.iter_archived_events()]) == ["d1", "d2", "d3"]
+
+@pytest.mark.asyncio
+async def test_histogram_reads_incremental_rollups(admin_client):
+    """Testa as contagens atualizadas em cada escrita de eventos, o histograma e o recálculo das contagens."""
+    api = await crud.create_resource(schemas.ResourceCreate(name="API"))
+    worker = await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+    await admin_client.post("/api/events/batch", json=[
+        {"resource_id": str(api.id), "event_type": "DEPLOY", "timestamp": "2024-01-01T10:15:00Z"},
+        {"resource_id": str(api.id), "event_type": "DEPLOY", "timestamp": "2024-01-01T10:45:00Z"},
+        {"resource_id": str(api.id), "event_type": "ERROR", "timestamp": "2024-01-01T23:59:00-03:00"},
+        {"resource_id": str(worker.id), "event_type": "DEPLOY", "timestamp": "2024-01-03T08:00:00Z"},
+    ])
+    await admin_client.post(f"/api/resources/{api.id}/events", json={"event_type": "DEPLOY"})
+
+    response = await admin_client.get("/api/events/histogram", params={"end_date": "2024-12-31T00:00:00Z"})
+    assert response.status_code == 200
+    body = response.json()
+    # O ERROR das 23:59 (UTC-3) pertence ao dia 2 em UTC.
+    assert [(b["start"][:10], b["count"], b["by"]) for b in body["buckets"]] == [
+        ("2024-01-01", 2, {"DEPLOY": 2}),
+        ("2024-01-02", 1, {"ERROR": 1}),
+        ("2024-01-03", 1, {"DEPLOY": 1}),
+    ]
+
+    response = await admin_client.get("/api/events/histogram", params={
+        "granularity": "hour", "event_type": "DEPLOY", "resource_id": str(api.id),
+        "start_date": "2024-01-01T10:30:00Z", "end_date": "2024-01-01T23:00:00Z", "group_by": "none",
+    })
+    assert [(b["start"], b["count"], b["by"]) for b in response.json()["buckets"]] == [("2024-01-01T10:00:00Z", 2, {})]
+
+    by_resource = (await admin_client.get("/api/events/histogram", params={"group_by": "resource"})).json()["buckets"]
+    assert sum(b["by"].get(str(worker.id), 0) for b in by_resource) == 1
+    assert sum(b["count"] for b in by_resource) == 5
+
+    # O recálculo a partir dos eventos reproduz as contagens incrementais.
+    before = sorted([(r["resource_id"], r["event_type"], r["granularity"], r["bucket"], r["count"]) async for r in rollups.get_rollup_collection().find()])
+    summary = await rollups.rebuild(crud.iter_events(), retention.iter_archived_events())
+    after = sorted([(r["resource_id"], r["event_type"], r["granularity"], r["bucket"], r["count"]) async for r in rollups.get_rollup_collection().find()])
+    assert summary["events"] == 5 and after == before
+
+    await crud.delete_resource(str(worker.id))
+    assert await rollups.get_rollup_collection().count_documents({"resource_id": worker.id}) == 0
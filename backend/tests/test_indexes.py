@@ -0,0 +1,31 @@
+# tests/test_indexes.py
+"""Testes para o registo de índices (indexes.py)."""
+import pytest
+from app import database
+from app.indexes import INDEXES, apply_indexes, check_indexes
+
+
+@pytest.mark.asyncio
+async def test_apply_indexes_is_idempotent_and_reports_extra(test_client):
+    """Testa se os índices declarados são criados e se os não declarados são reportados."""
+    # A fixture já aplicou o registo uma vez; uma segunda aplicação não deve falhar.
+    report = await apply_indexes()
+    assert report["missing"] == [] and report["failed"] == []
+
+    db = database.get_database()
+    users_indexes = await db.get_collection("users").index_information()
+    assert any(info["key"] == [("username", 1)] and info.get("unique") for info in users_indexes.values())
+
+    await db.get_collection("resources").create_index("description")
+    report = await check_indexes()
+    assert report["extra"] == ["resources: description_1"]
+    assert len(INDEXES) >= 8
+
+
+@pytest.mark.asyncio
+async def test_check_indexes_reports_missing(test_client):
+    """Testa se um índice removido é reportado como em falta."""
+    db = database.get_database()
+    await db.get_collection("resources").drop_index("related_resources_1")
+    report = await check_indexes()
+    assert report["missing"] == ["resources: {'related_resources': 1}"]
@@ -0,0 +1,40 @@
+# tests/test_layout.py
+"""Testes para o cálculo do layout do mapa de serviços (layout.py)."""
+import pytest
+from app import crud, schemas
+from app.layout import compute_layout, layout_cache, NODE_HEIGHT, RANK_SEPARATION
+
+RANK = NODE_HEIGHT + RANK_SEPARATION
+
+
+def test_compute_layout_layers_dag_and_breaks_cycles():
+    """Testa se os nós ficam em camadas pela profundidade e se os ciclos não impedem o layout."""
+    adjacency = {"a": ["b", "c"], "b": ["d"], "c": ["d"], "d": ["a"]}  # d -> a fecha um ciclo
+    positions = compute_layout(["a", "b", "c", "d"], adjacency)
+    assert [positions[n]["y"] for n in "abcd"] == [0, RANK, RANK, 2 * RANK]
+    assert positions["b"]["x"] != positions["c"]["x"]
+
+
+def test_compute_layout_reduces_crossings():
+    """Testa se a ordenação por baricentro alinha os filhos com os respetivos pais."""
+    positions = compute_layout(["p1", "p2", "c2", "c1"], {"p1": ["c1"], "p2": ["c2"]})
+    assert (positions["p1"]["x"] < positions["p2"]["x"]) == (positions["c1"]["x"] < positions["c2"]["x"])
+
+
+@pytest.mark.asyncio
+async def test_service_map_positions_cached_until_topology_changes(admin_client):
+    """Testa se o mapa devolve posições calculadas e só as recalcula quando as relações mudam."""
+    db = await crud.create_resource(schemas.ResourceCreate(name="DB"))
+    api = await crud.create_resource(schemas.ResourceCreate(name="API", related_resources=[str(db.id)]))
+
+    misses = layout_cache.misses
+    nodes = {n["id"]: n for n in (await admin_client.get("/api/resources/map")).json()["nodes"]}
+    assert nodes[str(db.id)]["position"]["y"] > nodes[str(api.id)]["position"]["y"]
+
+    await crud.update_resource(str(api.id), schemas.ResourceUpdate(description="Só a descrição"))
+    await admin_client.get("/api/resources/map")
+    assert layout_cache.misses == misses + 1
+
+    await crud.update_resource(str(api.id), schemas.ResourceUpdate(related_resources=[]))
+    await admin_client.get("/api/resources/map")
+    assert layout_cache.misses == misses + 2
@@ -0,0 +1,312 @@
+# tests/test_resources.py
+"""Testes para as rotas de recursos (routers/resources.py)."""
+import json
+import pytest
+from datetime import datetime
+from bson import ObjectId
+from app import crud, schemas
+from app.graph import ResourceGraph, resource_graph
+from app.search import SearchIndex, search_index
+
+
+@pytest.mark.asyncio
+async def test_list_resources_resolves_parents_and_children(admin_client):
+    """Testa se a listagem resolve os nomes de pais e filhos pelo índice de relações."""
+    child = await crud.create_resource(schemas.ResourceCreate(name="Base de Dados"))
+    parent = await crud.create_resource(schemas.ResourceCreate(name="API", related_resources=[str(child.id)]))
+
+    response = await admin_client.get("/api/resources")
+    assert response.status_code == 200
+    by_name = {r["name"]: r for r in response.json()}
+    assert by_name["API"]["children"] == ["Base de Dados"]
+    assert by_name["Base de Dados"]["parents"] == ["API"]
+
+    # Com o índice já construído, as escritas devem atualizá-lo incrementalmente.
+    assert resource_graph.is_loaded()
+    await crud.update_resource(str(child.id), schemas.ResourceUpdate(name="Postgres"))
+    assert resource_graph.child_names(str(parent.id)) == ["Postgres"]
+
+    await crud.delete_resource(str(child.id))
+    response = await admin_client.get("/api/resources")
+    assert response.json()[0]["children"] == []
+
+@pytest.mark.asyncio
+async def test_graph_reloads_after_writes_from_other_workers(admin_client, monkeypatch):
+    """Testa se o índice de relações é reconstruído quando outro worker altera os recursos, e só então."""
+    child = await crud.create_resource(schemas.ResourceCreate(name="Base de Dados"))
+    await admin_client.get("/api/resources")
+    reloads = []
+    original_reload = resource_graph.reload
+    async def counting_reload(*args, **kwargs):
+        reloads.append(1)
+        await original_reload(*args, **kwargs)
+    monkeypatch.setattr(resource_graph, "reload", counting_reload)
+
+    # As escritas deste worker são aplicadas ao índice sem o reconstruir.
+    await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+    await admin_client.get("/api/resources")
+    assert reloads == []
+
+    # Escrita de outro worker: o documento muda e a versão partilhada avança, sem passar por este índice.
+    other = await crud.get_resource_collection().insert_one({"name": "API", "name_key": "api", "related_resources": [child.id], "tags": []})
+    await crud.get_meta_collection().update_one({"_id": "catalog"}, {"$inc": {"version": 1, "resources_version": 1}})
+    by_name = {r["name"]: r for r in (await admin_client.get("/api/resources")).json()}
+    assert reloads == [1]
+    assert by_name["Base de Dados"]["parents"] == ["API"]
+    assert (await admin_client.get(f"/api/resources/{other.inserted_id}/dependencies")).status_code == 200
+
+    # Durante a reconstrução, as consultas continuam a ver o índice anterior, completo.
+    seen = []
+    original_set = ResourceGraph._set
+    def observing_set(graph, *args):
+        seen.append(resource_graph.parent_names(str(child.id)))
+        original_set(graph, *args)
+    monkeypatch.setattr(ResourceGraph, "_set", observing_set)
+    await resource_graph.reload()
+    assert seen and all(parents == ["API"] for parents in seen)
+    assert resource_graph.parent_names(str(child.id)) == ["API"]
+
+@pytest.mark.asyncio
+async def test_list_resources_keyset_pagination_and_fields(admin_client):
+    """Testa a paginação por cursor e a projeção de campos da listagem."""
+    for name in ["C", "A", "B"]:
+        created = await crud.create_resource(schemas.ResourceCreate(name=name, description=f"Recurso {name}"))
+        await crud.add_event_to_resource(str(created.id), schemas.EventCreate(event_type="DEPLOY"))
+
+    first = await admin_client.get("/api/resources", params={"limit": 2})
+    assert [r["name"] for r in first.json()] == ["A", "B"]
+    # Por omissão o histórico de eventos não é carregado.
+    assert all(r["events"] == [] for r in first.json())
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = await admin_client.get("/api/resources", params={"limit": 2, "after": cursor})
+    assert [r["name"] for r in second.json()] == ["C"]
+    assert "X-Next-Cursor" not in second.headers
+
+    with_events = await admin_client.get("/api/resources", params={"fields": "name,events"})
+    assert all(len(r["events"]) == 1 and r["description"] is None for r in with_events.json())
+
+    assert (await admin_client.get("/api/resources", params={"fields": "password"})).status_code == 400
+    assert (await admin_client.get("/api/resources", params={"after": "lixo"})).status_code == 400
+
+@pytest.mark.asyncio
+async def test_timeline_filters_and_pages_in_database(admin_client):
+    """Testa os filtros de data e tipo e a paginação por cursor da timeline."""
+    resource = await crud.create_resource(schemas.ResourceCreate(name="Worker"))
+    await crud.get_event_collection().insert_many([
+        {"resource_id": resource.id, "event_type": "DEPLOY" if day % 2 else "ERROR",
+         "message": f"dia {day}", "timestamp": datetime(2024, 1, day)}
+        for day in range(1, 8)
+    ])
+    url = f"/api/resources/{resource.id}/timeline"
+
+    first = await admin_client.get(url, params={"event_type": "DEPLOY", "limit": 2})
+    assert [e["message"] for e in first.json()] == ["dia 7", "dia 5"]
+    second = await admin_client.get(url, params={"event_type": "DEPLOY", "limit": 2, "after": first.headers["X-Next-Cursor"]})
+    assert [e["message"] for e in second.json()] == ["dia 3", "dia 1"]
+
+    ranged = await admin_client.get(url, params={"start_date": "2024-01-02T00:00:00", "end_date": "2024-01-04T00:00:00", "order": "asc"})
+    assert [e["message"] for e in ranged.json()] == ["dia 2", "dia 3", "dia 4"]
+
+    assert (await admin_client.get(f"/api/resources/{ObjectId()}/timeline")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_import_json_updates_existing_and_links_relations(admin_client):
+    """Testa a importação em lote: atualização por nome, criação e resolução de relações."""
+    existing = await crud.create_resource(schemas.ResourceCreate(name="Base de Dados"))
+    payload = [
+        {"name": "API", "tags": [{"key": "env", "value": "prod"}], "related_resources": ["base de dados", "Cache"]},
+        {"name": "Cache"},
+        {"name": "BASE DE DADOS", "description": "Atualizada"},
+    ]
+    response = await admin_client.post("/api/resources/import", params={"chunk_size": 2}, json=payload)
+    assert response.json() == {"created": 2, "updated": 1, "errors": []}
+
+    api = await crud.get_resource_by_name("API")
+    cache = await crud.get_resource_by_name("Cache")
+    assert api.tags[0].key == "ENV"
+    assert api.related_resources == [str(existing.id), str(cache.id)]
+    assert (await crud.get_resource(str(existing.id))).description == "Atualizada"
+
+    # Um nome repetido na mesma importação é reportado, e não contado como criado e atualizado.
+    payload = [
+        {"name": "Fila", "description": "Primeira", "related_resources": ["API"]},
+        {"name": "FILA", "description": "Repetida", "related_resources": ["Cache"]},
+    ]
+    response = await admin_client.post("/api/resources/import", json=payload)
+    summary = response.json()
+    assert (summary["created"], summary["updated"]) == (1, 0)
+    assert len(summary["errors"]) == 1 and "repetido" in summary["errors"][0]
+    fila = await crud.get_resource_by_name("Fila")
+    assert fila.description == "Primeira" and fila.related_resources == [str(api.id)]
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson_stream_reports_invalid_lines(admin_client):
+    """Testa a importação de um corpo NDJSON, com uma linha inválida."""
+    body = '{"name": "A", "related_resources": ["B"]}\n{"description": "sem nome"}\n{"name": "B"}'
+    response = await admin_client.post(
+        "/api/resources/import", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    summary = response.json()
+    assert summary["created"] == 2
+    assert len(summary["errors"]) == 1 and summary["errors"][0].startswith("Linha 2")
+    a = await crud.get_resource_by_name("A")
+    assert len(a.related_resources) == 1
+
+@pytest.mark.asyncio
+async def test_export_streams_import_compatible_ndjson(admin_client):
+    """Testa se a exportação resolve as relações para nomes e pode incluir eventos."""
+    db = await crud.create_resource(schemas.ResourceCreate(name="DB"))
+    api = await crud.create_resource(schemas.ResourceCreate(name="API", related_resources=[str(db.id)]))
+    await crud.add_event_to_resource(str(api.id), schemas.EventCreate(event_type="DEPLOY", message="v1"))
+
+    response = await admin_client.get("/api/resources/export")
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert items[0] == {"name": "API", "description": None, "tags": [], "related_resources": ["DB"]}
+    assert [schemas.ResourceImport(**item).name for item in items] == ["API", "DB"]
+
+    response = await admin_client.get("/api/resources/export", params={"include_events": True, "format": "json"})
+    assert response.json()[0]["events"][0]["message"] == "v1"
+
+@pytest.mark.asyncio
+async def test_resource_names_are_unique_case_insensitive(admin_client):
+    """Testa a unicidade dos nomes via índice e a busca exata por nome com metacaracteres."""
+    created = await admin_client.post("/api/resources", json={"name": "api (v2).*"})
+    assert created.status_code == 201
+    assert (await admin_client.post("/api/resources", json={"name": "API (V2).*"})).status_code == 409
+    assert (await crud.get_resource_by_name("API (v2).*")).id == ObjectId(created.json()["id"])
+    assert await crud.get_resource_by_name("api (v2)") is None
+
+    other = await admin_client.post("/api/resources", json={"name": "Outro"})
+    renamed = await admin_client.put(f"/api/resources/{other.json()['id']}", json={"name": "API (v2).*"})
+    assert renamed.status_code == 409
+
+    first_clone = await admin_client.post(f"/api/resources/{other.json()['id']}/clone")
+    second_clone = await admin_client.post(f"/api/resources/{other.json()['id']}/clone")
+    assert [first_clone.json()["name"], second_clone.json()["name"]] == ["Outro - Cópia", "Outro - Cópia 2"]
+
+@pytest.mark.asyncio
+async def test_dependencies_and_impact_subgraphs(admin_client):
+    """Testa o cálculo dos subgrafos a montante e a jusante, com limite de profundidade."""
+    db = await crud.create_resource(schemas.ResourceCreate(name="Base de Dados"))
+    api = await crud.create_resource(schemas.ResourceCreate(name="API", related_resources=[str(db.id)]))
+    web = await crud.create_resource(schemas.ResourceCreate(name="Web", related_resources=[str(api.id)]))
+    await crud.create_resource(schemas.ResourceCreate(name="Isolado"))
+
+    response = await admin_client.get(f"/api/resources/{db.id}/dependencies")
+    assert response.status_code == 200
+    depths = {n["data"]["label"]: n["data"]["depth"] for n in response.json()["nodes"]}
+    assert depths == {"Base de Dados": 0, "API": 1, "Web": 2}
+    assert {(e["source"], e["target"]) for e in response.json()["edges"]} == {
+        (str(api.id), str(db.id)), (str(web.id), str(api.id))
+    }
+
+    response = await admin_client.get(f"/api/resources/{web.id}/impact", params={"depth": 1})
+    assert {n["data"]["label"] for n in response.json()["nodes"]} == {"Web", "API"}
+
+    assert (await admin_client.get(f"/api/resources/{ObjectId()}/impact")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_conditional_get_with_catalog_etag(admin_client):
+    """Testa se as leituras do catálogo respondem 304 enquanto nenhuma escrita alterar a versão."""
+    resource = await crud.create_resource(schemas.ResourceCreate(name="API"))
+
+    first = await admin_client.get("/api/resources")
+    etag = first.headers["ETag"]
+    cached = await admin_client.get("/api/resources", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    # Cada URL tem a sua própria ETag.
+    assert (await admin_client.get("/api/resources/map")).headers["ETag"] != etag
+
+    # Excluir recursos inexistentes não altera a versão.
+    assert (await admin_client.delete(f"/api/resources/{ObjectId()}")).status_code == 404
+    assert await crud.delete_multiple_resources([str(ObjectId())]) == 0
+    assert (await admin_client.get("/api/resources", headers={"If-None-Match": etag})).status_code == 304
+
+    await crud.add_event_to_resource(str(resource.id), schemas.EventCreate(event_type="DEPLOY"))
+    changed = await admin_client.get("/api/resources", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+@pytest.mark.asyncio
+async def test_fast_read_path_matches_pydantic_output(admin_client):
+    """Testa se as leituras sem Pydantic devolvem exatamente o JSON que o schema de saída produziria."""
+    child = await crud.create_resource(schemas.ResourceCreate(name="Fila"))
+    resource = await crud.create_resource(schemas.ResourceCreate(
+        name="API", description="Principal", tags=[{"key": "env", "value": "prod"}], related_resources=[str(child.id)]
+    ))
+    await crud.add_event_to_resource(str(resource.id), schemas.EventCreate(event_type="DEPLOY", message="v2"))
+
+    expected = schemas.ResourceOut.model_validate(await crud.get_resource(str(resource.id)), from_attributes=True)
+    response = await admin_client.get(f"/api/resources/{resource.id}")
+    assert response.json() == expected.model_dump(mode="json")
+
+    listed = await admin_client.get("/api/resources", params={"fields": "name,description,tags,related_resources,events"})
+    by_name = {r["name"]: r for r in listed.json()}
+    assert by_name["API"] == {**expected.model_dump(mode="json"), "parents": [], "children": ["Fila"]}
+
+@pytest.mark.asyncio
+async def test_search_ranks_and_highlights_matches(admin_client, monkeypatch):
+    """Testa a pesquisa textual: relevância por campo, prefixos, acentos, destaques e atualização incremental."""
+    await crud.create_resource(schemas.ResourceCreate(name="Serviço de Pagamentos", description="Processa cobranças."))
+    gateway = await crud.create_resource(schemas.ResourceCreate(
+        name="Gateway", description="Encaminha pedidos para o serviço de pagamentos <v2>.",
+        tags=[{"key": "equipa", "value": "financeiro"}],
+    ))
+
+    response = await admin_client.get("/api/resources/search", params={"q": "servico pagam"})
+    assert response.status_code == 200
+    results = response.json()
+    # O nome pesa mais do que a descrição.
+    assert [r["name"] for r in results] == ["Serviço de Pagamentos", "Gateway"]
+    assert results[0]["highlights"]["name"] == "<mark>Serviço</mark> de <mark>Pagamentos</mark>"
+    assert results[1]["highlights"]["description"] == "Encaminha pedidos para o <mark>serviço</mark> de <mark>pagamentos</mark> &lt;v2&gt;."
+
+    results = (await admin_client.get("/api/resources/search", params={"q": "financeiro"})).json()
+    assert [r["highlights"]["tags"] for r in results] == [["EQUIPA:<mark>FINANCEIRO</mark>"]]
+
+    await crud.update_resource(str(gateway.id), schemas.ResourceUpdate(tags=[]))
+    assert (await admin_client.get("/api/resources/search", params={"q": "financeiro"})).json() == []
+    await crud.delete_resource(str(gateway.id))
+    results = (await admin_client.get("/api/resources/search", params={"q": "pagamentos"})).json()
+    assert [r["name"] for r in results] == ["Serviço de Pagamentos"]
+
+    # Recursos criados por outro worker aparecem depois de a versão partilhada avançar.
+    await crud.get_resource_collection().insert_one({"name": "Faturação", "name_key": "faturação", "description": "Emite faturas de pagamentos.", "tags": []})
+    await crud.get_meta_collection().update_one({"_id": "catalog"}, {"$inc": {"version": 1, "resources_version": 1}})
+    results = (await admin_client.get("/api/resources/search", params={"q": "pagamentos"})).json()
+    assert [r["name"] for r in results] == ["Serviço de Pagamentos", "Faturação"]
+
+    # Durante a reconstrução, a pesquisa continua a usar o índice anterior, completo.
+    seen = []
+    original_add = SearchIndex._add
+    def observing_add(index, *args):
+        seen.append(len(search_index.search("pagamentos")))
+        original_add(index, *args)
+    monkeypatch.setattr(SearchIndex, "_add", observing_add)
+    await search_index.reload()
+    assert seen and all(count == 2 for count in seen)
+    assert len(search_index.search("pagamentos")) == 2
+
+@pytest.mark.asyncio
+async def test_tag_facets_are_counted_and_invalidated_by_writes(admin_client):
+    """Testa a contagem de facetas de tags e a sua invalidação após uma escrita de recursos (e não de eventos)."""
+    await crud.create_resource(schemas.ResourceCreate(name="A", tags=[{"key": "env", "value": "prod"}, {"key": "team", "value": "core"}]))
+    await crud.create_resource(schemas.ResourceCreate(name="B", tags=[{"key": "env", "value": "prod"}]))
+    await crud.create_resource(schemas.ResourceCreate(name="C", tags=[{"key": "env", "value": "dev"}]))
+
+    response = await admin_client.get("/api/tags/facets")
+    assert response.status_code == 200
+    assert response.json() == {"ENV": {"PROD": 2, "DEV": 1}, "TEAM": {"CORE": 1}}
+    assert (await admin_client.get("/api/meta/config")).json()["tag_keys"] == ["ENV", "TEAM"]
+
+    # A escrita de eventos muda a versão do catálogo, mas não invalida as facetas.
+    cached = crud._tag_facets_cache["facets"]
+    resource_a = await crud.get_resource_by_name("A")
+    await crud.add_event_to_resource(str(resource_a.id), schemas.EventCreate(event_type="DEPLOY"))
+    assert await crud.get_tag_facets() is cached
+
+    await crud.create_resource(schemas.ResourceCreate(name="D", tags=[{"key": "env", "value": "dev"}, {"key": "env", "value": "qa"}]))
+    assert (await admin_client.get("/api/tags/facets")).json()["ENV"] == {"DEV": 2, "PROD": 2, "QA": 1}
@@ -1,7 +1,13 @@
 # tests/test_security.py
 """Testes para as funcionalidades de segurança (security.py)."""
+import asyncio
+import time
 import pytest
-from app.security import get_password_hash, verify_password, create_access_token
+from fastapi import HTTPException
+from bson import ObjectId
+from app import crud, schemas
+from app.models import UserInDB
+from app.security import get_password_hash, verify_password, create_access_token, UserCache, user_cache, PasswordHasher, USER_INVALIDATION_CHANNEL
 from jose import jwt
 from app.security import SECRET_KEY, ALGORITHM
 
@@ -40,3 +46,93 @@ def test_jwt_token_creation():
     assert payload.get("role") == "usuario"
     # Afirma que a chave de expiração ('exp') existe no token
     assert "exp" in payload
+
+def test_user_cache_ttl_lru_and_counters():
+    """Testa a expiração, o limite de tamanho e os contadores da cache de utilizadores."""
+    cache = UserCache(ttl=60, max_size=2)
+    users = [UserInDB(_id=ObjectId(), username=f"u{i}", email=f"u{i}@example.com", role="usuario", hashed_password="x") for i in range(3)]
+    for i, user in enumerate(users):
+        cache.set(f"t{i}", user)
+    assert cache.get("t0") is None  # Removido por exceder o tamanho máximo.
+    assert cache.get("t2").username == "u2"
+    cache.set("expirado", users[0], token_expires_at=time.time() - 1)
+    assert cache.get("expirado") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_user_cache_invalidated_on_update_and_delete(test_client):
+    """Testa se alterar ou excluir um utilizador remove as suas entradas da cache."""
+    user = await crud.create_user(schemas.UserCreate(username="cacheado", email="c@example.com", password="x", role="usuario"))
+    user_cache.set("token-a", user)
+    await crud.update_user(str(user.id), schemas.UserUpdate(disabled=True))
+    assert user_cache.get("token-a") is None
+
+    user_cache.set("token-b", await crud.get_user(str(user.id)))
+    await crud.delete_user(str(user.id))
+    assert user_cache.get("token-b") is None
+
+class FakePubSub:
+    """PubSub mínimo do Redis: entrega as mensagens colocadas na fila."""
+    def __init__(self, queue):
+        self.queue = queue
+        self.channels = []
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+    async def close(self):
+        pass
+
+class FakeRedis:
+    """Redis mínimo: as publicações são entregues aos PubSub criados por ele."""
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.published = []
+    def pubsub(self, ignore_subscribe_messages=True):
+        return FakePubSub(self.queue)
+    async def publish(self, channel, data):
+        self.published.append((channel, data))
+
+@pytest.mark.asyncio
+async def test_user_cache_invalidations_are_published_to_other_workers(test_client):
+    """Testa se as alterações de utilizadores são publicadas no Redis e se a escuta as aplica à cache."""
+    redis_instance = FakeRedis()
+    await user_cache.start_listener(redis_instance)
+    try:
+        user = await crud.create_user(schemas.UserCreate(username="remoto", email="r@example.com", password="x", role="usuario"))
+        await crud.update_user(str(user.id), schemas.UserUpdate(role="admin"))
+        assert redis_instance.published == [(USER_INVALIDATION_CHANNEL, "remoto")]
+
+        # Uma notificação de outro worker remove as entradas do utilizador, e só essas.
+        user_cache.set("token-remoto", user)
+        user_cache.set("token-outro", UserInDB(_id=ObjectId(), username="outro", email="o@example.com", role="usuario", hashed_password="x"))
+        await redis_instance.queue.put({"type": "message", "data": "remoto"})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert user_cache.get("token-remoto") is None
+        assert user_cache.get("token-outro").username == "outro"
+    finally:
+        await user_cache.stop_listener()
+        user_cache.invalidate()
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_off_loop_and_bounds_queue():
+    """Testa se o pool de bcrypt não bloqueia o event loop e recusa operações acima do limite."""
+    hasher = PasswordHasher(workers=1, queue_limit=0)
+    slow = asyncio.create_task(hasher.run(time.sleep, 0.2))
+    await asyncio.sleep(0)  # Deixa a primeira operação ocupar a única thread.
+
+    # O event loop continua livre enquanto a operação lenta corre na thread.
+    started = time.perf_counter()
+    await asyncio.sleep(0.01)
+    assert time.perf_counter() - started < 0.1
+
+    with pytest.raises(HTTPException) as exc_info:
+        await hasher.run(time.sleep, 0)
+    assert exc_info.value.status_code == 503
+
+    await slow
+    assert await hasher.run(verify_password, "x", get_password_hash("x")) is True
+    assert hasher.stats()["completed"] == 2 and hasher.stats()["rejected"] == 1
+    hasher.shutdown()
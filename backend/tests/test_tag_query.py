@@ -0,0 +1,41 @@
+# tests/test_tag_query.py
+"""Testes para a linguagem de filtro por tags (tag_query.py)."""
+import pytest
+from app import crud, schemas
+from app.tag_query import TagQueryError, compile_tag_query
+
+
+def test_compile_tag_query_operators_and_precedence():
+    """Testa a normalização, a vírgula (OR), a precedência de NOT/AND/OR e a existência de chave."""
+    env_prod = {"tags": {"$elemMatch": {"key": "ENV", "value": "PROD"}}}
+    team_core = {"tags": {"$elemMatch": {"key": "TEAM", "value": "CORE"}}}
+    assert compile_tag_query("env:prod") == env_prod
+    assert compile_tag_query("env:prod,team:core") == {"$or": [env_prod, team_core]}
+    assert compile_tag_query("env:prod team:core | owner") == {"$or": [{"$and": [env_prod, team_core]}, {"tags.key": "OWNER"}]}
+    assert compile_tag_query("env:prod AND NOT (team:core OR owner:*)") == {
+        "$and": [env_prod, {"$nor": [{"$or": [team_core, {"tags.key": "OWNER"}]}]}]
+    }
+    assert compile_tag_query('app:"portal web"') == {"tags": {"$elemMatch": {"key": "APP", "value": "PORTAL WEB"}}}
+    assert compile_tag_query("  ") == {}
+    for invalid in ["(env:prod", "env:prod AND", "OR env:prod", "env:prod)", 'app:"aberto']:
+        with pytest.raises(TagQueryError):
+            compile_tag_query(invalid)
+
+@pytest.mark.asyncio
+async def test_tag_filter_on_resource_list(admin_client):
+    """Testa o filtro de tags exato, com AND/NOT, na listagem de recursos."""
+    await crud.create_resource(schemas.ResourceCreate(name="A", tags=[{"key": "env", "value": "prod"}, {"key": "team", "value": "core"}]))
+    await crud.create_resource(schemas.ResourceCreate(name="B", tags=[{"key": "env", "value": "prod"}]))
+    await crud.create_resource(schemas.ResourceCreate(name="C", tags=[{"key": "env", "value": "production"}]))
+
+    async def names(tags):
+        response = await admin_client.get("/api/resources", params={"tags": tags})
+        return [r["name"] for r in response.json()]
+
+    # A comparação é exata: "prod" já não corresponde a "production".
+    assert await names("env:prod") == ["A", "B"]
+    assert await names("env:prod AND team:core") == ["A"]
+    assert await names("env:prod NOT team") == ["B"]
+    assert await names("env:production,team:core") == ["A", "C"]
+    assert (await admin_client.get("/api/resources", params={"tags": "env:prod AND"})).status_code == 400
+    assert (await admin_client.get("/api/resources/export", params={"tags": "(env:prod"})).status_code == 400
@@ -20,6 +20,7 @@ const EventTimelinePage = () => {
     const [resources, setResources] = useState([]);
     const [events, setEvents] = useState([]);
     const [availableEventTypes, setAvailableEventTypes] = useState([]);
+    const [eventTypeCounts, setEventTypeCounts] = useState({});
     
     // Estado de controle da UI
     const [loading, setLoading] = useState(false);
@@ -56,9 +57,25 @@ const EventTimelinePage = () => {
             if (startDate) params.append('start_date', new Date(startDate).toISOString());
             if (endDate) params.append('end_date', new Date(endDate).toISOString());
 
-            const response = await apiClient.get(`/resources/${selectedResource}/timeline?${params.toString()}`);
+            // As contagens por tipo vêm das contagens pré-agregadas (histograma), sem contar os eventos.
+            // Com filtro de datas, usa intervalos de uma hora para que os limites sejam mais precisos.
+            const histogramParams = new URLSearchParams(params);
+            histogramParams.append('resource_id', selectedResource);
+            histogramParams.append('granularity', startDate || endDate ? 'hour' : 'day');
+            const [response, histogram] = await Promise.all([
+                apiClient.get(`/resources/${selectedResource}/timeline?${params.toString()}`),
+                apiClient.get(`/events/histogram?${histogramParams.toString()}`).catch(() => null),
+            ]);
             setEvents(response.data);
 
+            const counts = {};
+            (histogram?.data?.buckets || []).forEach(bucket => {
+                Object.entries(bucket.by || {}).forEach(([type, count]) => {
+                    counts[type] = (counts[type] || 0) + count;
+                });
+            });
+            setEventTypeCounts(counts);
+
             if (response.data.length > 0) {
                 const uniqueTypes = [...new Set(response.data.map(event => event.event_type))].sort();
                 setAvailableEventTypes(uniqueTypes);
@@ -152,7 +169,11 @@ const EventTimelinePage = () => {
                     <label htmlFor="eventTypes" className="event-timeline-filter-label">Tipos de Evento</label>
                     <select id="eventTypes" value={selectedEventTypes[0] || ''} onChange={e => setSelectedEventTypes(e.target.value ? [e.target.value] : [])} className="event-timeline-filter-select">
                         <option value="">Todos</option>
-                        {availableEventTypes.map(type => <option key={type} value={type}>{type}</option>)}
+                        {availableEventTypes.map(type => (
+                            <option key={type} value={type}>
+                                {eventTypeCounts[type] !== undefined ? `${type} (${eventTypeCounts[type]})` : type}
+                            </option>
+                        ))}
                     </select>
                 </div>
                 <div>
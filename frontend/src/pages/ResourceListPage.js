@@ -36,6 +36,8 @@ const ResourceListPage = () => {
     const [success, setSuccess] = useState('');
     /** @type {[object, function]} Armazena os valores atuais dos campos de filtro. */
     const [filters, setFilters] = useState({ name: '', tags: '' });
+    /** @type {[object, function]} Contagem de recursos por chave e valor de tag (chave -> valor -> contagem), para sugestões no filtro. */
+    const [tagFacets, setTagFacets] = useState({});
     /** @type {[object, function]} Armazena a configuração de ordenação da tabela (coluna e direção). */
     const [sortConfig, setSortConfig] = useState({ key: 'name', direction: 'ascending' });
 
@@ -86,6 +88,19 @@ const ResourceListPage = () => {
         fetchResources();
     }, [fetchResources]);
 
+    /**
+     * Busca, uma única vez, as facetas de tags para sugerir valores no filtro.
+     * Uma falha aqui não impede a utilização da página: o filtro continua a aceitar texto livre.
+     */
+    useEffect(() => {
+        apiClient.get('/tags/facets')
+            .then(response => {
+                const data = response?.data;
+                if (data && typeof data === 'object' && !Array.isArray(data)) setTagFacets(data);
+            })
+            .catch(err => console.error(err));
+    }, []);
+
     /**
      * Manipula a mudança de estado dos filtros de texto.
      */
@@ -224,7 +239,7 @@ const ResourceListPage = () => {
 
             <form onSubmit={handleFilterSubmit} className="resource-list-filters-form">
                 <div><label htmlFor="name" className="resource-list-filter-label">Nome</label><input type="text" name="name" id="name" value={filters.name} onChange={handleFilterChange} className="resource-list-filter-input" placeholder="ex: api-principal" /></div>
-                <div><label htmlFor="tags" className="resource-list-filter-label">Tags (chave:valor)</label><input type="text" name="tags" id="tags" value={filters.tags} onChange={handleFilterChange} className="resource-list-filter-input" placeholder="ex: env:prod,app:core" /></div>
+                <div><label htmlFor="tags" className="resource-list-filter-label">Tags (chave:valor)</label><input type="text" name="tags" id="tags" value={filters.tags} onChange={handleFilterChange} className="resource-list-filter-input" placeholder="ex: env:prod,app:core" list="tag-facets" /><datalist id="tag-facets">{Object.entries(tagFacets).flatMap(([key, values]) => Object.entries(values).map(([value, count]) => (<option key={`${key}:${value}`} value={`${key}:${value}`}>{`${key}:${value} (${count})`}</option>)))}</datalist></div>
                 <div className="resource-list-filter-button-wrapper"><button type="submit" className="resource-list-filter-button">Filtrar</button></div>
             </form>
             
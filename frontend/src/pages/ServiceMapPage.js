@@ -43,6 +43,20 @@ const getLayoutedElements = (nodes, edges, direction = 'TB') => {
   return { nodes, edges };
 };
 
+/**
+ * Usa as posições calculadas pelo backend (layout em camadas) quando disponíveis,
+ * evitando recalcular o layout do grafo completo no browser.
+ */
+const applyServerLayout = (nodes, edges) => {
+  nodes.forEach((node) => {
+    node.targetPosition = 'top';
+    node.sourcePosition = 'bottom';
+  });
+  return { nodes, edges };
+};
+
+const hasServerLayout = (nodes) => nodes.some((node) => node.position && (node.position.x !== 0 || node.position.y !== 0));
+
 const ServiceMapPage = () => {
     // --- Hooks e Estados ---
     const { user } = useAuth();
@@ -112,7 +126,9 @@ const ServiceMapPage = () => {
                     markerEnd: { type: MarkerType.ArrowClosed, color: '#6b7280' },
                     data: { onDelete: canEdit ? (id) => { const edgeFound = layoutedEdges.find(ed => ed.id === id); if (edgeFound) { setEdgeToDelete(edgeFound); setIsConfirmModalOpen(true); } } : null }
                 }));
-                const { nodes: finalNodes, edges: finalEdges } = getLayoutedElements(layoutedNodes, layoutedEdges);
+                const { nodes: finalNodes, edges: finalEdges } = hasServerLayout(layoutedNodes)
+                    ? applyServerLayout(layoutedNodes, layoutedEdges)
+                    : getLayoutedElements(layoutedNodes, layoutedEdges);
                 setNodes(finalNodes);
                 setEdges(finalEdges);
                 setOriginalNodes(finalNodes);